@@ -0,0 +1,209 @@
+"""
+Compatibility-aware, first-expiry-first-out allocation of blood bags to requests
+
+Every function takes an open cursor and leaves committing to the caller, so an
+allocation (bag status, transaction_log rows and units_fulfilled) is written in
+the caller's single transaction. Bags are claimed with FOR UPDATE SKIP LOCKED:
+concurrent allocators each take different bags instead of queueing behind one
+another, and a bag can never be assigned twice.
+"""
+
+# Recipient blood type -> donor types whose red cells it can receive.
+RED_CELL_COMPATIBILITY = {
+    'O-': ['O-'],
+    'O+': ['O+', 'O-'],
+    'A-': ['A-', 'O-'],
+    'A+': ['A+', 'A-', 'O+', 'O-'],
+    'B-': ['B-', 'O-'],
+    'B+': ['B+', 'B-', 'O+', 'O-'],
+    'AB-': ['AB-', 'A-', 'B-', 'O-'],
+    'AB+': ['AB+', 'AB-', 'A+', 'A-', 'B+', 'B-', 'O+', 'O-'],
+}
+
+# Plasma compatibility runs the other way round (AB is the universal donor);
+# Rh does not matter for plasma.
+PLASMA_COMPATIBILITY = {
+    'O-': ['O-', 'O+', 'A-', 'A+', 'B-', 'B+', 'AB-', 'AB+'],
+    'O+': ['O+', 'O-', 'A+', 'A-', 'B+', 'B-', 'AB+', 'AB-'],
+    'A-': ['A-', 'A+', 'AB-', 'AB+'],
+    'A+': ['A+', 'A-', 'AB+', 'AB-'],
+    'B-': ['B-', 'B+', 'AB-', 'AB+'],
+    'B+': ['B+', 'B-', 'AB+', 'AB-'],
+    'AB-': ['AB-', 'AB+'],
+    'AB+': ['AB+', 'AB-'],
+}
+
+# Whole blood carries both the donor's red cells and their plasma, so it has
+# to be ABO-identical (Rh still follows the red-cell rule). Platelets and any
+# component not recognised below are held to the same rule.
+ABO_IDENTICAL = {
+    recipient: [donor for donor in donors if donor.rstrip('+-') == recipient.rstrip('+-')]
+    for recipient, donors in RED_CELL_COMPATIBILITY.items()
+}
+
+# Substrings of component_type (case-insensitive) naming each component class.
+PLASMA_COMPONENTS = ('plasma', 'cryo')
+RED_CELL_COMPONENTS = ('red',)
+
+ALLOCATABLE_STATUSES = ('pending', 'approved')
+
+
+class AllocationError(ValueError):
+    """Raised when a request cannot be allocated (missing, closed, bad input)"""
+
+
+class RequestNotFound(AllocationError):
+    """Raised when the request to allocate does not exist"""
+
+
+def compatible_types(blood_type, component_type=None):
+    """Donor blood types a recipient of blood_type can receive for component_type"""
+    component = (component_type or '').lower()
+    if any(name in component for name in PLASMA_COMPONENTS):
+        matrix = PLASMA_COMPATIBILITY
+    elif any(name in component for name in RED_CELL_COMPONENTS):
+        matrix = RED_CELL_COMPATIBILITY
+    else:
+        matrix = ABO_IDENTICAL
+    if blood_type not in matrix:
+        raise AllocationError(f'Unknown blood type: {blood_type}')
+    return matrix[blood_type]
+
+
+def claim_bags(cursor, blood_type, units, component_type=None):
+    """
+    Lock up to units available, unexpired, compatible bags, earliest expiry
+    first (among bags expiring the same day, those of exactly the
+    recipient's type, ABO and Rh, come first).
+    Bags locked by a concurrent allocator are skipped, not waited for.
+
+    Compatibility is decided per bag from its own component_type, so without
+    a component_type bags of every component are candidates, each judged by
+    its own matrix.
+    """
+    plasma = compatible_types(blood_type, 'plasma')
+    red_cells = compatible_types(blood_type, 'red')
+    identical = compatible_types(blood_type, 'whole blood')
+    query = """
+        SELECT bag_id, bag_number, blood_type::text, component_type, expiry_date, volume_ml
+        FROM blood_inventory
+        WHERE status = 'available'
+          AND expiry_date >= CURRENT_DATE
+          AND testing_status <> 'failed'
+          AND blood_type = ANY(%s::blood_group[])
+          AND CASE
+              WHEN COALESCE(component_type, '') ILIKE ANY(%s) THEN blood_type = ANY(%s::blood_group[])
+              WHEN COALESCE(component_type, '') ILIKE ANY(%s) THEN blood_type = ANY(%s::blood_group[])
+              ELSE blood_type = ANY(%s::blood_group[])
+          END
+    """
+    params = [
+        sorted(set(plasma) | set(red_cells)),
+        [f'%{name}%' for name in PLASMA_COMPONENTS], plasma,
+        [f'%{name}%' for name in RED_CELL_COMPONENTS], red_cells,
+        identical,
+    ]
+
+    if component_type:
+        query += " AND component_type = %s"
+        params.append(component_type)
+
+    query += """
+        ORDER BY expiry_date, blood_type <> %s::blood_group, bag_id
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    """
+    params.extend([blood_type, units])
+
+    cursor.execute(query, tuple(params))
+    return cursor.fetchall()
+
+
+def allocate_request(cursor, request_id, component_type=None, issued_by=None, lock_wait=True):
+    """
+    Allocate bags to one request and record the issue
+
+    Locks the request row so two allocators cannot both top up the same
+    request, claims the missing units, marks the bags assigned, writes one
+    'issue' row per bag to transaction_log and advances units_fulfilled
+    (closing the request once it is complete). Returns a summary dict, or
+    None when lock_wait is False and another allocator holds the request.
+    """
+    cursor.execute(f"""
+        SELECT request_id, blood_type::text, units_requested,
+               COALESCE(units_fulfilled, 0) as units_fulfilled, request_status::text
+        FROM recipient_request
+        WHERE request_id = %s
+        FOR UPDATE{'' if lock_wait else ' SKIP LOCKED'}
+    """, (request_id,))
+    req = cursor.fetchone()
+    if req is None:
+        if not lock_wait:
+            cursor.execute("SELECT 1 FROM recipient_request WHERE request_id = %s", (request_id,))
+            if cursor.fetchone() is not None:
+                return None
+        raise RequestNotFound('Request not found')
+    if req['request_status'] not in ALLOCATABLE_STATUSES:
+        raise AllocationError(f"Request is {req['request_status']}")
+
+    needed = req['units_requested'] - req['units_fulfilled']
+    bags = claim_bags(cursor, req['blood_type'], needed, component_type) if needed > 0 else []
+
+    transactions = []
+    if bags:
+        bag_ids = [bag['bag_id'] for bag in bags]
+        cursor.execute("""
+            WITH assigned AS (
+                UPDATE blood_inventory
+                SET status = 'assigned', assigned_to_request = %s
+                WHERE bag_id = ANY(%s)
+                RETURNING bag_id, volume_ml
+            )
+            INSERT INTO transaction_log (request_id, bag_id, units_ml, transaction_type, issued_by, remarks)
+            SELECT %s, bag_id, volume_ml, 'issue', %s, 'FEFO allocation'
+            FROM assigned
+            RETURNING transaction_id, bag_id
+        """, (request_id, bag_ids, request_id, issued_by))
+        transactions = cursor.fetchall()
+
+        cursor.execute("""
+            UPDATE recipient_request SET
+                units_fulfilled = COALESCE(units_fulfilled, 0) + %s,
+                request_status = CASE
+                    WHEN COALESCE(units_fulfilled, 0) + %s >= units_requested
+                    THEN 'fulfilled'::request_status_t ELSE request_status END,
+                fulfilled_date = CASE
+                    WHEN COALESCE(units_fulfilled, 0) + %s >= units_requested
+                    THEN CURRENT_TIMESTAMP ELSE fulfilled_date END
+            WHERE request_id = %s
+        """, (len(bags), len(bags), len(bags), request_id))
+
+    units_fulfilled = req['units_fulfilled'] + len(bags)
+    return {
+        'request_id': request_id,
+        'blood_type': req['blood_type'],
+        'units_requested': req['units_requested'],
+        'units_fulfilled': units_fulfilled,
+        'shortfall': max(req['units_requested'] - units_fulfilled, 0),
+        'request_status': 'fulfilled' if bags and units_fulfilled >= req['units_requested']
+                          else req['request_status'],
+        'bags': bags,
+        'transactions': transactions,
+    }
+
+
+def pending_request_ids(cursor, limit):
+    """
+    Lock and return up to limit open requests, most urgent and soonest needed
+    first. Requests another batch allocator is working on are skipped, so
+    parallel batches split the queue between them.
+    """
+    cursor.execute("""
+        SELECT request_id
+        FROM recipient_request
+        WHERE request_status IN ('pending', 'approved')
+        ORDER BY urgency_level DESC, required_by_date NULLS LAST, request_date, request_id
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    """, (limit,))
+    return [row['request_id'] for row in cursor.fetchall()]
@@ -1,10 +1,19 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, abort, jsonify, request
 from flask_cors import CORS
 from datetime import datetime
 import os
 from dotenv import load_dotenv
 
-from db_utils import test_connection
+from db_utils import test_connection, get_pool_stats, init_db_session
+from cache import aggregate_cache
+from change_feed import change_feed, init_change_feed
+from expiry_sweeper import expiry_sweeper, init_expiry_sweeper
+from json_provider import FastJSONProvider
+from metrics import init_request_metrics, query_metrics, render_gauges
+from profiling import init_profiling, request_profiler
+from watermarks import table_watermarks
+from report_jobs import init_report_jobs, report_jobs
+from rollups import init_rollups, rollup_refresher
 
 from routes.donors import donors_bp
 from routes.hospitals import hospitals_bp
@@ -18,68 +27,147 @@ from routes.reports import reports_bp
 
 load_dotenv()
 
-app = Flask(__name__)
+def create_app(config=None):
+    """
+    Build the Flask application
 
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-change-in-production')
-app.config['JSON_SORT_KEYS'] = False
-
-CORS(app, resources={
-    r"/api/*": {
-        "origins": os.getenv('CORS_ORIGINS', 'http://localhost:3000').split(','),
-        "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"]
-    }
-})
-
-app.register_blueprint(donors_bp, url_prefix='/api/donors')
-app.register_blueprint(hospitals_bp, url_prefix='/api/hospitals')
-app.register_blueprint(donations_bp, url_prefix='/api/donations')
-app.register_blueprint(inventory_bp, url_prefix='/api/inventory')
-app.register_blueprint(requests_bp, url_prefix='/api/requests')
-app.register_blueprint(transactions_bp, url_prefix='/api/transactions')
-app.register_blueprint(users_bp, url_prefix='/api/users')
-app.register_blueprint(dashboard_bp, url_prefix='/api/dashboard')
-app.register_blueprint(reports_bp, url_prefix='/api/reports')
-
-@app.route('/')
-def index():
-    return jsonify({
-        'message': 'Blood Bank Management System API',
-        'version': '2.0.0',
-        'database': 'PostgreSQL with Direct Queries',
-        'endpoints': {
-            'donors': '/api/donors',
-            'hospitals': '/api/hospitals',
-            'donations': '/api/donations',
-            'inventory': '/api/inventory',
-            'requests': '/api/requests',
-            'transactions': '/api/transactions',
-            'users': '/api/users',
-            'dashboard': '/api/dashboard/stats',
-            'reports': '/api/reports'
+    config is a mapping applied over the defaults (e.g. {'TESTING': True}).
+    Nothing here opens a database connection or starts a thread: the pool is
+    created on first use and the background workers start with the first
+    request, so a pre-forking server can build the app once in its master.
+    """
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-change-in-production')
+    app.config['JSON_SORT_KEYS'] = False
+    if config:
+        app.config.from_mapping(config)
+    
+    # Registered before the DB session so request timings include the commit.
+    init_request_metrics(app)
+    init_profiling(app)
+    init_db_session(app)
+    init_expiry_sweeper(app)
+    init_rollups(app)
+    init_report_jobs(app)
+    init_change_feed(app)
+    
+    CORS(app, resources={
+        r"/api/*": {
+            "origins": os.getenv('CORS_ORIGINS', 'http://localhost:3000').split(','),
+            "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+            "allow_headers": ["Content-Type", "Authorization", "If-None-Match"],
+            "expose_headers": ["X-Next-Cursor", "Server-Timing", "X-Profile-Id", "ETag"]
         }
     })
+    
+    app.register_blueprint(donors_bp, url_prefix='/api/donors')
+    app.register_blueprint(hospitals_bp, url_prefix='/api/hospitals')
+    app.register_blueprint(donations_bp, url_prefix='/api/donations')
+    app.register_blueprint(inventory_bp, url_prefix='/api/inventory')
+    app.register_blueprint(requests_bp, url_prefix='/api/requests')
+    app.register_blueprint(transactions_bp, url_prefix='/api/transactions')
+    app.register_blueprint(users_bp, url_prefix='/api/users')
+    app.register_blueprint(dashboard_bp, url_prefix='/api/dashboard')
+    app.register_blueprint(reports_bp, url_prefix='/api/reports')
+    
+    @app.route('/')
+    def index():
+        return jsonify({
+            'message': 'Blood Bank Management System API',
+            'version': '2.0.0',
+            'database': 'PostgreSQL with Direct Queries',
+            'endpoints': {
+                'donors': '/api/donors',
+                'hospitals': '/api/hospitals',
+                'donations': '/api/donations',
+                'inventory': '/api/inventory',
+                'requests': '/api/requests',
+                'transactions': '/api/transactions',
+                'users': '/api/users',
+                'dashboard': '/api/dashboard/stats',
+                'reports': '/api/reports'
+            }
+        })
+    
+    @app.route('/health')
+    def health():
+        success, message = test_connection()
+        return jsonify({
+            'status': 'healthy' if success else 'unhealthy',
+            'timestamp': datetime.now().isoformat(),
+            'database': message,
+            'pool': get_pool_stats(),
+            'cache': aggregate_cache.stats(),
+            'expiry_sweeper': expiry_sweeper.stats(),
+            'rollups': rollup_refresher.stats(),
+            'report_jobs': report_jobs.stats(),
+            'profiling': request_profiler.stats(),
+            'watermarks': table_watermarks.stats(),
+            'change_feed': change_feed.stats()
+        }), 200 if success else 500
+    
+    @app.route('/metrics')
+    def metrics():
+        body = (
+            query_metrics.render()
+            + render_gauges('bloodbank_db_pool', get_pool_stats())
+            + render_gauges('bloodbank_aggregate_cache', aggregate_cache.stats())
+            + expiry_sweeper.render()
+            + rollup_refresher.render()
+            + report_jobs.render()
+            + render_gauges('bloodbank_conditional_get', table_watermarks.stats(), 'counter')
+            + change_feed.render()
+        )
+        return Response(body, mimetype='text/plain; version=0.0.4')
+    
+    @app.route('/metrics/slow-queries')
+    def slow_queries():
+        return jsonify({
+            'enabled': query_metrics.enabled,
+            'threshold_ms': query_metrics.slow_query_ms,
+            'queries': query_metrics.slow_queries()
+        })
+    
+    @app.route('/admin/profiles')
+    def list_profiles():
+        if not request_profiler.enabled or not request_profiler.authorized():
+            abort(404)
+        return jsonify({'profiles': request_profiler.profiles()})
+    
+    @app.route('/admin/profiles/<profile_id>')
+    def get_profile(profile_id):
+        if not request_profiler.enabled or not request_profiler.authorized():
+            abort(404)
+        profile = request_profiler.get(profile_id)
+        if profile is None:
+            abort(404)
+        entry, text, raw = profile
+        if request.args.get('format') == 'raw':
+            if entry['kind'] == 'cprofile':
+                return Response(raw, mimetype='application/octet-stream', headers={
+                    'Content-Disposition': f'attachment; filename=profile-{profile_id}.pstats'})
+            return Response(raw, mimetype='text/plain')
+        if request.args.get('format') == 'text':
+            return Response(text, mimetype='text/plain')
+        return jsonify(dict(entry, report=text))
+    
+    @app.errorhandler(404)
+    def not_found(error):
+        return jsonify({'error': 'Resource not found'}), 404
+    
+    @app.errorhandler(500)
+    def internal_error(error):
+        return jsonify({'error': 'Internal server error'}), 500
+    
+    @app.errorhandler(Exception)
+    def handle_exception(e):
+        return jsonify({'error': str(e)}), 500
+    
+    return app
 
-@app.route('/health')
-def health():
-    success, message = test_connection()
-    return jsonify({
-        'status': 'healthy' if success else 'unhealthy',
-        'timestamp': datetime.now().isoformat(),
-        'database': message
-    }), 200 if success else 500
-
-@app.errorhandler(404)
-def not_found(error):
-    return jsonify({'error': 'Resource not found'}), 404
-
-@app.errorhandler(500)
-def internal_error(error):
-    return jsonify({'error': 'Internal server error'}), 500
-
-@app.errorhandler(Exception)
-def handle_exception(e):
-    return jsonify({'error': str(e)}), 500
+app = create_app()
 
 if __name__ == '__main__':
     success, message = test_connection()
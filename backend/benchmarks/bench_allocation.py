@@ -0,0 +1,192 @@
+"""
+Measure FEFO allocation throughput with many parallel allocators
+
+Adds fresh available bags and open requests, then lets each thread take the
+most urgent open request, allocate it and commit, until the queue is empty.
+Afterwards checks that no bag was issued twice, that every bag points at the
+request it was issued to, that units_fulfilled matches the issue rows and
+that every issued bag is compatible with its request for the bag's component
+(the bench bags mix whole blood, red cells and plasma, and the requests name
+no component).
+
+Usage (from backend/):
+    python -m benchmarks.bench_allocation --seed --scale 100000
+    python -m benchmarks.bench_allocation --threads 1 2 4 8 16 --requests 2000
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+
+import psycopg2.extras
+
+from allocation import allocate_request, compatible_types, pending_request_ids
+from benchmarks.common import connect, seed_dataset, summarize
+
+
+def add_stock(conn, bags, requests):
+    """Append available bags expiring over the next six weeks and open requests"""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT COALESCE(MAX(bag_id), 0) FROM blood_inventory")
+        bag_base = cursor.fetchone()[0]
+        cursor.execute("""
+            INSERT INTO blood_inventory (bag_number, blood_type, component_type, collection_date,
+                                         expiry_date, volume_ml, status, testing_status)
+            SELECT 'ALLOC-' || (%s + g), (enum_range(NULL::blood_group))[1 + g %% 8],
+                   (ARRAY['Whole Blood', 'Packed Red Cells', 'Plasma'])[1 + (g / 8) %% 3],
+                   CURRENT_DATE - (g %% 7), CURRENT_DATE + (g %% 42), 450, 'available', 'passed'
+            FROM generate_series(1, %s) g
+        """, (bag_base, bags))
+        cursor.execute("SELECT MIN(hospital_id) FROM hospital")
+        hospital_id = cursor.fetchone()[0]
+        # Close whatever was open so the queue holds exactly the bench requests.
+        cursor.execute("""
+            UPDATE recipient_request SET request_status = 'rejected'
+            WHERE request_status IN ('pending', 'approved')
+        """)
+        cursor.execute("""
+            INSERT INTO recipient_request (hospital_id, blood_type, units_requested, urgency_level,
+                                           patient_name, required_by_date)
+            SELECT %s, (enum_range(NULL::blood_group))[1 + g %% 8], 1 + g %% 4,
+                   (enum_range(NULL::urgency_level_t))[1 + g %% 3], 'Allocation bench ' || g,
+                   CURRENT_DATE + (g %% 10)
+            FROM generate_series(1, %s) g
+            RETURNING request_id
+        """, (hospital_id, requests))
+        request_ids = [row[0] for row in cursor.fetchall()]
+        cursor.execute("ANALYZE blood_inventory")
+        cursor.execute("ANALYZE recipient_request")
+    conn.commit()
+    return request_ids
+
+
+def allocator(results, errors):
+    conn = connect()
+    latencies = []
+    units = 0
+    try:
+        while True:
+            started = time.perf_counter()
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                request_ids = pending_request_ids(cursor, 1)
+                if not request_ids:
+                    conn.rollback()
+                    break
+                result = allocate_request(cursor, request_ids[0], issued_by='bench', lock_wait=False)
+                if result is not None and not result['bags']:
+                    # Nothing compatible left; take it out of the queue.
+                    cursor.execute("UPDATE recipient_request SET request_status = 'rejected' "
+                                   "WHERE request_id = %s", (request_ids[0],))
+            conn.commit()
+            latencies.append((time.perf_counter() - started) * 1000)
+            units += len(result['bags']) if result else 0
+    except Exception as e:
+        errors.append(repr(e))
+    finally:
+        conn.close()
+    results.append((latencies, units))
+
+
+def run(threads):
+    results, errors = [], []
+    workers = [threading.Thread(target=allocator, args=(results, errors)) for _ in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    seconds = time.perf_counter() - started
+
+    latencies = [ms for samples, _ in results for ms in samples]
+    units = sum(u for _, u in results)
+    return {
+        'threads': threads,
+        'allocations': len(latencies),
+        'units': units,
+        'seconds': round(seconds, 2),
+        'allocations_per_sec': round(len(latencies) / seconds, 1),
+        'units_per_sec': round(units / seconds, 1),
+        'latency': summarize(latencies),
+        'errors': errors[:5],
+    }
+
+
+def verify(conn, request_ids):
+    """Invariant violations among the bench requests (all zero when correct)"""
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT COUNT(*) FROM (
+                SELECT bag_id FROM transaction_log
+                WHERE transaction_type = 'issue' AND request_id = ANY(%s)
+                GROUP BY bag_id HAVING COUNT(*) > 1
+            ) t
+        """, (request_ids,))
+        double_issued = cursor.fetchone()[0]
+        cursor.execute("""
+            SELECT COUNT(*) FROM transaction_log t
+            JOIN blood_inventory b ON b.bag_id = t.bag_id
+            WHERE t.transaction_type = 'issue' AND t.request_id = ANY(%s)
+              AND (b.status <> 'assigned' OR b.assigned_to_request <> t.request_id)
+        """, (request_ids,))
+        bag_mismatch = cursor.fetchone()[0]
+        cursor.execute("""
+            SELECT COUNT(*) FROM recipient_request rr
+            LEFT JOIN (
+                SELECT request_id, COUNT(*) as issued FROM transaction_log
+                WHERE transaction_type = 'issue' GROUP BY request_id
+            ) t ON t.request_id = rr.request_id
+            WHERE rr.request_id = ANY(%s)
+              AND (COALESCE(t.issued, 0) <> rr.units_fulfilled OR rr.units_fulfilled > rr.units_requested)
+        """, (request_ids,))
+        fulfilled_mismatch = cursor.fetchone()[0]
+        cursor.execute("""
+            SELECT rr.blood_type::text, b.blood_type::text, b.component_type
+            FROM transaction_log t
+            JOIN blood_inventory b ON b.bag_id = t.bag_id
+            JOIN recipient_request rr ON rr.request_id = t.request_id
+            WHERE t.transaction_type = 'issue' AND t.request_id = ANY(%s)
+        """, (request_ids,))
+        issues = cursor.fetchall()
+    conn.rollback()
+    incompatible = sum(1 for recipient, donor, component in issues
+                       if donor not in compatible_types(recipient, component))
+    # The case that matters most: O whole blood or O plasma given to AB.
+    o_to_ab = sum(1 for recipient, donor, component in issues
+                  if recipient == 'AB+' and donor.startswith('O')
+                  and component in ('Whole Blood', 'Plasma'))
+    return {'double_issued_bags': double_issued, 'bag_request_mismatch': bag_mismatch,
+            'units_fulfilled_mismatch': fulfilled_mismatch, 'incompatible_issues': incompatible,
+            'ab_pos_given_o_whole_blood_or_plasma': o_to_ab}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--requests', type=int, default=2000, help='open requests per round')
+    parser.add_argument('--bags', type=int, default=None,
+                        help='fresh bags per round (default: enough to cover most requests)')
+    parser.add_argument('--seed', action='store_true', help='append a synthetic dataset first')
+    parser.add_argument('--scale', type=int, default=100000, help='donor count when seeding')
+    args = parser.parse_args()
+
+    conn = connect()
+    if args.seed:
+        seed_dataset(conn, donors=args.scale, hospitals=max(args.scale // 200, 10),
+                     donations=args.scale * 3, bags=args.scale * 3, requests=args.scale * 2)
+
+    rounds = []
+    for threads in args.threads:
+        request_ids = add_stock(conn, args.bags or args.requests * 2, args.requests)
+        result = run(threads)
+        result['invariants'] = verify(conn, request_ids)
+        rounds.append(result)
+    conn.close()
+
+    failed = any(any(r['invariants'].values()) or r['errors'] for r in rounds)
+    print(json.dumps({'requests_per_round': args.requests, 'rounds': rounds}, indent=2))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
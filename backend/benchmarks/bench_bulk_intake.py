@@ -0,0 +1,133 @@
+"""
+Compare rows/sec of the single-record create endpoints with the bulk endpoints
+
+For donors, donations and inventory bags, posts --single rows one request at a
+time and --rows rows as one JSON array and as one CSV upload, all through the
+Flask test client. Also times db_utils.execute_many with a per-row INSERT
+(executemany) against its multi-row VALUES fast path.
+
+Usage (from backend/):
+    python -m benchmarks.bench_bulk_intake --rows 20000 --single 1000
+"""
+import argparse
+import csv
+import io
+import json
+import time
+
+from db_utils import execute_many, execute_query
+
+# Distinguishes the rows of one run so unique columns never collide.
+RUN = format(int(time.time() * 1000) % 36 ** 6, 'x')
+
+BLOOD_TYPES = ['O+', 'O-', 'A+', 'A-', 'B+', 'B-', 'AB+', 'AB-']
+
+
+def donor_row(i):
+    return {
+        'firstName': f'Bulk{i}', 'lastName': f'Intake{RUN}', 'phone': str(7000000000 + i),
+        'email': f'bulk{i}.{RUN}@example.test', 'bloodType': BLOOD_TYPES[i % 8],
+        'dateOfBirth': '1990-01-01', 'city': 'City', 'gender': 'Other',
+    }
+
+
+def donation_row(i, donor_ids):
+    return {
+        'donorId': donor_ids[i % len(donor_ids)], 'donationDate': '2026-01-15',
+        'volumeMl': 450, 'bloodType': BLOOD_TYPES[i % 8], 'hemoglobinLevel': 13.5,
+        'screened': True, 'staffName': 'Bench',
+    }
+
+
+def bag_row(i):
+    return {
+        'bagNumber': f'BULK-{RUN}-{i}', 'bloodType': BLOOD_TYPES[i % 8],
+        'collectionDate': '2026-01-15', 'expiryDate': '2026-02-26', 'volumeMl': 450,
+        'storageLocation': 'Fridge 1',
+    }
+
+
+def to_csv(rows):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=list(rows[0]))
+    writer.writeheader()
+    writer.writerows(rows)
+    return out.getvalue().encode('utf-8')
+
+
+def timed(fn):
+    started = time.perf_counter()
+    inserted = fn()
+    return inserted, time.perf_counter() - started
+
+
+def compare(client, url, make_row, single, rows, offset):
+    """rows/sec for single-record posts, a bulk JSON array and a bulk CSV upload"""
+    def post_single():
+        for i in range(single):
+            response = client.post(url, json=make_row(offset + i))
+            assert response.status_code == 201, response.get_json()
+        return single
+
+    def post_bulk(body, content_type):
+        response = client.post(f'{url}/bulk', data=body, content_type=content_type)
+        report = response.get_json()
+        assert response.status_code == 201 and not report['rejected'], report
+        return report['inserted']
+
+    json_rows = [make_row(offset + single + i) for i in range(rows)]
+    csv_rows = [make_row(offset + single + rows + i) for i in range(rows)]
+    json_body = json.dumps(json_rows).encode('utf-8')
+    csv_body = to_csv(csv_rows)
+
+    results = {}
+    for name, fn in (
+        ('single', post_single),
+        ('bulk_json', lambda: post_bulk(json_body, 'application/json')),
+        ('bulk_csv', lambda: post_bulk(csv_body, 'text/csv')),
+    ):
+        inserted, seconds = timed(fn)
+        results[name] = {'rows': inserted, 'seconds': round(seconds, 3),
+                         'rows_per_sec': round(inserted / seconds, 1)}
+    results['speedup'] = round(results['bulk_json']['rows_per_sec']
+                               / results['single']['rows_per_sec'], 1)
+    return results
+
+
+def compare_execute_many(rows):
+    columns = "first_name, last_name, phone, email, blood_type, date_of_birth"
+    params = [(f'Many{i}', f'Exec{RUN}', str(6000000000 + i), None, BLOOD_TYPES[i % 8],
+               '1990-01-01') for i in range(rows)]
+    results = {}
+    for name, query in (
+        ('executemany', f"INSERT INTO donor ({columns}) VALUES (%s, %s, %s, %s, %s::blood_group, %s)"),
+        ('values_fast_path', f"INSERT INTO donor ({columns}) VALUES %s"),
+    ):
+        inserted, seconds = timed(lambda: execute_many(query, params))
+        results[name] = {'rows': inserted, 'seconds': round(seconds, 3),
+                         'rows_per_sec': round(inserted / seconds, 1)}
+    execute_query("DELETE FROM donor WHERE last_name = %s", (f'Exec{RUN}',), fetch=False)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=20000, help='rows per bulk upload')
+    parser.add_argument('--single', type=int, default=1000, help='rows posted one at a time')
+    args = parser.parse_args()
+
+    from app import app
+    client = app.test_client()
+
+    results = {'donors': compare(client, '/api/donors', donor_row, args.single, args.rows, 0)}
+    donor_ids = [row['donor_id'] for row in execute_query(
+        "SELECT donor_id FROM donor WHERE last_name = %s", (f'Intake{RUN}',))]
+    results['donations'] = compare(client, '/api/donations',
+                                   lambda i: donation_row(i, donor_ids), args.single, args.rows, 0)
+    results['inventory'] = compare(client, '/api/inventory', bag_row, args.single, args.rows, 0)
+    results['execute_many'] = compare_execute_many(args.rows)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""
+Measure change feed delivery lag and check missed-event resync
+
+Runs a ChangeFeed listener in this process and writes from a separate
+connection (UPDATE hospital ... SET bed_capacity = bed_capacity, which
+only moves updated_at):
+
+    lag      --writes single-row commits one at a time; time from sending
+             COMMIT to the subscriber being called
+    burst    --burst commits back to back; every one must arrive, and the
+             time until the last one did
+    rollback a rolled-back write must not be delivered
+    outage   the listener's backend is terminated, --writes commits happen
+             while it is down; it must reconnect and send a resync, the
+             missed commits must not show up as changes, and changes must
+             flow again afterwards
+
+Exits with status 1 if any check fails.
+
+Usage (from backend/):
+    python -m benchmarks.bench_change_feed --writes 200 --burst 2000
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+
+from benchmarks.common import connect, summarize
+from change_feed import ChangeFeed
+
+
+class Recorder:
+    """Subscriber remembering when each hospital id was reported"""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.arrivals = {}      # hospital_id -> monotonic time of the latest change
+        self.resyncs = []
+
+    def __call__(self, change):
+        now = time.monotonic()
+        with self.cond:
+            if change.table is None:
+                self.resyncs.append(now)
+            else:
+                for hospital_id in change.ids or ():
+                    self.arrivals[hospital_id] = now
+            self.cond.notify_all()
+
+    def wait_for(self, predicate, timeout):
+        with self.cond:
+            return self.cond.wait_for(predicate, timeout)
+
+
+def touch(conn, hospital_ids, commit=True):
+    """Write the hospitals in one transaction; returns when COMMIT was sent"""
+    with conn.cursor() as cursor:
+        cursor.execute("UPDATE hospital SET bed_capacity = bed_capacity WHERE hospital_id = ANY(%s)",
+                       (list(hospital_ids),))
+    sent = time.monotonic()
+    if commit:
+        conn.commit()
+    else:
+        conn.rollback()
+    return sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--writes', type=int, default=200, help='sequential commits for the lag test')
+    parser.add_argument('--burst', type=int, default=2000, help='back-to-back commits')
+    args = parser.parse_args()
+
+    conn = connect()
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT hospital_id FROM hospital ORDER BY hospital_id")
+        hospitals = [row[0] for row in cursor.fetchall()]
+    conn.commit()
+    if len(hospitals) < 2:
+        raise SystemExit('Need at least two hospitals; seed the database first')
+
+    recorder = Recorder()
+    feed = ChangeFeed(ping_interval=1.0, ping_timeout=5.0, reconnect_delay=0.5)
+    feed.subscribe(('hospital',), recorder)
+    feed.start()
+    if not recorder.wait_for(lambda: recorder.resyncs, 10):
+        raise SystemExit('Listener did not connect')
+
+    results, failures = {}, []
+
+    lags = []
+    for i in range(args.writes):
+        hospital_id = hospitals[i % len(hospitals)]
+        recorder.arrivals.pop(hospital_id, None)
+        committing = touch(conn, [hospital_id])
+        if not recorder.wait_for(lambda: hospital_id in recorder.arrivals, 5):
+            failures.append(f'lag: change to hospital {hospital_id} not delivered')
+            break
+        lags.append((recorder.arrivals[hospital_id] - committing) * 1000)
+    results['lag_commit_to_callback'] = summarize(lags)
+
+    recorder.arrivals.clear()
+    received_before = feed.stats()['received']
+    started = time.monotonic()
+    for i in range(args.burst):
+        touch(conn, [hospitals[i % len(hospitals)]])
+    written = time.monotonic()
+    expected = received_before + args.burst
+    delivered = recorder.wait_for(lambda: feed.received >= expected, 30)
+    finished = time.monotonic()
+    results['burst'] = {
+        'commits': args.burst,
+        'delivered': feed.stats()['received'] - received_before,
+        'commits_per_sec': round(args.burst / (written - started), 1),
+        'drain_after_last_commit_ms': round((finished - written) * 1000, 3),
+    }
+    if not delivered:
+        failures.append(f"burst: {results['burst']['delivered']} of {args.burst} delivered")
+
+    marker = hospitals[0]
+    recorder.arrivals.pop(marker, None)
+    touch(conn, [marker], commit=False)
+    touch(conn, [hospitals[1]])     # committed after it, so its arrival bounds the wait
+    recorder.wait_for(lambda: hospitals[1] in recorder.arrivals, 5)
+    results['rollback_delivered'] = marker in recorder.arrivals
+    if results['rollback_delivered']:
+        failures.append('rollback: a rolled-back write was delivered')
+
+    resyncs_before = len(recorder.resyncs)
+    recorder.arrivals.clear()
+    with conn.cursor() as cursor:
+        killed = time.monotonic()
+        cursor.execute("SELECT pg_terminate_backend(%s)", (feed.backend_pid,))
+    conn.commit()
+    missed = hospitals[:min(args.writes, len(hospitals))]
+    for hospital_id in missed:
+        touch(conn, [hospital_id])
+    resynced = recorder.wait_for(lambda: len(recorder.resyncs) > resyncs_before, 60)
+    after = hospitals[-1]
+    recorder.arrivals.pop(after, None)
+    touch(conn, [after])
+    flowing = recorder.wait_for(lambda: after in recorder.arrivals, 5)
+    results['outage'] = {
+        'writes_while_down': len(missed),
+        'delivered_while_down': len(set(missed) & set(recorder.arrivals) - {after}),
+        'resynced': resynced,
+        'kill_to_resync_ms': round((recorder.resyncs[-1] - killed) * 1000, 3) if resynced else None,
+        'delivering_after_resync': flowing,
+    }
+    if not resynced:
+        failures.append('outage: no resync after the listener was terminated')
+    if not flowing:
+        failures.append('outage: changes not delivered after reconnecting')
+
+    feed.stop()
+    conn.close()
+    results['feed'] = feed.stats()
+    results['failures'] = failures
+    print(json.dumps(results, indent=2))
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Compare the legacy sequential dashboard queries with the combined query
+
+Usage (from backend/):
+    python -m benchmarks.bench_dashboard --runs 50
+    python -m benchmarks.bench_dashboard --seed --runs 50   # append a large synthetic dataset first
+"""
+import argparse
+import json
+
+import psycopg2.extras
+
+from benchmarks.common import connect, seed_dataset, summarize, time_runs
+from routes.dashboard import DASHBOARD_STATS_QUERY
+
+# The statements /api/dashboard/stats issued before it was rebuilt, in order.
+LEGACY_QUERIES = [
+    "SELECT COUNT(*) as count FROM donor",
+    "SELECT COUNT(*) as count FROM hospital",
+    "SELECT COUNT(*) as count FROM blood_donation",
+    """
+        SELECT COUNT(*) as count
+        FROM blood_inventory
+        WHERE status = 'available' AND expiry_date >= CURRENT_DATE
+    """,
+    """
+        SELECT COUNT(*) as count
+        FROM recipient_request
+        WHERE request_status = 'pending'
+    """,
+    """
+        SELECT blood_type::text as name, COUNT(*) as units
+        FROM blood_inventory
+        WHERE status = 'available' AND expiry_date >= CURRENT_DATE
+        GROUP BY blood_type
+        ORDER BY blood_type
+    """,
+    """
+        SELECT
+            TO_CHAR(donation_date, 'Mon') as month,
+            COUNT(*) as donations
+        FROM blood_donation
+        WHERE donation_date >= CURRENT_DATE - INTERVAL '6 months'
+        GROUP BY TO_CHAR(donation_date, 'Mon'), DATE_TRUNC('month', donation_date)
+        ORDER BY DATE_TRUNC('month', donation_date)
+    """,
+    """
+        SELECT request_status::text as status, COUNT(*) as count
+        FROM recipient_request
+        GROUP BY request_status
+    """,
+    """
+        SELECT COUNT(*) as count
+        FROM blood_inventory
+        WHERE expiry_date BETWEEN CURRENT_DATE AND CURRENT_DATE + INTERVAL '7 days'
+              AND status IN ('available', 'reserved')
+    """,
+    "SELECT COUNT(*) as count FROM blood_inventory",
+    "SELECT COUNT(*) as count FROM recipient_request",
+]
+
+
+def run_legacy(conn):
+    # Each helper call used to commit on its own, so commit after every query.
+    with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+        for query in LEGACY_QUERIES:
+            cursor.execute(query)
+            cursor.fetchall()
+            conn.commit()
+
+
+def run_combined(conn):
+    with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+        cursor.execute(DASHBOARD_STATS_QUERY)
+        cursor.fetchone()
+        conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=30)
+    parser.add_argument('--seed', action='store_true', help='append a synthetic dataset before timing')
+    parser.add_argument('--scale', type=int, default=100000, help='donor count when seeding')
+    args = parser.parse_args()
+
+    conn = connect()
+    if args.seed:
+        seed_dataset(conn, donors=args.scale, hospitals=max(10, args.scale // 200),
+                     donations=args.scale * 3, bags=args.scale * 3, requests=args.scale * 2)
+        with conn.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        conn.commit()
+
+    results = {
+        'legacy': dict(summarize(time_runs(lambda: run_legacy(conn), args.runs)),
+                       queries=len(LEGACY_QUERIES)),
+        'combined': dict(summarize(time_runs(lambda: run_combined(conn), args.runs)),
+                         queries=1),
+    }
+    conn.close()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Compare the old four-column ILIKE donor search with the full-text search and
+the in-memory suggest index
+
+Usage (from backend/):
+    python -m benchmarks.bench_donor_search --seed --scale 1000000
+    python -m benchmarks.bench_donor_search --runs 20
+"""
+import argparse
+import json
+import random
+
+import psycopg2.extras
+
+from benchmarks.common import connect, seed_dataset, summarize, time_runs
+from routes.donors import (DONOR_LIST_COLUMNS, DONOR_SEARCH_CANDIDATES, DONOR_SEARCH_LIMIT,
+                           DONOR_SEARCH_VECTOR, donor_suggest_index, donor_tsquery,
+                           normalize_search_term)
+
+COLUMNS = ', '.join(DONOR_LIST_COLUMNS.values())
+
+# What GET /api/donors?search= ran before (first page of 1000).
+LEGACY_QUERY = f"""
+    SELECT {COLUMNS}
+    FROM donor
+    WHERE 1=1 AND (first_name ILIKE %s OR last_name ILIKE %s OR email ILIKE %s OR phone ILIKE %s)
+    ORDER BY created_at DESC, donor_id DESC LIMIT 1001
+"""
+
+# What it runs now without filters.
+SEARCH_QUERY = f"""
+    SELECT {COLUMNS}
+    FROM (
+        SELECT * FROM donor
+        WHERE {DONOR_SEARCH_VECTOR} @@ to_tsquery('simple', %s)
+        LIMIT {DONOR_SEARCH_CANDIDATES}
+    ) donor
+    ORDER BY ts_rank({DONOR_SEARCH_VECTOR}, to_tsquery('simple', %s)) DESC, donor_id DESC
+    LIMIT {DONOR_SEARCH_LIMIT}
+"""
+
+
+def run(conn, query, params):
+    with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+    conn.rollback()
+    return len(rows)
+
+
+def sample_terms(conn):
+    """One donor's name, a name prefix, phone and email fragments, a miss and a very broad term"""
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT first_name, last_name, phone, email FROM donor
+            ORDER BY donor_id DESC OFFSET (SELECT COUNT(*) / 2 FROM donor) LIMIT 1
+        """)
+        first_name, last_name, phone, email = cursor.fetchone()
+    conn.rollback()
+    return {
+        'exact_name': f'{first_name} {last_name}',
+        'name_prefix': first_name[:max(3, len(first_name) - 2)],
+        'phone_fragment': phone[:7],
+        'email': email or last_name,
+        'no_match': 'zzqx',
+        'broad': last_name[:3],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--seed', action='store_true', help='append synthetic donors first')
+    parser.add_argument('--scale', type=int, default=1000000, help='donor count when seeding')
+    parser.add_argument('--lookups', type=int, default=10000, help='suggest lookups to time')
+    args = parser.parse_args()
+
+    conn = connect()
+    if args.seed:
+        seed_dataset(conn, donors=args.scale, hospitals=10, donations=0, bags=0, requests=0)
+        with conn.cursor() as cursor:
+            cursor.execute("ANALYZE donor")
+        conn.commit()
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM donor")
+        donors = cursor.fetchone()[0]
+    conn.rollback()
+
+    results = {'donors': donors, 'search': {}}
+    for name, term in sample_terms(conn).items():
+        pattern = f'%{term}%'
+        tsquery = donor_tsquery(term)
+        results['search'][name] = {
+            'term': term,
+            'ilike_rows': run(conn, LEGACY_QUERY, (pattern,) * 4),
+            'ilike': summarize(time_runs(
+                lambda: run(conn, LEGACY_QUERY, (pattern,) * 4), args.runs)),
+            'fulltext_rows': run(conn, SEARCH_QUERY, (tsquery, tsquery)),
+            'fulltext': summarize(time_runs(
+                lambda: run(conn, SEARCH_QUERY, (tsquery, tsquery)), args.runs)),
+        }
+    conn.close()
+
+    donor_suggest_index.search('a')   # first use builds the index
+    stats = donor_suggest_index.stats()
+    results['suggest_index'] = {
+        'keys': stats['keys'],
+        'megabytes': round(stats['bytes'] / 1e6, 1),
+        'build_seconds': stats['build_seconds'],
+    }
+
+    rng = random.Random(7)
+    with connect() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT first_name || ' ' || last_name, phone FROM donor "
+                       "ORDER BY random() LIMIT 1000")
+        samples = cursor.fetchall()
+    prefixes = []
+    for name, phone in samples:
+        prefixes.append(normalize_search_term(name[:rng.randint(1, len(name))]))
+        prefixes.append(normalize_search_term(phone[:rng.randint(3, len(phone))]))
+
+    lookups = [prefixes[i % len(prefixes)] for i in range(args.lookups)]
+    position = iter(range(len(lookups)))
+    samples_ms = time_runs(lambda: donor_suggest_index.search(lookups[next(position)], 10),
+                           len(lookups) - 2)
+    results['suggest_lookup'] = summarize(samples_ms)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""
+Compare the vectorized forecast with a naive per-row Python loop
+
+The naive side does what a straightforward implementation would: fetch the
+raw request rows and usable bags of the window, add them up into per-type
+dicts one row at a time, smooth each type's series in a Python loop and
+walk the horizon day by day, bag by bag, for the supply projection. The
+vectorized side is forecast.build_forecast (one query per array, NumPy for
+the rest). Both must agree on demand, days of supply, stockout day and
+waste. A second comparison times only the arithmetic, on the same arrays.
+
+Usage (from backend/):
+    python -m benchmarks.bench_forecast --runs 10
+    python -m benchmarks.bench_forecast --seed --scale 100000
+"""
+import argparse
+import json
+import math
+from collections import defaultdict
+from datetime import date, timedelta
+
+import numpy as np
+
+from benchmarks.common import connect, seed_dataset, summarize, time_runs
+
+RAW_REQUESTS = """
+    SELECT request_date, blood_type::text, units_requested
+    FROM recipient_request
+    WHERE request_date >= %s AND request_date < %s AND request_status <> 'rejected'
+"""
+
+RAW_BAGS = """
+    SELECT blood_type::text, expiry_date
+    FROM blood_inventory
+    WHERE status = 'available' AND expiry_date >= CURRENT_DATE AND testing_status <> 'failed'
+"""
+
+
+def naive_level(series, alpha):
+    level = series[0]
+    for units in series[1:]:
+        level = alpha * units + (1 - alpha) * level
+    return level
+
+
+def naive_projection(expiries, level, horizon):
+    """Day by day FEFO walk over the bags; returns (days_of_supply, stockout_day, waste)"""
+    counts = defaultdict(float)
+    for offset in expiries:
+        counts[offset] += 1
+    buckets = [[offset, counts[offset]] for offset in sorted(counts)]
+    days_of_supply = len(expiries) / level if level > 0 else math.inf
+    stockout, waste = -1, 0.0
+    for day in range(horizon):
+        need = level
+        while need > 0 and buckets:
+            take = min(need, buckets[0][1])
+            need -= take
+            buckets[0][1] -= take
+            if buckets[0][1] <= 0:
+                buckets.pop(0)
+        if need > 1e-9 and stockout < 0:
+            stockout = day
+        while buckets and buckets[0][0] <= day:
+            waste += buckets.pop(0)[1]
+    return days_of_supply, stockout, waste
+
+
+def naive_forecast(conn, blood_types, history, horizon, alpha):
+    end = date.today()
+    start = end - timedelta(days=history)
+    daily = defaultdict(float)
+    stock = defaultdict(list)
+    with conn.cursor() as cursor:
+        cursor.execute(RAW_REQUESTS, (start, end))
+        for request_date, blood_type, units in cursor:
+            daily[blood_type, (request_date.date() - start).days] += units
+        cursor.execute(RAW_BAGS)
+        for blood_type, expiry_date in cursor:
+            stock[blood_type].append(min((expiry_date - end).days, horizon))
+    conn.rollback()
+
+    results = {}
+    for blood_type in blood_types:
+        series = [daily[blood_type, day] for day in range(history)]
+        level = naive_level(series, alpha)
+        results[blood_type] = (level,) + naive_projection(stock[blood_type], level, horizon)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--history', type=int, default=180)
+    parser.add_argument('--horizon', type=int, default=14)
+    parser.add_argument('--alpha', type=float, default=0.3)
+    parser.add_argument('--seed', action='store_true', help='append a synthetic dataset first')
+    parser.add_argument('--scale', type=int, default=100000, help='donor count when seeding')
+    args = parser.parse_args()
+
+    conn = connect()
+    if args.seed:
+        seed_dataset(conn, donors=args.scale, hospitals=max(10, args.scale // 200),
+                     donations=args.scale * 3, bags=args.scale * 3, requests=args.scale * 2)
+        with conn.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        conn.commit()
+
+    from app import app
+    import forecast
+    from rollups import rollup_refresher
+    rollup_refresher.refresh()
+
+    def vectorized():
+        with app.app_context():
+            return forecast.build_forecast(method='ewma', alpha=args.alpha,
+                                           history=args.history, horizon=args.horizon)
+
+    def naive():
+        return naive_forecast(conn, forecast.BLOOD_TYPES, args.history, args.horizon, args.alpha)
+
+    with app.app_context():
+        demand = forecast.load_demand(args.history)
+        stock = forecast.load_stock(args.horizon)
+    expiries = {bt: np.repeat(np.arange(args.horizon + 1), stock[i].astype(int)).tolist()
+                for i, bt in enumerate(forecast.BLOOD_TYPES)}
+
+    def compute_numpy():
+        level = forecast.demand_level(demand, 'ewma', args.alpha)
+        return level, forecast.project_supply(stock, level)
+
+    def compute_loop():
+        results = []
+        for i, blood_type in enumerate(forecast.BLOOD_TYPES):
+            level = naive_level(demand[i].tolist(), args.alpha)
+            results.append(naive_projection(expiries[blood_type], level, args.horizon))
+        return results
+
+    expected = naive()
+    actual = {row['blood_type']: row for row in vectorized()['blood_types']}
+    level, (days_of_supply, stockout_day, waste) = compute_numpy()
+    mismatches = []
+    for i, blood_type in enumerate(forecast.BLOOD_TYPES):
+        naive_level_, naive_supply, naive_stockout, naive_waste = expected[blood_type]
+        row = actual[blood_type]
+        if not (math.isclose(level[i], naive_level_, rel_tol=1e-9, abs_tol=1e-9)
+                and (days_of_supply[i] == naive_supply
+                     or math.isclose(days_of_supply[i], naive_supply, rel_tol=1e-9))
+                and int(stockout_day[i]) == naive_stockout
+                and abs(waste[i] - naive_waste) < 1e-6
+                and row['daily_demand'] == round(naive_level_, 2)):
+            mismatches.append(blood_type)
+
+    results = {
+        'history_days': args.history,
+        'horizon_days': args.horizon,
+        'mismatches': mismatches,
+        'naive_rows': summarize(time_runs(naive, args.runs)),
+        'vectorized': summarize(time_runs(vectorized, args.runs)),
+        'compute_only': {
+            'python_loop': summarize(time_runs(compute_loop, args.runs)),
+            'numpy': summarize(time_runs(compute_numpy, args.runs)),
+        },
+    }
+    conn.close()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Compare JSON encoding of list responses before and after the central provider
+
+Needs no database: rows are synthesized in the shape psycopg2 returns for
+/api/donations (dates, datetimes, enum strings).
+
+Usage (from backend/):
+    python -m benchmarks.bench_json --rows 100000 --runs 5
+"""
+import argparse
+import datetime
+import json
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+import json_provider
+from benchmarks.common import summarize, time_runs
+from json_provider import FastJSONProvider
+
+COLUMNS = ('donation_id', 'donor_id', 'donor_name', 'blood_type', 'donation_date',
+           'volume_ml', 'hemoglobin_level', 'donation_status', 'created_at')
+
+
+def make_rows(count):
+    base_date = datetime.date(2025, 1, 1)
+    base_time = datetime.datetime(2025, 1, 1, 9, 30)
+    types = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
+    return [
+        (i, i % 5000, 'Donor %d' % i, types[i % 8], base_date + datetime.timedelta(days=i % 700),
+         450, 13.5, 'completed', base_time + datetime.timedelta(minutes=i))
+        for i in range(count)
+    ]
+
+
+def legacy(provider, tuples):
+    """Per-row isoformat()/str() loop followed by Flask's default provider"""
+    rows = [dict(zip(COLUMNS, row)) for row in tuples]
+    for row in rows:
+        row['donation_date'] = row['donation_date'].isoformat()
+        row['created_at'] = row['created_at'].isoformat()
+        row['blood_type'] = str(row['blood_type'])
+        row['donation_status'] = str(row['donation_status'])
+    return provider.dumps(rows)
+
+
+def direct(provider, tuples):
+    """Rows handed to the provider unchanged"""
+    return provider.dumps([dict(zip(COLUMNS, row)) for row in tuples])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    default_provider = DefaultJSONProvider(app)
+    fast_provider = FastJSONProvider(app)
+    tuples = make_rows(args.rows)
+
+    assert json.loads(legacy(default_provider, tuples)) == json.loads(direct(fast_provider, tuples))
+
+    cases = {
+        'legacy_loop_default_provider': lambda: legacy(default_provider, tuples),
+        'fast_provider': lambda: direct(fast_provider, tuples),
+    }
+    results = {'rows': args.rows, 'orjson': json_provider.orjson is not None}
+    for name, fn in cases.items():
+        timing = summarize(time_runs(fn, args.runs, warmup=1))
+        timing['rows_per_sec'] = int(args.rows / (timing['p50_ms'] / 1000)) if timing['p50_ms'] else 0
+        results[name] = timing
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,422 @@
+"""
+HTTP load and latency benchmark across all nine blueprints
+
+Starts the API (serve.py, or the development server with --server dev, or
+uses a running one with --url) against the configured database, then runs
+--concurrency client processes for --duration seconds. Each client plays
+one persona, picked by --mix weights, and loops over that persona's
+requests:
+
+    front_desk   donor search and autocomplete, donor lookups, registering
+                 donors and recording donations
+    inventory    stock list, stats and expiry polling, new bags, donations list
+    hospital     hospital pages, creating requests and following them up
+    coordinator  pending queue, approving and allocating requests,
+                 transactions, users and logins
+    dashboard    dashboard and report polling
+
+Requests are grouped by endpoint (method and route pattern) and reported
+with requests/sec, p50/p95/p99 latency, server errors (5xx) and other
+non-2xx answers. --output saves the results as JSON; --compare reads an
+earlier file and flags endpoints whose p95 or throughput got worse by more
+than --tolerance (exit status 1 when any did). Writes add rows to the
+database (donors, donations, bags, requests, transactions), so use a
+disposable, seeded one:
+
+    python -m benchmarks.generate_dataset --rows 1000000 --truncate
+
+Usage (from backend/):
+    python -m benchmarks.bench_load --duration 30 --concurrency 16 --output load.json
+    python -m benchmarks.bench_load --mix dashboard=1,front_desk=3 --compare load.json
+    python -m benchmarks.bench_load --url http://127.0.0.1:5000 --duration 60
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from urllib.parse import urlencode, urlsplit
+
+from benchmarks.common import connect, free_port, summarize, wait_ready
+
+BLOOD_TYPES = ('O+', 'O-', 'A+', 'A-', 'B+', 'B-', 'AB+', 'AB-')
+NAME_PREFIXES = ('sm', 'joh', 'gar', 'mar', 'lee', 'pat', 'ngu', 'wil', 'and', 'tho',
+                 'mic', 'jen', 'dav', 'ros', 'ch', 'kim')
+
+# Persona -> [(weight, endpoint, request builder)]. Builders take the client
+# state and return (method, path, query params, JSON body).
+PERSONAS = {
+    'front_desk': [
+        (4, 'GET /api/donors?search', lambda c: ('GET', '/api/donors', {
+            'search': c.rng.choice(NAME_PREFIXES), 'limit': 20}, None)),
+        (4, 'GET /api/donors/suggest', lambda c: ('GET', '/api/donors/suggest', {
+            'q': c.rng.choice(NAME_PREFIXES)}, None)),
+        (3, 'GET /api/donors/<id>', lambda c: ('GET', f'/api/donors/{c.donor()[0]}', None, None)),
+        (2, 'GET /api/donors/<id>/history', lambda c: (
+            'GET', f'/api/donors/{c.donor()[0]}/history', None, None)),
+        (1, 'POST /api/donors', lambda c: ('POST', '/api/donors', None, c.new_donor())),
+        (1, 'POST /api/donations', lambda c: ('POST', '/api/donations', None, c.new_donation())),
+    ],
+    'inventory': [
+        (3, 'GET /api/inventory', lambda c: ('GET', '/api/inventory', {
+            'blood_type': c.rng.choice(BLOOD_TYPES), 'status': 'available', 'limit': 50}, None)),
+        (3, 'GET /api/inventory/stats', lambda c: ('GET', '/api/inventory/stats', None, None)),
+        (2, 'GET /api/inventory/expiring', lambda c: ('GET', '/api/inventory/expiring', {
+            'days': c.rng.choice((3, 7, 14))}, None)),
+        (1, 'GET /api/donations', lambda c: ('GET', '/api/donations', {'limit': 50}, None)),
+        (1, 'POST /api/inventory', lambda c: ('POST', '/api/inventory', None, c.new_bag())),
+    ],
+    'hospital': [
+        (1, 'GET /api/hospitals', lambda c: ('GET', '/api/hospitals', {'limit': 100}, None)),
+        (1, 'GET /api/hospitals/<id>', lambda c: (
+            'GET', f'/api/hospitals/{c.hospital()}', None, None)),
+        (2, 'GET /api/hospitals/<id>/requests', lambda c: (
+            'GET', f'/api/hospitals/{c.hospital()}/requests', None, None)),
+        (2, 'POST /api/requests', lambda c: ('POST', '/api/requests', None, c.new_request())),
+        (2, 'GET /api/requests/<id>', lambda c: (
+            'GET', f'/api/requests/{c.request_id()}', None, None)),
+    ],
+    'coordinator': [
+        (3, 'GET /api/requests?status', lambda c: ('GET', '/api/requests', {
+            'status': 'pending', 'limit': 50}, None)),
+        (2, 'PUT /api/requests/<id>', lambda c: (
+            'PUT', f'/api/requests/{c.request_id(own=True)}', None,
+            {'status': 'approved', 'approvedBy': 'loadtest'})),
+        (1, 'POST /api/requests/<id>/allocate', lambda c: (
+            'POST', f'/api/requests/{c.request_id(own=True)}/allocate', None,
+            {'issuedBy': 'loadtest'})),
+        (1, 'GET /api/transactions', lambda c: ('GET', '/api/transactions', {'limit': 50}, None)),
+        (1, 'POST /api/users/login', lambda c: ('POST', '/api/users/login', None,
+                                                {'username': c.username()})),
+        (1, 'GET /api/users', lambda c: ('GET', '/api/users', None, None)),
+    ],
+    'dashboard': [
+        (3, 'GET /api/dashboard/stats', lambda c: ('GET', '/api/dashboard/stats', None, None)),
+        (2, 'GET /api/dashboard/recent-activity', lambda c: (
+            'GET', '/api/dashboard/recent-activity', None, None)),
+        (1, 'GET /api/dashboard/monthly-comparison', lambda c: (
+            'GET', '/api/dashboard/monthly-comparison', None, None)),
+        (1, 'GET /api/reports/stats', lambda c: ('GET', '/api/reports/stats', {'days': 30}, None)),
+        (1, 'GET /api/reports/blood-usage', lambda c: ('GET', '/api/reports/blood-usage', None, None)),
+        (1, 'GET /api/reports/inventory-snapshot', lambda c: (
+            'GET', '/api/reports/inventory-snapshot', None, None)),
+        (1, 'GET /api/reports/request-status-summary', lambda c: (
+            'GET', '/api/reports/request-status-summary', None, None)),
+        (1, 'GET /api/reports/forecast', lambda c: ('GET', '/api/reports/forecast', None, None)),
+    ],
+}
+
+DEFAULT_MIX = 'front_desk=3,inventory=2,hospital=2,coordinator=1,dashboard=2'
+
+DEV_SERVER = ("from app import app; "
+              "app.run(debug=True, host='127.0.0.1', port={port}, use_reloader=False)")
+
+
+def sample_ids(size=2000):
+    """Existing ids for the clients to read and write against"""
+    conn = connect()
+    queries = {
+        'donors': "SELECT donor_id, blood_type::text FROM donor TABLESAMPLE SYSTEM (5) LIMIT %s",
+        'hospitals': "SELECT hospital_id FROM hospital LIMIT %s",
+        'requests': "SELECT request_id FROM recipient_request TABLESAMPLE SYSTEM (5) LIMIT %s",
+        'users': "SELECT username FROM users LIMIT %s",
+    }
+    ids = {}
+    with conn.cursor() as cursor:
+        for name, query in queries.items():
+            cursor.execute(query, (size,))
+            rows = cursor.fetchall()
+            ids[name] = [tuple(row) if len(row) > 1 else row[0] for row in rows]
+        cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = 'donor'")
+        ids['donor_rows'] = cursor.fetchone()[0]
+    conn.close()
+    missing = [name for name in ('donors', 'hospitals', 'requests', 'users') if not ids[name]]
+    if missing:
+        raise SystemExit(f"No {', '.join(missing)} to work with; seed the database first "
+                         "(python -m benchmarks.generate_dataset)")
+    return ids
+
+
+class Client:
+    """One virtual user: its persona, random stream and the requests it created"""
+
+    def __init__(self, number, persona, ids, seed, token):
+        self.number = number
+        self.persona = persona
+        self.ids = ids
+        self.rng = random.Random(f'{seed}-{number}')
+        self.token = f'{token}{number:03d}'
+        self.created = 0
+        self.own_requests = []
+
+    def _next(self):
+        self.created += 1
+        return f'{self.token}{self.created:06d}'
+
+    def donor(self):
+        return self.rng.choice(self.ids['donors'])
+
+    def hospital(self):
+        return self.rng.choice(self.ids['hospitals'])
+
+    def username(self):
+        return self.rng.choice(self.ids['users'])
+
+    def request_id(self, own=False):
+        if own and self.own_requests:
+            return self.own_requests.pop()
+        return self.rng.choice(self.ids['requests'])
+
+    def new_donor(self):
+        unique = self._next()
+        return {
+            'firstName': 'Load', 'lastName': f'Test{unique}',
+            'email': f'load{unique}@example.test', 'phone': f'7{unique[-9:]:0>9}',
+            'bloodType': self.rng.choice(BLOOD_TYPES), 'gender': self.rng.choice(('Male', 'Female')),
+            'dateOfBirth': (date.today() - timedelta(days=self.rng.randint(18 * 365, 65 * 365))).isoformat(),
+            'city': 'Load City', 'state': 'LC',
+        }
+
+    def new_donation(self):
+        donor_id, blood_type = self.donor()
+        return {'donorId': donor_id, 'donationDate': date.today().isoformat(),
+                'bloodType': blood_type, 'volumeMl': 450, 'location': 'Load Center',
+                'staffName': 'loadtest'}
+
+    def new_bag(self):
+        today = date.today()
+        return {'bagNumber': f'LOAD-{self._next()}', 'bloodType': self.rng.choice(BLOOD_TYPES),
+                'collectionDate': today.isoformat(),
+                'expiryDate': (today + timedelta(days=42)).isoformat(),
+                'volumeMl': 450, 'testingStatus': 'passed'}
+
+    def new_request(self):
+        return {'hospitalId': self.hospital(), 'bloodType': self.rng.choice(BLOOD_TYPES),
+                'units': self.rng.randint(1, 4), 'urgency': self.rng.choice(('Routine', 'Urgent')),
+                'patientName': f'Load Patient {self._next()}', 'contactNumber': '5550000000',
+                'requiredBy': (date.today() + timedelta(days=3)).isoformat()}
+
+    def remember(self, endpoint, body):
+        if endpoint == 'POST /api/requests' and isinstance(body, dict):
+            created = body.get('request') or {}
+            if isinstance(created, dict) and created.get('request_id'):
+                self.own_requests.append(created['request_id'])
+
+
+def run_client(number, persona, ids, args, token, results):
+    """Loop over the persona's requests on one keep-alive connection until the deadline"""
+    client = Client(number, persona, ids, args.seed, token)
+    actions = PERSONAS[persona]
+    weights = [weight for weight, _, _ in actions]
+    target = urlsplit(args.url)
+    conn = http.client.HTTPConnection(target.hostname, target.port, timeout=120)
+    samples = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+    deadline = time.monotonic() + args.duration
+    while time.monotonic() < deadline:
+        _, endpoint, build = client.rng.choices(actions, weights)[0]
+        method, path, params, body = build(client)
+        if params:
+            path += '?' + urlencode(params)
+        payload = json.dumps(body) if body is not None else None
+        headers = {'Content-Type': 'application/json'} if payload else {}
+        started = time.perf_counter()
+        try:
+            conn.request(method, path, payload, headers)
+            response = conn.getresponse()
+            data = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            data, status = b'', 599
+        samples[endpoint].append((time.perf_counter() - started) * 1000)
+        statuses[endpoint][status] += 1
+        if status < 300 and method == 'POST':
+            try:
+                client.remember(endpoint, json.loads(data))
+            except ValueError:
+                pass
+        if args.think_ms:
+            time.sleep(client.rng.expovariate(1000.0 / args.think_ms))
+    results.put((persona, dict(samples), {k: dict(v) for k, v in statuses.items()}))
+
+
+def run_load(args, ids, personas):
+    """Run the clients; returns (samples by endpoint, statuses by endpoint, elapsed seconds)"""
+    results = multiprocessing.Queue()
+    token = datetime.now().strftime('%y%m%d%H%M%S')
+    procs = [multiprocessing.Process(target=run_client,
+                                     args=(i, persona, ids, args, token, results))
+             for i, persona in enumerate(personas)]
+    started = time.perf_counter()
+    for proc in procs:
+        proc.start()
+    collected = [results.get() for _ in procs]
+    elapsed = time.perf_counter() - started
+    for proc in procs:
+        proc.join()
+
+    samples, statuses = defaultdict(list), defaultdict(lambda: defaultdict(int))
+    for _, client_samples, client_statuses in collected:
+        for endpoint, values in client_samples.items():
+            samples[endpoint].extend(values)
+        for endpoint, counts in client_statuses.items():
+            for status, count in counts.items():
+                statuses[endpoint][status] += count
+    return samples, statuses, elapsed
+
+
+def assign_personas(mix, concurrency):
+    """Clients per persona in proportion to the mix, at least one for each weighted persona"""
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        if name not in PERSONAS:
+            raise SystemExit(f"Unknown persona {name!r}; choose from {', '.join(PERSONAS)}")
+        weights[name] = float(weight or 1)
+    total = sum(weights.values())
+    personas = []
+    for name, weight in weights.items():
+        personas += [name] * max(1, round(concurrency * weight / total))
+    return personas
+
+
+def report(samples, statuses, elapsed):
+    endpoints = {}
+    for endpoint in sorted(samples):
+        counts = statuses[endpoint]
+        endpoints[endpoint] = dict(
+            summarize(samples[endpoint]),
+            requests_per_sec=round(len(samples[endpoint]) / elapsed, 2),
+            server_errors=sum(n for status, n in counts.items() if status >= 500),
+            other_non_2xx=sum(n for status, n in counts.items() if 300 <= status < 500),
+            statuses={str(status): n for status, n in sorted(counts.items())},
+        )
+    everything = [value for values in samples.values() for value in values]
+    total = dict(summarize(everything), requests_per_sec=round(len(everything) / elapsed, 2),
+                 server_errors=sum(e['server_errors'] for e in endpoints.values()),
+                 other_non_2xx=sum(e['other_non_2xx'] for e in endpoints.values()))
+    return total, endpoints
+
+
+def compare(baseline, current, tolerance):
+    """Endpoints whose p95 rose or throughput fell by more than tolerance"""
+    regressions = []
+    for endpoint, now in current['endpoints'].items():
+        before = baseline.get('endpoints', {}).get(endpoint)
+        if not before:
+            continue
+        if now['p95_ms'] > before['p95_ms'] * (1 + tolerance) and now['p95_ms'] - before['p95_ms'] > 1:
+            regressions.append({'endpoint': endpoint, 'metric': 'p95_ms',
+                                'baseline': before['p95_ms'], 'current': now['p95_ms']})
+        if now['requests_per_sec'] < before['requests_per_sec'] * (1 - tolerance):
+            regressions.append({'endpoint': endpoint, 'metric': 'requests_per_sec',
+                                'baseline': before['requests_per_sec'],
+                                'current': now['requests_per_sec']})
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_server(args):
+    """Start the server to test on a free port; returns the process (None for --url)"""
+    if args.url:
+        return None
+    port = free_port()
+    args.url = f'http://127.0.0.1:{port}'
+    if args.server == 'dev':
+        command = [sys.executable, '-c', DEV_SERVER.format(port=port)]
+    else:
+        command = [sys.executable, 'serve.py', '--bind', f'127.0.0.1:{port}',
+                   '--workers', str(args.workers), '--threads', str(args.threads)]
+    env = dict(os.environ, EXPIRY_SWEEP_INTERVAL=os.getenv('EXPIRY_SWEEP_INTERVAL', '0'))
+    proc = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_ready(port)
+    return proc
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds of measured load')
+    parser.add_argument('--warmup', type=float, default=5.0, help='seconds of unmeasured load first')
+    parser.add_argument('--concurrency', type=int, default=16, help='client processes')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='persona=weight,... (default %(default)s)')
+    parser.add_argument('--think-ms', type=float, default=0.0,
+                        help='mean pause between a client\'s requests (0 = closed loop, as fast as possible)')
+    parser.add_argument('--seed', type=int, default=1, help='seeds each client\'s request sequence')
+    parser.add_argument('--server', choices=('gunicorn', 'dev'), default='gunicorn')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--url', help='load an already running server instead of starting one')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to check against')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='relative p95/throughput change reported as a regression')
+    args = parser.parse_args()
+
+    personas = assign_personas(args.mix, args.concurrency)
+    ids = sample_ids()
+    proc = start_server(args)
+    try:
+        if args.warmup > 0:
+            measured = args.duration
+            args.duration = args.warmup
+            run_load(args, ids, personas)
+            args.duration = measured
+        samples, statuses, elapsed = run_load(args, ids, personas)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=60)
+
+    total, endpoints = report(samples, statuses, elapsed)
+    results = {
+        'meta': {
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'server': 'url' if proc is None else args.server,
+            'workers': args.workers if args.server == 'gunicorn' and proc is not None else None,
+            'threads': args.threads if args.server == 'gunicorn' and proc is not None else None,
+            'clients': len(personas),
+            'personas': {name: personas.count(name) for name in PERSONAS if name in personas},
+            'duration_s': round(elapsed, 2),
+            'think_ms': args.think_ms,
+            'seed': args.seed,
+            'donor_rows': ids['donor_rows'],
+        },
+        'total': total,
+        'endpoints': endpoints,
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            results['regressions'] = compare(json.load(f), results, args.tolerance)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    print(f"{'endpoint':<42} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'5xx':>5} {'4xx':>5}")
+    for endpoint, row in list(endpoints.items()) + [('TOTAL', total)]:
+        print(f"{endpoint:<42} {row['requests_per_sec']:>8.1f} {row['p50_ms']:>8.1f} "
+              f"{row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['server_errors']:>5} "
+              f"{row['other_non_2xx']:>5}")
+    for regression in results.get('regressions', []):
+        print(f"REGRESSION {regression['endpoint']}: {regression['metric']} "
+              f"{regression['baseline']} -> {regression['current']}")
+    if results.get('regressions'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Measure the per-query overhead of query instrumentation
+
+Times fetch_one('SELECT 1') outside a request with metrics disabled and
+enabled, plus the cost of the disabled check alone without a database.
+
+Usage (from backend/):
+    python -m benchmarks.bench_metrics --runs 2000
+"""
+import argparse
+import json
+import time
+
+from benchmarks.common import summarize, time_runs
+from db_utils import fetch_one
+from metrics import query_metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=2000)
+    args = parser.parse_args()
+
+    def query():
+        fetch_one("SELECT 1")
+
+    results = {}
+    for enabled in (False, True):
+        query_metrics.enabled = enabled
+        query_metrics.reset()
+        results['enabled' if enabled else 'disabled'] = summarize(
+            time_runs(query, args.runs, warmup=50)
+        )
+
+    # The only work left on the hot path when disabled is this branch.
+    query_metrics.enabled = False
+    loops = 1000000
+    started = time.perf_counter()
+    for _ in range(loops):
+        if query_metrics.enabled:
+            pass
+    results['disabled_check_ns'] = round((time.perf_counter() - started) / loops * 1e9, 1)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Compare a year of monthly summaries: 12 x 4 EXTRACT queries vs one range request
+
+The legacy side runs the four EXTRACT(YEAR/MONTH ...) counts the endpoint used
+to issue, once per month, committing after each like the old helpers did. The
+new side calls /api/reports/monthly-summary?from=...&to=... through the Flask
+test client with the aggregate cache cleared. Both must return the same counts.
+
+Usage (from backend/):
+    python -m benchmarks.bench_monthly_summary --year 2025 --runs 10
+    python -m benchmarks.bench_monthly_summary --seed --scale 100000
+"""
+import argparse
+import json
+
+from benchmarks.common import connect, seed_dataset, summarize, time_runs
+
+LEGACY_QUERIES = {
+    'donations': """
+        SELECT COUNT(*) FROM blood_donation
+        WHERE EXTRACT(YEAR FROM donation_date) = {year}
+            AND EXTRACT(MONTH FROM donation_date) = {month}
+    """,
+    'requests': """
+        SELECT COUNT(*) FROM recipient_request
+        WHERE EXTRACT(YEAR FROM request_date) = {year}
+            AND EXTRACT(MONTH FROM request_date) = {month}
+    """,
+    'new_donors': """
+        SELECT COUNT(*) FROM donor
+        WHERE EXTRACT(YEAR FROM created_at) = {year}
+            AND EXTRACT(MONTH FROM created_at) = {month}
+    """,
+    'expired_units': """
+        SELECT COUNT(*) FROM blood_inventory
+        WHERE EXTRACT(YEAR FROM expiry_date) = {year}
+            AND EXTRACT(MONTH FROM expiry_date) = {month}
+            AND status = 'expired'
+    """,
+}
+
+
+def run_legacy(conn, year):
+    summaries = []
+    with conn.cursor() as cursor:
+        for month in range(1, 13):
+            summary = {'year': year, 'month': month}
+            for key, query in LEGACY_QUERIES.items():
+                cursor.execute(query.format(year=year, month=month))
+                summary[key] = cursor.fetchone()[0]
+                conn.commit()
+            summaries.append(summary)
+    return summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--year', type=int, default=2025)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--seed', action='store_true', help='append a synthetic dataset first')
+    parser.add_argument('--scale', type=int, default=100000, help='donor count when seeding')
+    args = parser.parse_args()
+
+    from app import app
+    from cache import aggregate_cache
+    client = app.test_client()
+    url = f'/api/reports/monthly-summary?from={args.year}-01&to={args.year}-12'
+
+    def run_range():
+        aggregate_cache.clear()
+        response = client.get(url)
+        assert response.status_code == 200, response.get_json()
+        return response.get_json()['months']
+
+    conn = connect()
+    if args.seed:
+        seed_dataset(conn, donors=args.scale, hospitals=max(10, args.scale // 200),
+                     donations=args.scale * 3, bags=args.scale * 3, requests=args.scale * 2)
+        with conn.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        conn.commit()
+
+    results = {
+        'identical': run_legacy(conn, args.year) == run_range(),
+        'legacy': dict(summarize(time_runs(lambda: run_legacy(conn, args.year), args.runs)),
+                       queries=12 * len(LEGACY_QUERIES)),
+        'range': dict(summarize(time_runs(run_range, args.runs)),
+                      queries=len(LEGACY_QUERIES)),
+    }
+    conn.close()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
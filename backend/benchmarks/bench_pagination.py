@@ -0,0 +1,77 @@
+"""
+Compare OFFSET paging with keyset paging at increasing page depths
+
+Usage (from backend/):
+    python -m benchmarks.bench_pagination --page-size 50 --runs 20
+    python -m benchmarks.bench_pagination --seed --scale 500000
+"""
+import argparse
+import json
+
+import psycopg2.extras
+
+from benchmarks.common import connect, seed_dataset, summarize, time_runs
+from pagination import KeysetPage, encode_cursor
+from routes.donors import DONOR_LIST_COLUMNS, DONOR_LIST_ORDER
+
+
+def offset_query(page_size, depth):
+    columns = ', '.join(DONOR_LIST_COLUMNS.values())
+    return (f"SELECT {columns} FROM donor ORDER BY created_at DESC, donor_id DESC "
+            f"LIMIT {page_size} OFFSET {depth}")
+
+
+def keyset_query(conn, page_size, depth):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT created_at, donor_id FROM donor ORDER BY created_at DESC, donor_id DESC "
+            "OFFSET %s LIMIT 1", (max(depth - 1, 0),)
+        )
+        last = cursor.fetchone()
+    args = {'limit': str(page_size)}
+    if depth and last:
+        args['cursor'] = encode_cursor(last)
+    page = KeysetPage(args, DONOR_LIST_COLUMNS, DONOR_LIST_ORDER)
+    where, params = page.where()
+    query = f"SELECT {page.select_list()} FROM donor WHERE 1=1{where}{page.order_limit()}"
+    return query, tuple(params)
+
+
+def run(conn, query, params=None):
+    with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+        cursor.execute(query, params)
+        cursor.fetchall()
+    conn.rollback()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--depths', default='0,1000,10000,50000,100000')
+    parser.add_argument('--seed', action='store_true', help='append a synthetic dataset before timing')
+    parser.add_argument('--scale', type=int, default=200000, help='donor count when seeding')
+    args = parser.parse_args()
+
+    conn = connect()
+    if args.seed:
+        seed_dataset(conn, donors=args.scale, hospitals=10, donations=0, bags=0, requests=0)
+        with conn.cursor() as cursor:
+            cursor.execute("ANALYZE donor")
+        conn.commit()
+
+    results = []
+    for depth in [int(d) for d in args.depths.split(',')]:
+        offset_sql = offset_query(args.page_size, depth)
+        keyset_sql, keyset_params = keyset_query(conn, args.page_size, depth)
+        results.append({
+            'depth': depth,
+            'offset': summarize(time_runs(lambda: run(conn, offset_sql), args.runs)),
+            'keyset': summarize(time_runs(lambda: run(conn, keyset_sql, keyset_params), args.runs)),
+        })
+    conn.close()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Compare the eight report requests of the reports page with one /batch call
+
+Runs the eight GET report endpoints one after another and the same reports
+as a single POST /api/reports/batch, through the Flask test client with the
+aggregate cache cleared before every run, and checks both return the same
+data. The batch runs the reports in one read-only transaction on a single
+pooled connection; the test client has no network round trips, so over HTTP
+each saved request also saves a round trip.
+
+Usage (from backend/):
+    python -m benchmarks.bench_report_batch --runs 10
+    python -m benchmarks.bench_report_batch --seed --scale 100000
+"""
+import argparse
+import json
+
+from benchmarks.common import connect, seed_dataset, summarize, time_runs
+
+REPORTS = [
+    ('stats', {'days': 30}),
+    ('blood-usage', {'months': 6}),
+    ('blood-type-distribution', {'days': 180}),
+    ('hospital-requests', {'days': 180, 'limit': 5}),
+    ('donation-trends', {'months': 6}),
+    ('inventory-snapshot', {}),
+    ('donor-demographics', {}),
+    ('request-status-summary', {'days': 30}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--seed', action='store_true', help='append a synthetic dataset first')
+    parser.add_argument('--scale', type=int, default=100000, help='donor count when seeding')
+    args = parser.parse_args()
+
+    if args.seed:
+        conn = connect()
+        seed_dataset(conn, donors=args.scale, hospitals=max(10, args.scale // 200),
+                     donations=args.scale * 3, bags=args.scale * 3, requests=args.scale * 2)
+        with conn.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        conn.commit()
+        conn.close()
+
+    from app import app
+    from cache import aggregate_cache
+    client = app.test_client()
+
+    def separate():
+        aggregate_cache.clear()
+        data = {}
+        for name, params in REPORTS:
+            response = client.get(f'/api/reports/{name}', query_string=params)
+            assert response.status_code == 200, response.get_json()
+            data[name] = response.get_json()
+        return data
+
+    def batch():
+        aggregate_cache.clear()
+        response = client.post('/api/reports/batch', json={
+            'reports': [{'name': name, 'params': params} for name, params in REPORTS]
+        })
+        assert response.status_code == 200, response.get_json()
+        return {key: report['data'] for key, report in response.get_json()['reports'].items()}
+
+    results = {
+        'identical': separate() == batch(),
+        'separate': dict(summarize(time_runs(separate, args.runs)), requests=len(REPORTS)),
+        'batch': dict(summarize(time_runs(batch, args.runs)), requests=1),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Check interactive latency while heavy reports run as background jobs
+
+Times a cheap interactive request (one page of donors) on its own, then
+again while --jobs full exports run as report jobs, and reports how long the
+jobs took and that an identical submission was merged into a running job.
+
+Usage (from backend/):
+    python -m benchmarks.bench_report_jobs --jobs 4 --samples 200
+"""
+import argparse
+import json
+import time
+
+from benchmarks.common import summarize
+
+EXPORTS = [
+    {'type': 'requests', 'format': 'csv'},
+    {'type': 'donations', 'format': 'ndjson'},
+    {'type': 'inventory', 'format': 'csv'},
+    {'type': 'requests', 'format': 'json'},
+    {'type': 'donations', 'format': 'csv'},
+    {'type': 'inventory', 'format': 'ndjson'},
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--jobs', type=int, default=4, help='export jobs to submit (at most 6)')
+    parser.add_argument('--samples', type=int, default=200, help='interactive requests per phase')
+    parser.add_argument('--url', default='/api/donors?limit=20')
+    args = parser.parse_args()
+
+    from app import app
+    from report_jobs import report_jobs
+    client = app.test_client()
+
+    def interactive(samples):
+        timings = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            assert client.get(args.url).status_code == 200
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    results = {'workers': report_jobs.workers, 'idle': summarize(interactive(args.samples))}
+
+    started = time.perf_counter()
+    job_ids = []
+    for params in EXPORTS[:args.jobs]:
+        params = dict(params, gzip=1)   # keeps the stored results small
+        response = client.post('/api/reports/jobs', json={'name': 'export', 'params': params})
+        assert response.status_code == 202, response.get_json()
+        job_ids.append(response.get_json()['job_id'])
+    duplicate = client.post('/api/reports/jobs', json={
+        'name': 'export', 'params': dict(EXPORTS[0], gzip=1)
+    }).get_json()
+    results['duplicate_merged'] = duplicate['job_id'] == job_ids[0] and duplicate['deduplicated']
+
+    busy = []
+    statuses = {}
+    while True:
+        busy.extend(interactive(10))
+        statuses = {job_id: client.get(f'/api/reports/jobs/{job_id}').get_json() for job_id in job_ids}
+        if all(s['status'] in ('done', 'failed') for s in statuses.values()):
+            break
+    results['during_jobs'] = summarize(busy)
+    results['jobs'] = {
+        'count': len(job_ids),
+        'failed': sum(s['status'] == 'failed' for s in statuses.values()),
+        'result_bytes': sum(s['result_bytes'] or 0 for s in statuses.values()),
+        'seconds': round(time.perf_counter() - started, 2),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""
+Compare the report endpoints on the daily rollups with the raw-table queries
+
+For every endpoint that now reads donation_daily / request_daily, times the
+raw query it used to run against the endpoint itself (aggregate cache cleared
+before each call) and checks both return the same rows. Then writes --writes
+donations and requests spread over --days days, times the incremental refresh
+that folds them in and checks the results again. The background refresher is
+left off so the timed refresh is the one that does the work.
+
+Usage (from backend/):
+    python -m benchmarks.bench_rollups --runs 20
+    python -m benchmarks.bench_rollups --seed --scale 100000 --runs 20
+"""
+import argparse
+import json
+import time
+
+import psycopg2.extras
+
+from benchmarks.common import connect, seed_dataset, summarize, time_runs
+
+# The raw queries behind each endpoint before the rollups, keyed by URL.
+LEGACY_QUERIES = {
+    '/api/reports/blood-usage?months={months}': ["""
+        SELECT TO_CHAR(request_date, 'Mon') as month,
+               EXTRACT(YEAR FROM request_date) as year,
+               COUNT(*) as usage
+        FROM recipient_request
+        WHERE request_date >= CURRENT_DATE - INTERVAL '{months} months'
+            AND request_status = 'approved'
+        GROUP BY TO_CHAR(request_date, 'Mon'), DATE_TRUNC('month', request_date),
+                 EXTRACT(YEAR FROM request_date)
+        ORDER BY DATE_TRUNC('month', request_date)
+    """],
+    '/api/reports/blood-type-distribution?days={days}': ["""
+        SELECT blood_type::text as name, COUNT(*) as value
+        FROM blood_donation
+        WHERE donation_date >= CURRENT_DATE - INTERVAL '{days} days'
+        GROUP BY blood_type
+        ORDER BY blood_type
+    """],
+    '/api/reports/hospital-requests?days={days}&limit=1000000': ["""
+        SELECT h.name as hospital, COUNT(rr.request_id) as requests, h.hospital_id
+        FROM hospital h
+        LEFT JOIN recipient_request rr ON h.hospital_id = rr.hospital_id
+            AND rr.request_date >= CURRENT_DATE - INTERVAL '{days} days'
+        GROUP BY h.hospital_id, h.name
+        HAVING COUNT(rr.request_id) > 0
+        ORDER BY COUNT(rr.request_id) DESC
+    """],
+    '/api/reports/donation-trends?months={months}': ["""
+        SELECT TO_CHAR(donation_date, 'Mon') as month, blood_type::text, COUNT(*) as donations
+        FROM blood_donation
+        WHERE donation_date >= CURRENT_DATE - INTERVAL '{months} months'
+        GROUP BY TO_CHAR(donation_date, 'Mon'), DATE_TRUNC('month', donation_date), blood_type
+        ORDER BY DATE_TRUNC('month', donation_date), blood_type
+    """],
+    '/api/reports/request-status-summary?days={days}': ["""
+        SELECT request_status::text as status, COUNT(*) as count,
+               SUM(units_requested) as total_units
+        FROM recipient_request
+        WHERE request_date >= CURRENT_DATE - INTERVAL '{days} days'
+        GROUP BY request_status
+        ORDER BY request_status
+    """],
+    '/api/dashboard/monthly-comparison?months={months}': ["""
+        SELECT TO_CHAR(donation_date, 'Mon') as month, COUNT(*) as donations
+        FROM blood_donation
+        WHERE donation_date >= CURRENT_DATE - INTERVAL '{months} months'
+        GROUP BY TO_CHAR(donation_date, 'Mon'), DATE_TRUNC('month', donation_date)
+        ORDER BY DATE_TRUNC('month', donation_date)
+    """, """
+        SELECT TO_CHAR(request_date, 'Mon') as month, SUM(units_requested) as requests
+        FROM recipient_request
+        WHERE request_date >= CURRENT_DATE - INTERVAL '{months} months'
+        GROUP BY TO_CHAR(request_date, 'Mon'), DATE_TRUNC('month', request_date)
+        ORDER BY DATE_TRUNC('month', request_date)
+    """],
+}
+
+
+def run_legacy(conn, queries):
+    results = []
+    with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+        for query in queries:
+            cursor.execute(query)
+            results.append(cursor.fetchall())
+    conn.commit()
+    return results
+
+
+def legacy_shape(url, results):
+    """The legacy rows as the endpoint would have returned them"""
+    if 'monthly-comparison' in url:
+        donations, requests = results
+        merged = {r['month']: {'month': r['month'], 'donations': r['donations'], 'requests': 0}
+                  for r in donations}
+        for r in requests:
+            merged.setdefault(r['month'], {'month': r['month'], 'donations': 0})
+            merged[r['month']]['requests'] = r['requests']
+        return list(merged.values())
+    return results[0]
+
+
+def comparable(url, rows):
+    rows = [{k: v for k, v in row.items() if k != 'color'} for row in rows]
+    if 'hospital-requests' in url:
+        # Ties in the request count had no defined order in the raw query.
+        rows.sort(key=lambda r: (-r['requests'], r['hospital_id']))
+    return rows
+
+
+def write_changes(conn, writes, days):
+    """Add writes donations and requests spread over the last days days"""
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO blood_donation (donor_id, donation_date, volume_ml, blood_type)
+            SELECT d.donor_id, CURRENT_DATE - (g %% %s), 450, d.blood_type
+            FROM generate_series(1, %s) g
+            CROSS JOIN LATERAL (SELECT donor_id, blood_type FROM donor LIMIT 1) d
+        """, (days, writes))
+        cursor.execute("""
+            INSERT INTO recipient_request (hospital_id, blood_type, units_requested,
+                                           patient_name, request_status, request_date)
+            SELECT h.hospital_id, 'O+', 1 + g %% 4, 'Rollup ' || g, 'approved',
+                   NOW() - (g %% %s) * INTERVAL '1 day'
+            FROM generate_series(1, %s) g
+            CROSS JOIN LATERAL (SELECT hospital_id FROM hospital LIMIT 1) h
+        """, (days, writes))
+    conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--months', type=int, default=12)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--writes', type=int, default=1000, help='rows written before the refresh')
+    parser.add_argument('--seed', action='store_true', help='append a synthetic dataset first')
+    parser.add_argument('--scale', type=int, default=100000, help='donor count when seeding')
+    args = parser.parse_args()
+
+    from app import app
+    from cache import aggregate_cache
+    from rollups import rollup_refresher
+    rollup_refresher.interval = 0
+    client = app.test_client()
+
+    conn = connect()
+    if args.seed:
+        seed_dataset(conn, donors=args.scale, hospitals=max(10, args.scale // 200),
+                     donations=args.scale * 3, bags=args.scale * 3, requests=args.scale * 2)
+        with conn.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        conn.commit()
+    if rollup_refresher.refresh():
+        with conn.cursor() as cursor:
+            cursor.execute("ANALYZE donation_daily, request_daily, request_hospital_daily")
+        conn.commit()
+
+    def call(url):
+        aggregate_cache.clear()
+        response = client.get(url)
+        assert response.status_code == 200, response.get_json()
+        return response.get_json()
+
+    reports = []
+    for template, queries in LEGACY_QUERIES.items():
+        reports.append((template.format(months=args.months, days=args.days),
+                        [q.format(months=args.months, days=args.days) for q in queries]))
+
+    def identical(url, queries):
+        legacy = json.loads(app.json.dumps(legacy_shape(url, run_legacy(conn, queries))))
+        return comparable(url, legacy) == comparable(url, call(url))
+
+    results = {}
+    mismatches = 0
+    for url, queries in reports:
+        same = identical(url, queries)
+        mismatches += not same
+        results[url] = {
+            'legacy': summarize(time_runs(lambda: run_legacy(conn, queries), args.runs)),
+            'rollup': summarize(time_runs(lambda: call(url), args.runs)),
+            'identical': same,
+        }
+
+    write_changes(conn, args.writes, args.days)
+    started = time.perf_counter()
+    days = rollup_refresher.refresh()
+    results['refresh_after_writes'] = {
+        'rows_written': args.writes * 2,
+        'days_recomputed': days,
+        'seconds': round(time.perf_counter() - started, 4),
+    }
+    for url, queries in reports:
+        mismatches += not identical(url, queries)
+    results['mismatches'] = mismatches
+    conn.close()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
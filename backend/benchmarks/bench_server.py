@@ -0,0 +1,114 @@
+"""
+Load-test the development server against the gunicorn launcher
+
+Starts each server as a subprocess on a free port, waits for /health, then
+runs --clients client processes for --duration seconds, each sending the
+PATHS round-robin over one keep-alive connection, and reports requests/sec
+and latency percentiles per server. The development side is app.run as
+`python app.py` starts it (debug, threaded), minus the code reloader so it
+can be stopped cleanly; the production side is serve.py with --workers and
+--threads.
+
+Clients run on the same machine and compete with the server for CPU, so
+the absolute numbers are lower than a remote client would measure.
+
+Usage (from backend/):
+    python -m benchmarks.bench_server --duration 15 --clients 8 --workers 4 --threads 4
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.common import free_port, summarize, wait_ready
+
+PATHS = [
+    '/api/donors?limit=20',
+    '/api/inventory/stats',
+    '/api/dashboard/stats',
+    '/api/reports/stats',
+    '/api/hospitals',
+]
+
+DEV_SERVER = ("from app import app; "
+              "app.run(debug=True, host='127.0.0.1', port={port}, use_reloader=False)")
+
+
+def client(port, duration, results):
+    """One keep-alive connection sending PATHS in turn until duration is up"""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    samples, errors, i = [], 0, 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            conn.request('GET', PATHS[i % len(PATHS)])
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+            if response.getheader('Connection', '').lower() == 'close':
+                conn.close()
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+        samples.append((time.perf_counter() - started) * 1000)
+        i += 1
+    results.put((samples, errors))
+
+
+def load(port, clients, duration):
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=client, args=(port, duration, results))
+             for _ in range(clients)]
+    started = time.perf_counter()
+    for proc in procs:
+        proc.start()
+    collected = [results.get() for _ in procs]
+    elapsed = time.perf_counter() - started
+    for proc in procs:
+        proc.join()
+    samples = [s for batch, _ in collected for s in batch]
+    errors = sum(e for _, e in collected)
+    return dict(summarize(samples), requests=len(samples), errors=errors,
+                requests_per_sec=round(len(samples) / elapsed, 1))
+
+
+def run_server(command, port, args):
+    env = dict(os.environ, EXPIRY_SWEEP_INTERVAL='0')
+    proc = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(port)
+        load(port, args.clients, min(3.0, args.duration))   # warm caches and pools
+        return load(port, args.clients, args.duration)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--duration', type=float, default=15.0, help='seconds per server')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent client connections')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4)
+    args = parser.parse_args()
+
+    results = {'clients': args.clients, 'duration_s': args.duration, 'paths': PATHS}
+    port = free_port()
+    results['dev_server'] = run_server(
+        [sys.executable, '-c', DEV_SERVER.format(port=port)], port, args)
+    port = free_port()
+    results['gunicorn'] = dict(run_server(
+        [sys.executable, 'serve.py', '--bind', f'127.0.0.1:{port}',
+         '--workers', str(args.workers), '--threads', str(args.threads)],
+        port, args), workers=args.workers, threads=args.threads)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
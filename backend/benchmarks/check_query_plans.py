@@ -0,0 +1,215 @@
+"""
+Fail when a route query sequentially scans a large table
+
+Drives every GET route through the Flask test client (with representative
+filters, ids of existing rows and a second keyset page), captures the
+statements they execute and runs EXPLAIN on each. Exits non-zero if a plan
+contains a Seq Scan over a table with more than --min-rows rows, unless the
+endpoint is listed in FULL_SCAN_ALLOWED. Run it after `python migrate.py`
+against a seeded database; on a tiny database every table is "small".
+
+Usage (from backend/):
+    python -m benchmarks.check_query_plans --seed --scale 200000
+    python -m benchmarks.check_query_plans --min-rows 10000
+"""
+import argparse
+import json
+import os
+import sys
+
+import db_utils
+from benchmarks.common import connect, seed_dataset
+from cache import aggregate_cache
+from metrics import current_endpoint, query_metrics
+
+# Endpoints whose job is to aggregate a whole table, mapped to the tables they
+# may scan and why.
+FULL_SCAN_ALLOWED = {
+    'dashboard.get_dashboard_stats': {
+        'blood_inventory': 'counts every bag by type and status',
+        'recipient_request': 'counts every request by status',
+        'blood_donation': 'total donation count',
+        'donor': 'total donor count',
+    },
+    'inventory.get_inventory_stats': {'blood_inventory': 'counts every bag by type and status'},
+    'reports.get_report_stats': {'donor': 'total donor count'},
+    'reports.get_inventory_snapshot': {'blood_inventory': 'counts every bag by type and status'},
+    'reports.get_donor_demographics': {'donor': 'groups every donor'},
+    'users.get_users': {'users': 'lists every user (not paged)'},
+}
+
+# Endpoints that are not plain JSON reads of the database.
+SKIP_ENDPOINTS = {'static', 'index', 'health', 'metrics', 'slow_queries', 'reports.export_csv'}
+
+# How to find a real id for each URL converter argument.
+SAMPLE_IDS = {
+    'donor_id': "SELECT MAX(donor_id) FROM donor",
+    'hospital_id': "SELECT MAX(hospital_id) FROM hospital",
+    'request_id': "SELECT MAX(request_id) FROM recipient_request",
+    'bag_id': "SELECT MAX(bag_id) FROM blood_inventory",
+    'donation_id': "SELECT MAX(donation_id) FROM blood_donation",
+    'transaction_id': "SELECT MAX(transaction_id) FROM transaction_log",
+    'user_id': "SELECT MAX(user_id) FROM users",
+}
+
+# Filter combinations exercised in addition to the bare URL.
+EXTRA_ARGS = {
+    'donors.get_donors': ['blood_type=O%2B', 'status=available', 'search=bench',
+                          'search=9000', 'search=bench&blood_type=O%2B'],
+    'donors.suggest_donors': ['q=donor1'],
+    'inventory.get_inventory': ['blood_type=O%2B', 'status=available',
+                                'blood_type=A%2B&status=available'],
+    'inventory.get_expiring': ['days=3'],
+    'requests.get_requests': ['status=pending', 'hospital_id={hospital_id}'],
+    'transactions.get_transactions': ['request_id={request_id}'],
+    'donations.get_donations': ['donor_id={donor_id}'],
+    # A quarter: the seeded data spans three years, so a full year is a third
+    # of each table and a sequential scan is the right plan for it.
+    'reports.get_monthly_summary': ['year=2025&month=6', 'from=2025-01&to=2025-03'],
+}
+
+
+class RecordingCursor(db_utils.InstrumentedCursor):
+    """Cursor that also keeps every statement with its parameters bound"""
+
+    captured = None
+
+    def execute(self, query, vars=None):
+        if RecordingCursor.captured is not None:
+            RecordingCursor.captured.append(
+                (current_endpoint(), self.mogrify(query, vars).decode('utf-8'))
+            )
+        return super().execute(query, vars)
+
+
+def sample_ids(conn):
+    ids = {}
+    with conn.cursor() as cursor:
+        for name, query in SAMPLE_IDS.items():
+            cursor.execute(query)
+            ids[name] = cursor.fetchone()[0] or 1
+    conn.rollback()
+    return ids
+
+
+def route_urls(app, ids):
+    """Yield (endpoint, url) for every GET route, including filter variants"""
+    # A misspelt endpoint would otherwise just never have its variants checked.
+    unknown = set(EXTRA_ARGS) - {rule.endpoint for rule in app.url_map.iter_rules()}
+    if unknown:
+        raise SystemExit(f'EXTRA_ARGS names unknown endpoint(s): {", ".join(sorted(unknown))}')
+    for rule in sorted(app.url_map.iter_rules(), key=lambda r: r.rule):
+        if 'GET' not in rule.methods or rule.endpoint in SKIP_ENDPOINTS:
+            continue
+        missing = [arg for arg in rule.arguments if arg not in ids]
+        if missing:
+            print(f'skipping {rule.rule}: no sample id for {", ".join(missing)}', file=sys.stderr)
+            continue
+        url = rule.rule
+        for arg in rule.arguments:
+            url = url.replace(f'<int:{arg}>', str(ids[arg])).replace(f'<{arg}>', str(ids[arg]))
+        yield rule.endpoint, url
+        for extra in EXTRA_ARGS.get(rule.endpoint, []):
+            yield rule.endpoint, f'{url}?{extra.format(**ids)}'
+
+
+def capture_statements(app, urls):
+    """Request each URL (and its second keyset page) and collect the statements run"""
+    client = app.test_client()
+    statements = []
+    for endpoint, url in urls:
+        aggregate_cache.clear()
+        RecordingCursor.captured = []
+        separator = '&' if '?' in url else '?'
+        response = client.get(f'{url}{separator}limit=50')
+        next_cursor = response.headers.get('X-Next-Cursor')
+        if next_cursor:
+            client.get(f'{url}{separator}limit=50&cursor={next_cursor}')
+        if response.status_code >= 500:
+            print(f'{url}: HTTP {response.status_code} {response.get_data(as_text=True)[:200]}',
+                  file=sys.stderr)
+        for _, sql in RecordingCursor.captured:
+            if sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+                statements.append((endpoint, url, sql))
+        RecordingCursor.captured = None
+    return statements
+
+
+def seq_scans(plan):
+    """Relation names of every Seq Scan node in an EXPLAIN (FORMAT JSON) plan"""
+    found = []
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        if node.get('Node Type') == 'Seq Scan':
+            found.append(node['Relation Name'])
+        stack.extend(node.get('Plans', []))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--min-rows', type=int, default=10000,
+                        help='tables with more estimated rows count as large')
+    parser.add_argument('--seed', action='store_true', help='append a synthetic dataset first')
+    parser.add_argument('--scale', type=int, default=200000, help='donor count when seeding')
+    parser.add_argument('--json', action='store_true', help='print the findings as JSON')
+    args = parser.parse_args()
+
+    conn = connect()
+    if args.seed:
+        seed_dataset(conn, donors=args.scale, hospitals=max(args.scale // 200, 10),
+                     donations=args.scale * 3, bags=args.scale * 3, requests=args.scale * 2)
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        conn.autocommit = False
+
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT c.relname, c.reltuples::bigint
+            FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE c.relkind = 'r' AND n.nspname = current_schema()
+        """)
+        table_rows = dict(cursor.fetchall())
+    conn.rollback()
+
+    # The expiry sweeper's statements would be attributed to whichever route
+    # happens to be running when it wakes up.
+    os.environ['EXPIRY_SWEEP_INTERVAL'] = '0'
+    from app import app
+
+    query_metrics.enabled = True
+    db_utils.InstrumentedCursor = RecordingCursor
+    statements = capture_statements(app, route_urls(app, sample_ids(conn)))
+
+    findings = []
+    with conn.cursor() as cursor:
+        for endpoint, url, sql in statements:
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql)
+            plan = cursor.fetchone()[0][0]['Plan']
+            for table in seq_scans(plan):
+                rows = table_rows.get(table, 0)
+                if rows < args.min_rows:
+                    continue
+                allowed = FULL_SCAN_ALLOWED.get(endpoint, {}).get(table)
+                findings.append({'endpoint': endpoint, 'url': url, 'table': table,
+                                 'rows': rows, 'allowed': allowed})
+    conn.rollback()
+    conn.close()
+
+    failures = [f for f in findings if not f['allowed']]
+    if args.json:
+        print(json.dumps({'statements': len(statements), 'findings': findings}, indent=2))
+    else:
+        print(f'{len(statements)} statements explained, {len(findings)} large sequential scans, '
+              f'{len(failures)} not allowed')
+        for f in findings:
+            mark = 'ok  ' if f['allowed'] else 'FAIL'
+            print(f"{mark} {f['endpoint']:40} {f['table']:20} {f['rows']:>10}  "
+                  f"{f['allowed'] or f['url']}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""Shared helpers for the benchmark scripts"""
+import http.client
+import socket
+import statistics
+import time
+
+import psycopg2
+
+from db_utils import DB_CONFIG
+
+
+def connect():
+    """Open a dedicated (unpooled) connection for benchmarking"""
+    return psycopg2.connect(**DB_CONFIG)
+
+
+def percentile(samples, pct):
+    """Return the pct-th percentile of samples (nearest-rank)"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(samples_ms):
+    """p50/p95/p99/mean of a list of millisecond timings"""
+    return {
+        'runs': len(samples_ms),
+        'p50_ms': round(percentile(samples_ms, 50), 3),
+        'p95_ms': round(percentile(samples_ms, 95), 3),
+        'p99_ms': round(percentile(samples_ms, 99), 3),
+        'mean_ms': round(statistics.mean(samples_ms), 3) if samples_ms else 0.0,
+    }
+
+
+def time_runs(fn, runs, warmup=2):
+    """Call fn warmup + runs times and return the timed runs in milliseconds"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def free_port():
+    """A TCP port on 127.0.0.1 that is free right now"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(port, timeout=30.0):
+    """Poll /health on port until it answers 200"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/health')
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server on port {port} did not become ready')
+
+
+def seed_dataset(conn, donors=100000, hospitals=500, donations=300000,
+                 bags=300000, requests=200000):
+    """
+    Append synthetic rows to the core tables using generate_series
+
+    Intended for a development database. Rows are spread uniformly over the
+    last three years; blood types and statuses cycle through their enums.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT COALESCE(MAX(donor_id), 0) FROM donor")
+        donor_base = cursor.fetchone()[0]
+        cursor.execute("SELECT COALESCE(MAX(hospital_id), 0) FROM hospital")
+        hospital_base = cursor.fetchone()[0]
+        cursor.execute("SELECT COALESCE(MAX(donation_id), 0) FROM blood_donation")
+        donation_base = cursor.fetchone()[0]
+
+        cursor.execute("""
+            INSERT INTO donor (first_name, last_name, email, phone, blood_type,
+                               gender, date_of_birth, city, state, status, created_at)
+            SELECT 'Donor' || g, 'Bench' || g, 'bench' || (%s + g) || '@example.test',
+                   (9000000000 + %s + g)::text,
+                   (enum_range(NULL::blood_group))[1 + g %% 8],
+                   (ARRAY['Male', 'Female', 'Other'])[1 + g %% 3],
+                   DATE '1960-01-01' + (g %% 15000),
+                   'City' || (g %% 50), 'State' || (g %% 10), 'available',
+                   NOW() - (g %% 1095) * INTERVAL '1 day'
+            FROM generate_series(1, %s) g
+        """, (donor_base, donor_base, donors))
+        cursor.execute("""
+            CREATE TEMP TABLE bench_donor ON COMMIT DROP AS
+            SELECT row_number() OVER (ORDER BY donor_id) - 1 as n, donor_id, blood_type
+            FROM donor WHERE donor_id > %s
+        """, (donor_base,))
+
+        cursor.execute("""
+            INSERT INTO hospital (name, registration_number, phone, city, state, created_at)
+            SELECT 'Bench Hospital ' || (%s + g), 'BENCH-' || (%s + g), '0' || (800000000 + g),
+                   'City' || (g %% 50), 'State' || (g %% 10),
+                   NOW() - (g %% 1095) * INTERVAL '1 day'
+            FROM generate_series(1, %s) g
+        """, (hospital_base, hospital_base, hospitals))
+        cursor.execute("""
+            CREATE TEMP TABLE bench_hospital ON COMMIT DROP AS
+            SELECT row_number() OVER (ORDER BY hospital_id) - 1 as n, hospital_id
+            FROM hospital WHERE hospital_id > %s
+        """, (hospital_base,))
+
+        cursor.execute("""
+            INSERT INTO blood_donation (donor_id, donation_date, volume_ml, blood_type, created_at)
+            SELECT d.donor_id, CURRENT_DATE - (g %% 1095), 450, d.blood_type,
+                   NOW() - (g %% 1095) * INTERVAL '1 day'
+            FROM generate_series(1, %s) g
+            JOIN bench_donor d ON d.n = g %% %s
+        """, (donations, donors))
+
+        cursor.execute("""
+            INSERT INTO blood_inventory (bag_number, donation_id, donor_id, blood_type,
+                                         collection_date, expiry_date, volume_ml, status, created_at)
+            SELECT 'BENCH-' || (%s + g) || '-' || g, bd.donation_id, bd.donor_id, bd.blood_type,
+                   bd.donation_date, bd.donation_date + 42, 450,
+                   (enum_range(NULL::inventory_status_t))[1 + g %% 5],
+                   bd.donation_date::timestamp
+            FROM generate_series(1, %s) g
+            JOIN blood_donation bd ON bd.donation_id = %s + 1 + (g - 1) %% %s
+        """, (donation_base, bags, donation_base, donations))
+
+        cursor.execute("""
+            INSERT INTO recipient_request (hospital_id, blood_type, units_requested,
+                                           urgency_level, patient_name, request_status,
+                                           request_date, required_by_date, created_at)
+            SELECT h.hospital_id, (enum_range(NULL::blood_group))[1 + g %% 8], 1 + g %% 4,
+                   (enum_range(NULL::urgency_level_t))[1 + g %% 3], 'Patient ' || g,
+                   (enum_range(NULL::request_status_t))[1 + g %% 4],
+                   NOW() - (g %% 1095) * INTERVAL '1 day',
+                   CURRENT_DATE - (g %% 1095) + 3,
+                   NOW() - (g %% 1095) * INTERVAL '1 day'
+            FROM generate_series(1, %s) g
+            JOIN bench_hospital h ON h.n = g %% %s
+        """, (requests, hospitals))
+    conn.commit()
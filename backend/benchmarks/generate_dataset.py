@@ -0,0 +1,821 @@
+"""
+Deterministic synthetic dataset for all eight tables, loaded with parallel COPY
+
+Unlike common.seed_dataset (a quick generate_series append), this builds a
+dataset that looks like production: blood types follow population
+frequencies (demand skewed toward O-), donations and requests follow the
+seasons and the week, bags move through testing, issue to matching
+requests, return, expiry and discard, and donor totals, transaction and
+audit rows agree with them. Every value is a hash of (--seed, column,
+row number), so a chunk can be built by any worker in any order and the
+same seed, scale and end date always give the same rows, whatever --jobs is.
+
+--rows is the total across the eight tables (10k to 50M); the split is
+fixed per donor (see plan()). Rows are appended after the current highest
+ids, or with --truncate replace the current data (ids then match between
+runs too). Each table is loaded in chunks of --chunk rows, --jobs COPY
+streams at a time, parents before children; the per-row donor statistics
+trigger is switched off during the load since the donor rows already carry
+their totals. Daily rollups are refreshed at the end.
+
+Usage (from backend/):
+    python -m benchmarks.generate_dataset --rows 1000000 --seed 42 --jobs 4 --truncate
+    python -m benchmarks.generate_dataset --rows 50000000 --plan
+"""
+import argparse
+import hashlib
+import io
+import json
+import math
+import multiprocessing
+import time
+import zlib
+from datetime import date, timedelta
+
+import numpy as np
+
+from benchmarks.common import connect
+
+MIN_ROWS = 10_000
+MAX_ROWS = 50_000_000
+
+BLOOD_TYPES = ('O+', 'O-', 'A+', 'A-', 'B+', 'B-', 'AB+', 'AB-')
+# Share of donors per type, and of requested units (O- is given to anyone in an
+# emergency, so it is asked for well beyond its share of donors).
+DONOR_TYPE_SHARE = (0.374, 0.066, 0.357, 0.063, 0.085, 0.015, 0.034, 0.006)
+REQUEST_TYPE_SHARE = (0.330, 0.110, 0.320, 0.070, 0.090, 0.020, 0.045, 0.015)
+
+FIRST_NAMES = {
+    'Male': ('James', 'John', 'Robert', 'Michael', 'David', 'William', 'Richard', 'Joseph',
+             'Thomas', 'Carlos', 'Daniel', 'Matthew', 'Anthony', 'Mark', 'Luis', 'Steven',
+             'Andrew', 'Kevin', 'Brian', 'Raj', 'Wei', 'Ahmed', 'Samuel', 'Ethan'),
+    'Female': ('Mary', 'Patricia', 'Jennifer', 'Linda', 'Elizabeth', 'Barbara', 'Susan',
+               'Jessica', 'Sarah', 'Karen', 'Maria', 'Nancy', 'Lisa', 'Priya', 'Emily',
+               'Michelle', 'Ana', 'Laura', 'Mei', 'Fatima', 'Grace', 'Olivia', 'Emma', 'Sofia'),
+}
+FIRST_NAMES['Other'] = FIRST_NAMES['Male'][::2] + FIRST_NAMES['Female'][1::2]
+LAST_NAMES = ('Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis',
+              'Rodriguez', 'Martinez', 'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson',
+              'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin', 'Lee', 'Perez', 'Thompson',
+              'White', 'Harris', 'Sanchez', 'Clark', 'Ramirez', 'Lewis', 'Robinson', 'Walker',
+              'Young', 'Allen', 'King', 'Wright', 'Scott', 'Nguyen', 'Hill', 'Patel', 'Chen')
+GENDERS = ('Male', 'Female', 'Other')
+GENDER_SHARE = (0.49, 0.49, 0.02)
+CITIES = (('New York', 'NY', '100'), ('Los Angeles', 'CA', '900'), ('Chicago', 'IL', '606'),
+          ('Houston', 'TX', '770'), ('Phoenix', 'AZ', '850'), ('Philadelphia', 'PA', '191'),
+          ('San Antonio', 'TX', '782'), ('San Diego', 'CA', '921'), ('Dallas', 'TX', '752'),
+          ('Austin', 'TX', '787'), ('Jacksonville', 'FL', '322'), ('Columbus', 'OH', '432'),
+          ('Charlotte', 'NC', '282'), ('Seattle', 'WA', '981'), ('Denver', 'CO', '802'),
+          ('Boston', 'MA', '021'), ('Nashville', 'TN', '372'), ('Portland', 'OR', '972'),
+          ('Atlanta', 'GA', '303'), ('Miami', 'FL', '331'))
+CITY_SHARE = (0.16, 0.12, 0.08, 0.07, 0.05, 0.05, 0.04, 0.04, 0.04, 0.03,
+              0.03, 0.03, 0.03, 0.04, 0.04, 0.04, 0.03, 0.03, 0.04, 0.03)
+STREETS = ('Main St', 'Oak Ave', 'Maple Dr', 'Cedar Ln', 'Park Blvd', 'Elm St', 'Pine Rd',
+           'Lake Dr', 'Hill St', 'Washington Ave', 'River Rd', 'Sunset Blvd')
+HOSPITAL_TYPES = ('General', 'Teaching', 'Trauma Center', "Children's", 'Specialty')
+HOSPITAL_TYPE_SHARE = (0.50, 0.15, 0.15, 0.10, 0.10)
+DONATION_SITES = ('Main Center', 'Mobile Unit', 'University Drive', 'Corporate Drive',
+                  'Community Center', 'Hospital Site')
+COMPONENTS = ('Whole Blood', 'Packed Red Cells', 'Plasma', 'Platelets')
+COMPONENT_SHARE = (0.55, 0.30, 0.10, 0.05)
+COMPONENT_SHELF_DAYS = (35, 42, 365, 5)
+COMPONENT_VOLUME_ML = (450, 300, 250, 200)
+URGENCY = ('Routine', 'Urgent', 'Emergency')
+URGENCY_SHARE = (0.70, 0.22, 0.08)
+REQUEST_STATUSES = ('pending', 'approved', 'rejected', 'fulfilled')
+DIAGNOSES = ('Elective surgery', 'Trauma', 'Anemia', 'Cancer treatment', 'Childbirth',
+             'Cardiac surgery', 'Sickle cell disease', 'GI bleeding', 'Orthopedic surgery')
+REJECTIONS = ('Insufficient stock', 'Incomplete paperwork', 'Duplicate request')
+INVENTORY_STATUSES = ('available', 'reserved', 'assigned', 'expired', 'used')
+TESTING_STATUSES = ('pending', 'passed', 'failed')
+AUDITED = ('blood_inventory', 'recipient_request', 'donor', 'blood_donation')
+AUDITED_SHARE = (0.50, 0.25, 0.15, 0.10)
+
+TABLES = ('donor', 'hospital', 'blood_donation', 'recipient_request', 'blood_inventory',
+          'transaction_log', 'users', 'audit_log')
+ID_COLUMNS = {'donor': 'donor_id', 'hospital': 'hospital_id', 'blood_donation': 'donation_id',
+              'recipient_request': 'request_id', 'blood_inventory': 'bag_id',
+              'transaction_log': 'transaction_id', 'users': 'user_id', 'audit_log': 'log_id'}
+# Loaded in this order; tables in one phase only reference earlier phases.
+PHASES = (('donor', 'hospital'), ('blood_donation', 'recipient_request', 'users', 'audit_log'),
+          ('blood_inventory',), ('transaction_log',))
+ROLLUP_TABLES = ('donation_daily', 'request_daily', 'request_hospital_daily', 'rollup_change')
+
+# Rows of each kind per donor; transaction_log (about one row per bag that left
+# the shelf) is estimated here and counted exactly while loading.
+DONATIONS_PER_DONOR = 2.5
+REQUESTS_PER_DONOR = 1.1
+AUDIT_PER_DONOR = 0.4
+DONORS_PER_HOSPITAL = 400
+DONORS_PER_STAFF = 2000
+DONORS_PER_DONOR_USER = 10
+ROWS_PER_DONOR = (1 + 2 * DONATIONS_PER_DONOR + REQUESTS_PER_DONOR + AUDIT_PER_DONOR
+                  + 0.9 * DONATIONS_PER_DONOR + 1 / DONORS_PER_HOSPITAL
+                  + 1 / DONORS_PER_DONOR_USER)
+
+MASK64 = (1 << 64) - 1
+
+
+def _splitmix(x):
+    """splitmix64 finalizer on a uint64 array (wrapping arithmetic)"""
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xBF58476D1CE4E5B9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _stream_key(seed, name):
+    key = ((seed & 0xFFFFFFFF) << 32 | zlib.crc32(name.encode())) & MASK64
+    return np.uint64(int(_splitmix(np.array([key], dtype=np.uint64))[0]))
+
+
+class Random:
+    """Counter-based random numbers: the value for (column, row) never depends on order"""
+
+    def __init__(self, seed):
+        self.seed = seed
+        self._keys = {}
+
+    def uniform(self, name, index):
+        """Floats in [0, 1), one per row number in index"""
+        key = self._keys.get(name)
+        if key is None:
+            key = self._keys[name] = _stream_key(self.seed, name)
+        x = np.asarray(index, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15) + key
+        return (_splitmix(x) >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+
+    def choice(self, name, index, shares):
+        """Index into shares, drawn with those weights"""
+        cdf = np.cumsum(shares, dtype=np.float64)
+        picks = np.searchsorted(cdf / cdf[-1], self.uniform(name, index), side='right')
+        return np.minimum(picks, len(shares) - 1)
+
+    def integers(self, name, index, low, high):
+        """Integers in [low, high)"""
+        return low + (self.uniform(name, index) * (high - low)).astype(np.int64)
+
+    def normal(self, name, index):
+        u1 = self.uniform(name + '.1', index)
+        u2 = self.uniform(name + '.2', index)
+        return np.sqrt(-2.0 * np.log1p(-u1)) * np.cos(2 * np.pi * u2)
+
+
+def _bump(day_of_year, center, width):
+    distance = np.abs((day_of_year - center + 182.5) % 365.25 - 182.5)
+    return np.exp(-0.5 * (distance / width) ** 2)
+
+
+def day_weights(days, kind):
+    """
+    Relative volume per calendar day
+
+    Donations dip in mid-summer and over the year-end holidays, rise with
+    January drives and are lowest on Sundays. Requests are steadier: a
+    summer trauma season, a winter bump and fewer elective cases at weekends.
+    """
+    day_of_year = (days - days.astype('datetime64[Y]')).astype(np.int64)
+    weekday = (days.astype(np.int64) + 3) % 7   # 0 = Monday
+    if kind == 'donation':
+        season = (1 - 0.20 * _bump(day_of_year, 200, 25) - 0.35 * _bump(day_of_year, 362, 6)
+                  + 0.15 * _bump(day_of_year, 18, 10))
+        week = np.array([1.0, 1.0, 1.0, 1.0, 1.05, 1.1, 0.45])[weekday]
+    else:
+        season = 1 + 0.10 * _bump(day_of_year, 195, 35) + 0.06 * _bump(day_of_year, 20, 20)
+        week = np.array([1.05, 1.05, 1.05, 1.05, 1.0, 0.8, 0.75])[weekday]
+    return season * week
+
+
+def plan(rows):
+    """Row counts per table for about rows rows in total"""
+    donors = max(100, int(round(rows / ROWS_PER_DONOR)))
+    hospitals = max(5, donors // DONORS_PER_HOSPITAL)
+    return {
+        'donors': donors,
+        'hospitals': hospitals,
+        'requests': int(round(donors * REQUESTS_PER_DONOR)),
+        'staff': max(5, donors // DONORS_PER_STAFF),
+        'donor_users': donors // DONORS_PER_DONOR_USER,
+        'audit': int(round(donors * AUDIT_PER_DONOR)),
+    }
+
+
+class Dataset:
+    """
+    Everything needed to build any chunk of any table
+
+    Per-table arrays that other tables look up (donation counts per donor,
+    hospital sizes, requests by blood type and day) are computed on first use
+    and kept for the life of the worker process.
+    """
+
+    def __init__(self, seed, counts, end, years, bases, password_hash):
+        self.rng = Random(seed)
+        self.counts = counts
+        self.end = end
+        self.ndays = int(round(years * 365.25))
+        self.start = end - timedelta(days=self.ndays - 1)
+        self.bases = bases
+        self.password_hash = password_hash
+        self.day0 = np.datetime64(self.start.isoformat(), 'D')
+        days = self.day0 + np.arange(self.ndays)
+        self._cdf = {}
+        for kind in ('donation', 'request'):
+            cdf = np.cumsum(day_weights(days, kind))
+            self._cdf[kind] = cdf / cdf[-1]
+        self._donor_cum = None
+        self._hospital_cdf = None
+        self._eligible = None
+        self._bags = None   # the last chunk, shared by its bag rows and transaction count
+
+    # -- shared lookups -------------------------------------------------------------
+
+    def sample_day(self, kind, name, index):
+        days = np.searchsorted(self._cdf[kind], self.rng.uniform(name, index), side='right')
+        return np.minimum(days, self.ndays - 1)
+
+    def donation_counts(self, index):
+        """Donations per donor: at least one, geometric tail with mean DONATIONS_PER_DONOR"""
+        scale = 1 / math.log(DONATIONS_PER_DONOR / (DONATIONS_PER_DONOR - 1))
+        extra = np.floor(-np.log1p(-self.rng.uniform('donor.donations', index)) * scale)
+        return 1 + np.minimum(extra, 40).astype(np.int64)
+
+    @property
+    def donor_cum(self):
+        if self._donor_cum is None:
+            self._donor_cum = np.cumsum(self.donation_counts(np.arange(self.counts['donors'])))
+        return self._donor_cum
+
+    @property
+    def donations(self):
+        return int(self.donor_cum[-1])
+
+    def donor_type(self, donor):
+        return self.rng.choice('donor.blood_type', donor, DONOR_TYPE_SHARE)
+
+    def hospital_beds(self, hospital):
+        z = self.rng.normal('hospital.beds', hospital)
+        return np.clip(np.round(np.exp(5.3 + 0.7 * z)), 25, 2000).astype(np.int64)
+
+    def request_hospital(self, request):
+        if self._hospital_cdf is None:
+            beds = self.hospital_beds(np.arange(self.counts['hospitals'])).astype(np.float64)
+            self._hospital_cdf = np.cumsum(beds) / beds.sum()
+        picks = np.searchsorted(self._hospital_cdf, self.rng.uniform('request.hospital', request),
+                                side='right')
+        return np.minimum(picks, self.counts['hospitals'] - 1)
+
+    def request_core(self, request):
+        """(blood type, day, seconds into the day, status) of requests"""
+        blood_type = self.rng.choice('request.blood_type', request, REQUEST_TYPE_SHARE)
+        day = self.sample_day('request', 'request.day', request)
+        seconds = self.rng.integers('request.time', request, 6 * 3600, 22 * 3600)
+        age = self.ndays - 1 - day
+        u = self.rng.uniform('request.status', request)
+        # pending, approved, rejected, fulfilled by age of the request
+        old = np.searchsorted([0.05, 0.10, 0.18], u, side='right')
+        recent = np.searchsorted([0.20, 0.45, 0.50], u, side='right')
+        new = np.searchsorted([0.70, 0.95, 1.00], u, side='right')
+        status = np.where(age > 14, old, np.where(age > 2, recent, new))
+        return blood_type, day, seconds, status
+
+    def eligible_requests(self):
+        """Per blood type, approved/fulfilled requests sorted by day: (days, request numbers)"""
+        if self._eligible is None:
+            index = np.arange(self.counts['requests'])
+            blood_type, day, _, status = self.request_core(index)
+            eligible = (status == 1) | (status == 3)
+            self._eligible = []
+            for t in range(len(BLOOD_TYPES)):
+                members = index[eligible & (blood_type == t)]
+                order = np.argsort(day[members], kind='stable')
+                self._eligible.append((day[members][order], members[order]))
+        return self._eligible
+
+    # -- rows ----------------------------------------------------------------------
+
+    def donor_rows(self, a, b):
+        rng, i = self.rng, np.arange(a, b)
+        ids = self.bases['donor'] + 1 + i
+        gender = rng.choice('donor.gender', i, GENDER_SHARE)
+        first = _pick_names(rng, 'donor.first', i, gender)
+        last = _pick(rng, 'donor.last', i, LAST_NAMES)
+        city = rng.choice('donor.city', i, CITY_SHARE)
+        age_days = rng.integers('donor.age', i, 18 * 365, 66 * 365)
+
+        # The donor's own donations give the totals the trigger would maintain.
+        cum = self.donor_cum
+        first_donation = cum[a - 1] if a else 0
+        donation_days = self.sample_day('donation', 'donation.day', np.arange(first_donation, cum[b - 1]))
+        offsets = (np.concatenate(([first_donation], cum[a:b - 1])) - first_donation).astype(np.int64)
+        last_day = np.maximum.reduceat(donation_days, offsets)
+        first_day = np.minimum.reduceat(donation_days, offsets)
+        created_day = np.maximum(first_day - rng.integers('donor.created', i, 0, 60), 0)
+        status = np.where(rng.uniform('donor.status', i) < 0.04, 'deferred', 'available')
+
+        email = np.char.lower(np.char.add(np.char.add(np.char.add(first, '.'), last),
+                                          np.char.add(ids.astype(str), '@example.test')))
+        return {
+            'donor_id': ids,
+            'first_name': first,
+            'last_name': last,
+            'email': email,
+            'phone': np.char.add('555', np.char.zfill((ids % 10_000_000).astype(str), 7)),
+            'blood_type': np.array(BLOOD_TYPES)[self.donor_type(i)],
+            'gender': np.array(GENDERS)[gender],
+            'date_of_birth': _dates(self.end, -age_days),
+            'address': _addresses(rng, 'donor.address', i),
+            'city': np.array([c[0] for c in CITIES])[city],
+            'state': np.array([c[1] for c in CITIES])[city],
+            'zip_code': np.char.add(np.array([c[2] for c in CITIES])[city],
+                                    np.char.zfill(rng.integers('donor.zip', i, 0, 100).astype(str), 2)),
+            'status': status,
+            'last_donation_date': self.days(last_day),
+            'total_donations': self.donation_counts(i),
+            'created_at': self.timestamps(created_day, rng.integers('donor.created.time', i, 28800, 72000)),
+        }
+
+    def hospital_rows(self, a, b):
+        rng, i = self.rng, np.arange(a, b)
+        ids = self.bases['hospital'] + 1 + i
+        city = rng.choice('hospital.city', i, CITY_SHARE)
+        city_names = np.array([c[0] for c in CITIES])[city]
+        kind = np.array(HOSPITAL_TYPES)[rng.choice('hospital.type', i, HOSPITAL_TYPE_SHARE)]
+        contact = np.char.add(np.char.add(_pick(rng, 'hospital.contact.first', i, FIRST_NAMES['Other']), ' '),
+                              _pick(rng, 'hospital.contact.last', i, LAST_NAMES))
+        ids_text = ids.astype(str)
+        return {
+            'hospital_id': ids,
+            'name': np.char.add(np.char.add(np.char.add(city_names, ' '), kind),
+                                np.char.add(' Hospital #', ids_text)),
+            'registration_number': np.char.add('SYN-H', np.char.zfill(ids_text, 7)),
+            'email': np.char.add(np.char.add('bloodbank', ids_text), '@hospital.example.test'),
+            'phone': np.char.add('800', np.char.zfill((ids % 10_000_000).astype(str), 7)),
+            'address': _addresses(rng, 'hospital.address', i),
+            'city': city_names,
+            'state': np.array([c[1] for c in CITIES])[city],
+            'zip_code': np.char.add(np.array([c[2] for c in CITIES])[city], '01'),
+            'contact_person': contact,
+            'contact_person_phone': np.char.add('801', np.char.zfill((ids % 10_000_000).astype(str), 7)),
+            'hospital_type': kind,
+            'bed_capacity': self.hospital_beds(i),
+            'license_status': np.where(rng.uniform('hospital.license', i) < 0.97, 'active', 'suspended'),
+            'created_at': self.timestamps(np.zeros(len(i), dtype=np.int64),
+                                          rng.integers('hospital.created', i, 28800, 72000)),
+        }
+
+    def donation_rows(self, a, b):
+        rng, j = self.rng, np.arange(a, b)
+        donor = np.searchsorted(self.donor_cum, j, side='right')
+        day = self.sample_day('donation', 'donation.day', j)
+        systolic = rng.integers('donation.systolic', j, 100, 150)
+        return {
+            'donation_id': self.bases['blood_donation'] + 1 + j,
+            'donor_id': self.bases['donor'] + 1 + donor,
+            'donation_date': self.days(day),
+            'location': _pick(rng, 'donation.site', j, DONATION_SITES),
+            'volume_ml': np.where(rng.uniform('donation.volume', j) < 0.9, 450, 500),
+            'blood_type': np.array(BLOOD_TYPES)[self.donor_type(donor)],
+            'hemoglobin_level': np.round(12.5 + 4.5 * rng.uniform('donation.hb', j), 1),
+            'blood_pressure_systolic': systolic,
+            'blood_pressure_diastolic': systolic - rng.integers('donation.diastolic', j, 35, 50),
+            'donation_status': np.full(len(j), 'completed'),
+            'screened': np.where(self.ndays - 1 - day >= 2, 't', 'f'),
+            'staff_name': np.char.add('Phlebotomist ', rng.integers('donation.staff', j, 1, 200).astype(str)),
+            'created_at': self.timestamps(day, rng.integers('donation.time', j, 28800, 68400)),
+        }
+
+    def request_rows(self, a, b):
+        rng, r = self.rng, np.arange(a, b)
+        blood_type, day, seconds, status = self.request_core(r)
+        urgency = rng.choice('request.urgency', r, URGENCY_SHARE)
+        units = 1 + rng.choice('request.units', r, (0.40, 0.30, 0.18, 0.12)) + (urgency == 2)
+        gender = rng.choice('request.gender', r, (0.5, 0.5))
+        patient = np.char.add(np.char.add(_pick_names(rng, 'request.first', r, gender), ' '),
+                              _pick(rng, 'request.last', r, LAST_NAMES))
+        requested_at = self.timestamps(day, seconds)
+        decided_day = np.minimum(day + (urgency == 0), self.ndays - 1)
+        decided = self.timestamps(decided_day, np.minimum(seconds + 3600, 86399))
+        fulfilled_day = np.minimum(decided_day + rng.integers('request.fulfil', r, 0, 2), self.ndays - 1)
+        partial = rng.integers('request.partial', r, 0, 2) * (status == 1)
+        required_by = day + np.select([urgency == 2, urgency == 1], [0, 1],
+                                      rng.integers('request.required', r, 3, 8))
+        approved = (status == 1) | (status == 3)
+        return {
+            'request_id': self.bases['recipient_request'] + 1 + r,
+            'hospital_id': self.bases['hospital'] + 1 + self.request_hospital(r),
+            'blood_type': np.array(BLOOD_TYPES)[blood_type],
+            'units_requested': units,
+            'units_fulfilled': np.where(status == 3, units, np.minimum(partial, units)),
+            'urgency_level': np.array(URGENCY)[urgency],
+            'patient_name': patient,
+            'patient_age': rng.integers('request.age', r, 0, 96),
+            'patient_gender': np.array(GENDERS[:2])[gender],
+            'diagnosis_reason': _pick(rng, 'request.diagnosis', r, DIAGNOSES),
+            'doctor_name': np.char.add('Dr. ', _pick(rng, 'request.doctor', r, LAST_NAMES)),
+            'doctor_contact_number': np.char.add('555', np.char.zfill(
+                rng.integers('request.doctor.phone', r, 0, 10_000_000).astype(str), 7)),
+            'required_by_date': _dates(self.start, required_by),
+            'request_date': requested_at,
+            'request_status': np.array(REQUEST_STATUSES)[status],
+            'approved_by': _null(np.char.add('staff', rng.integers('request.approver', r, 1, 6).astype(str)),
+                                 ~approved),
+            'approved_date': _null(decided, ~approved),
+            'fulfilled_date': _null(self.timestamps(fulfilled_day, np.full(len(r), 64800)), status != 3),
+            'rejection_reason': _null(_pick(rng, 'request.rejection', r, REJECTIONS), status != 2),
+            'created_at': requested_at,
+        }
+
+    def bags(self, a, b):
+        """One bag per donation, with its fate (numbers, not yet text)"""
+        if self._bags is not None and self._bags[0] == (a, b):
+            return self._bags[1]
+        rng, j = self.rng, np.arange(a, b)
+        donor = np.searchsorted(self.donor_cum, j, side='right')
+        blood_type = self.donor_type(donor)
+        collected = self.sample_day('donation', 'donation.day', j)
+        component = rng.choice('bag.component', j, COMPONENT_SHARE)
+        expires = collected + np.array(COMPONENT_SHELF_DAYS)[component]
+        today = self.ndays - 1
+        past_expiry = expires < today
+
+        testing = np.where(today - collected < 2, 0,
+                           np.where(rng.uniform('bag.failed', j) < 0.02, 2, 1))
+
+        # Issue to an approved/fulfilled request of the same type made while the
+        # bag was on the shelf; most bags find one, plasma less often.
+        request = np.full(len(j), -1)
+        request_day = np.zeros(len(j), dtype=np.int64)
+        use = rng.uniform('bag.use', j) < np.where(component == 2, 0.70, 0.90)
+        pick = rng.uniform('bag.pick', j)
+        for t, (days, members) in enumerate(self.eligible_requests()):
+            mask = (blood_type == t) & (testing == 1) & use
+            if not mask.any() or not len(days):
+                continue
+            lo = np.searchsorted(days, collected[mask], side='left')
+            hi = np.searchsorted(days, np.minimum(expires[mask], today), side='right')
+            found = hi > lo
+            chosen = np.minimum(lo + (pick[mask] * (hi - lo)).astype(np.int64), len(days) - 1)
+            request[mask] = np.where(found, members[chosen], -1)
+            request_day[mask] = np.where(found, days[chosen], 0)
+
+        issued = request >= 0
+        returned = issued & (rng.uniform('bag.return', j) < 0.03)
+        kept = issued & ~returned
+        status = np.select(
+            [kept & (request_day >= today - 2), kept, testing == 2, past_expiry,
+             rng.uniform('bag.reserved', j) < 0.06],
+            [2, 4, 3, 3, 1], 0)
+        discarded = (status == 3)
+        bags = {
+            'j': j, 'donor': donor, 'blood_type': blood_type, 'collected': collected,
+            'expires': expires, 'component': component, 'testing': testing, 'status': status,
+            'request': request, 'request_day': request_day, 'issued': issued,
+            'returned': returned, 'discarded': discarded,
+        }
+        self._bags = ((a, b), bags)
+        return bags
+
+    def bag_rows(self, a, b):
+        bag, rng = self.bags(a, b), self.rng
+        j = bag['j']
+        ids = self.bases['blood_inventory'] + 1 + j
+        tested = bag['testing'] > 0
+        return {
+            'bag_id': ids,
+            'bag_number': np.char.add('SYN-', np.char.zfill(ids.astype(str), 10)),
+            'donation_id': self.bases['blood_donation'] + 1 + j,
+            'donor_id': self.bases['donor'] + 1 + bag['donor'],
+            'blood_type': np.array(BLOOD_TYPES)[bag['blood_type']],
+            'collection_date': self.days(bag['collected']),
+            'expiry_date': self.days(bag['expires']),
+            'volume_ml': np.array(COMPONENT_VOLUME_ML)[bag['component']],
+            'component_type': np.array(COMPONENTS)[bag['component']],
+            'storage_location': np.char.add('Fridge-', rng.integers('bag.fridge', j, 1, 25).astype(str)),
+            'testing_status': np.array(TESTING_STATUSES)[bag['testing']],
+            'status': np.array(INVENTORY_STATUSES)[bag['status']],
+            'assigned_to_request': _null((self.bases['recipient_request'] + 1 + bag['request']).astype(str),
+                                         ~bag['issued'] | bag['returned']),
+            'quality_check_date': _null(self.days(bag['collected'] + 1), ~tested),
+            'created_at': self.timestamps(bag['collected'], rng.integers('donation.time', j, 28800, 68400)),
+        }
+
+    def transaction_count(self, a, b):
+        bag = self.bags(a, b)
+        return int(bag['issued'].sum() + bag['returned'].sum() + bag['discarded'].sum())
+
+    def transaction_rows(self, a, b, first_id):
+        """issue (and return) for issued bags, discard for expired or failed ones, in bag order"""
+        bag, rng = self.bags(a, b), self.rng
+        j = bag['j']
+        bag_ids = self.bases['blood_inventory'] + 1 + j
+        request_ids = self.bases['recipient_request'] + 1 + bag['request']
+        volume = np.array(COMPONENT_VOLUME_ML)[bag['component']]
+        issue_at = rng.integers('txn.issue', j, 3600, 43200)
+        discard_day = np.where(bag['testing'] == 2, bag['collected'] + 1,
+                               np.minimum(bag['expires'] + 1, self.ndays - 1))
+        staff = np.char.add('staff', rng.integers('txn.staff', j, 1, 6).astype(str))
+
+        kinds = []
+        for kind, mask, day, seconds, request, remark in (
+                ('issue', bag['issued'], bag['request_day'], issue_at, request_ids, 'Issued'),
+                ('return', bag['returned'], np.minimum(bag['request_day'] + 1, self.ndays - 1),
+                 issue_at, request_ids, 'Returned unused'),
+                ('discard', bag['discarded'], discard_day, np.full(len(j), 25200), None,
+                 np.where(bag['testing'] == 2, 'Failed screening', 'Expired'))):
+            kinds.append({
+                'order': np.nonzero(mask)[0] * 3 + len(kinds),
+                'request_id': (request[mask].astype(str) if request is not None
+                               else np.full(mask.sum(), '\\N')),
+                'bag_id': bag_ids[mask],
+                'units_ml': volume[mask],
+                'transaction_type': np.full(mask.sum(), kind),
+                'issued_by': staff[mask],
+                'issue_date': self.timestamps(day[mask], seconds[mask]),
+                'remarks': np.broadcast_to(remark, mask.shape)[mask],
+            })
+        order = np.argsort(np.concatenate([k['order'] for k in kinds]), kind='stable')
+        rows = {column: np.concatenate([np.asarray(k[column]).astype(str) for k in kinds])[order]
+                for column in kinds[0] if column != 'order'}
+        return dict({'transaction_id': first_id + np.arange(len(order))}, **rows)
+
+    def user_rows(self, a, b):
+        rng, u = self.rng, np.arange(a, b)
+        ids = self.bases['users'] + 1 + u
+        staff, hospitals = self.counts['staff'], self.counts['hospitals']
+        role = np.select([u < 2, u < staff, u < staff + hospitals], ['admin', 'staff', 'hospital'], 'donor')
+        hospital = np.where(role == 'hospital', self.bases['hospital'] + 1 + (u - staff), 0)
+        donor = np.where(role == 'donor', self.bases['donor'] + 1
+                         + (u - staff - hospitals) * DONORS_PER_DONOR_USER, 0)
+        username = np.char.add(role, ids.astype(str))
+        gender = rng.choice('user.gender', u, (0.5, 0.5))
+        login_day = self.ndays - 1 - rng.integers('user.login', u, 0, 90)
+        return {
+            'user_id': ids,
+            'username': username,
+            'email': np.char.add(username, '@example.test'),
+            'password_hash': np.full(len(u), self.password_hash),
+            'full_name': np.char.add(np.char.add(_pick_names(rng, 'user.first', u, gender), ' '),
+                                     _pick(rng, 'user.last', u, LAST_NAMES)),
+            'role': role,
+            'donor_id': _null(donor.astype(str), role != 'donor'),
+            'hospital_id': _null(hospital.astype(str), role != 'hospital'),
+            'is_active': np.where(rng.uniform('user.active', u) < 0.97, 't', 'f'),
+            'last_login': _null(self.timestamps(login_day, rng.integers('user.login.time', u, 0, 86400)),
+                                rng.uniform('user.never', u) < 0.2),
+            'created_at': self.timestamps(rng.integers('user.created', u, 0, self.ndays),
+                                          rng.integers('user.created.time', u, 28800, 72000)),
+        }
+
+    def audit_rows(self, a, b):
+        rng, k = self.rng, np.arange(a, b)
+        table = rng.choice('audit.table', k, AUDITED_SHARE)
+        sizes = np.array([self.donations, self.counts['requests'], self.counts['donors'], self.donations])
+        bases = np.array([self.bases['blood_inventory'], self.bases['recipient_request'],
+                          self.bases['donor'], self.bases['blood_donation']])
+        record = bases[table] + 1 + (rng.uniform('audit.record', k) * sizes[table]).astype(np.int64)
+        action = np.array(['expire', 'UPDATE', 'UPDATE', 'INSERT'])[table]
+        old_values = np.array(['{"status": "available"}', '{"request_status": "pending"}',
+                               '{"status": "available"}', '\\N'])[table]
+        new_values = np.array(['{"status": "expired"}', '{"request_status": "approved"}',
+                               '{"status": "deferred"}', '{"donation_status": "completed"}'])[table]
+        changed_by = np.where(table == 0, 'expiry_sweeper',
+                              np.char.add('staff', rng.integers('audit.staff', k, 1, 6).astype(str)))
+        return {
+            'log_id': self.bases['audit_log'] + 1 + k,
+            'table_name': np.array(AUDITED)[table],
+            'record_id': record,
+            'action': action,
+            'old_values': old_values,
+            'new_values': new_values,
+            'changed_by': changed_by,
+            'changed_at': self.timestamps(self.sample_day('donation', 'audit.day', k),
+                                          rng.integers('audit.time', k, 0, 86400)),
+        }
+
+    # -- formatting ------------------------------------------------------------------
+
+    def days(self, day):
+        return _dates(self.start, day)
+
+    def timestamps(self, day, seconds):
+        stamps = (self.day0 + np.asarray(day)).astype('datetime64[s]') + np.asarray(seconds).astype('timedelta64[s]')
+        return np.char.replace(stamps.astype(str), 'T', ' ')
+
+
+def _dates(origin, offsets):
+    return (np.datetime64(origin.isoformat(), 'D') + np.asarray(offsets)).astype(str)
+
+
+def _pick(rng, name, index, values):
+    return np.array(values)[rng.integers(name, index, 0, len(values))]
+
+
+def _pick_names(rng, name, index, gender):
+    first = np.empty(len(index), dtype=object)
+    for g, names in enumerate(FIRST_NAMES[k] for k in GENDERS):
+        mask = gender == g
+        first[mask] = _pick(rng, name, index[mask], names)
+    return first.astype(str)
+
+
+def _addresses(rng, name, index):
+    number = rng.integers(name + '.number', index, 1, 9999).astype(str)
+    return np.char.add(np.char.add(number, ' '), _pick(rng, name + '.street', index, STREETS))
+
+
+def _null(values, mask):
+    return np.where(mask, '\\N', np.asarray(values).astype(str))
+
+
+def copy_text(columns):
+    """COPY text format for the column arrays (values never contain tabs or newlines)"""
+    text = [np.asarray(values).astype(str).tolist() for values in columns.values()]
+    return '\n'.join(map('\t'.join, zip(*text))) + '\n'
+
+
+# -- loading ------------------------------------------------------------------------
+
+_worker = {}
+
+
+def _init_worker(settings):
+    _worker['dataset'] = Dataset(**settings)
+    _worker['conn'] = connect()
+
+
+def _load_chunk(task):
+    """Build and COPY one chunk; returns (table, start, rows, transactions its bags produce)"""
+    table, a, b, first_id = task
+    dataset, conn = _worker['dataset'], _worker['conn']
+    build = {
+        'donor': dataset.donor_rows, 'hospital': dataset.hospital_rows,
+        'blood_donation': dataset.donation_rows, 'recipient_request': dataset.request_rows,
+        'blood_inventory': dataset.bag_rows, 'users': dataset.user_rows,
+        'audit_log': dataset.audit_rows,
+    }
+    if table == 'transaction_log':
+        columns = dataset.transaction_rows(a, b, first_id)
+    else:
+        columns = build[table](a, b)
+    with conn.cursor() as cursor:
+        cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN",
+                           io.StringIO(copy_text(columns)))
+    conn.commit()
+    transactions = dataset.transaction_count(a, b) if table == 'blood_inventory' else 0
+    return table, a, len(next(iter(columns.values()))), transactions
+
+
+def _chunks(table, total, size):
+    return [(table, a, min(a + size, total), None) for a in range(0, total, size)]
+
+
+def _exists(cursor, relation):
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (relation,))
+    return cursor.fetchone()[0]
+
+
+def _set_donor_stats_trigger(conn, enabled):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT 1 FROM pg_trigger
+            WHERE tgrelid = 'blood_donation'::regclass AND tgname = 'blood_donation_donor_stats'
+        """)
+        if cursor.fetchone():
+            cursor.execute(f"ALTER TABLE blood_donation "
+                           f"{'ENABLE' if enabled else 'DISABLE'} TRIGGER blood_donation_donor_stats")
+    conn.commit()
+
+
+def password_hash(seed, password='synthetic'):
+    """A werkzeug-format pbkdf2 hash with a salt from the seed, so users rows repeat too"""
+    salt = f'synthetic{seed}'
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), 600_000).hex()
+    return f'pbkdf2:sha256:600000${salt}${digest}'
+
+
+def generate(rows, seed=42, jobs=4, chunk=50_000, end=None, years=3.0, truncate=False, log=print):
+    """Load about rows synthetic rows; returns rows loaded per table and timings"""
+    counts = plan(rows)
+    conn = connect()
+    with conn.cursor() as cursor:
+        if truncate:
+            rollups = [t for t in ROLLUP_TABLES if _exists(cursor, t)]
+            cursor.execute(f"TRUNCATE {', '.join(TABLES + tuple(rollups))} RESTART IDENTITY CASCADE")
+        bases = {}
+        for table in TABLES:
+            cursor.execute(f"SELECT COALESCE(MAX({ID_COLUMNS[table]}), 0) FROM {table}")
+            bases[table] = cursor.fetchone()[0]
+    conn.commit()
+
+    settings = {
+        'seed': seed, 'counts': counts, 'end': end or date.today(), 'years': years,
+        'bases': bases, 'password_hash': password_hash(seed),
+    }
+    dataset = Dataset(**settings)
+    totals = {
+        'donor': counts['donors'], 'hospital': counts['hospitals'],
+        'blood_donation': dataset.donations, 'recipient_request': counts['requests'],
+        'blood_inventory': dataset.donations,
+        'users': counts['staff'] + counts['hospitals'] + counts['donor_users'],
+        'audit_log': counts['audit'],
+    }
+
+    loaded = dict.fromkeys(TABLES, 0)
+    timings = {}
+    transactions = {}
+    started = time.perf_counter()
+    _set_donor_stats_trigger(conn, False)
+    try:
+        with multiprocessing.Pool(jobs, initializer=_init_worker, initargs=(settings,)) as pool:
+            for phase in PHASES:
+                phase_started = time.perf_counter()
+                if phase == ('transaction_log',):
+                    # Ids follow bag order: each bag chunk starts after the
+                    # transactions of the chunks before it.
+                    tasks, next_id = [], bases['transaction_log'] + 1
+                    for a in range(0, dataset.donations, chunk):
+                        tasks.append(('transaction_log', a, min(a + chunk, dataset.donations), next_id))
+                        next_id += transactions[a]
+                else:
+                    tasks = [task for table in phase for task in _chunks(table, totals[table], chunk)]
+                for table, a, count, produced in pool.imap_unordered(_load_chunk, tasks):
+                    loaded[table] += count
+                    if table == 'blood_inventory':
+                        transactions[a] = produced
+                timings['+'.join(phase)] = round(time.perf_counter() - phase_started, 2)
+                log(f"loaded {', '.join(f'{t}={loaded[t]}' for t in phase)} "
+                    f"in {timings['+'.join(phase)]}s")
+    finally:
+        _set_donor_stats_trigger(conn, True)
+
+    with conn.cursor() as cursor:
+        for table in TABLES:
+            cursor.execute(f"""
+                SELECT setval(pg_get_serial_sequence('{table}', '{ID_COLUMNS[table]}'),
+                              COALESCE((SELECT MAX({ID_COLUMNS[table]}) FROM {table}), 0) + 1, false)
+            """)
+        if _exists(cursor, 'table_watermark'):
+            # Cached GET responses (ETags) of the old data must not match.
+            from watermarks import BUMP_QUERY
+            cursor.execute(BUMP_QUERY, (sorted(TABLES),))
+        conn.commit()
+        conn.autocommit = True
+        cursor.execute(f"ANALYZE {', '.join(TABLES)}")
+        has_rollups = _exists(cursor, 'rollup_change')
+    conn.close()
+
+    if has_rollups:
+        from rollups import rollup_refresher
+        rollup_started = time.perf_counter()
+        rollup_refresher.refresh()
+        timings['rollups'] = round(time.perf_counter() - rollup_started, 2)
+
+    elapsed = time.perf_counter() - started
+    return {
+        'seed': seed,
+        'end_date': settings['end'].isoformat(),
+        'rows': loaded,
+        'total_rows': sum(loaded.values()),
+        'seconds': round(elapsed, 2),
+        'rows_per_sec': round(sum(loaded.values()) / elapsed),
+        'phases': timings,
+    }
+
+
+def _rows(value):
+    rows = int(float(value))
+    if not MIN_ROWS <= rows <= MAX_ROWS:
+        raise argparse.ArgumentTypeError(f'rows must be {MIN_ROWS} to {MAX_ROWS}')
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=_rows, default=1_000_000,
+                        help='total rows across the eight tables, 10k to 50M (1e6 works)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--jobs', type=int, default=max(2, multiprocessing.cpu_count()),
+                        help='parallel COPY streams')
+    parser.add_argument('--chunk', type=int, default=50_000, help='rows per COPY')
+    parser.add_argument('--end-date', type=date.fromisoformat, default=None,
+                        help='last day of the data (default today); fix it to reproduce a dataset')
+    parser.add_argument('--years', type=float, default=3.0, help='years of history')
+    parser.add_argument('--truncate', action='store_true', help='empty the eight tables first')
+    parser.add_argument('--plan', action='store_true', help='print the row counts and exit')
+    args = parser.parse_args()
+
+    if args.plan:
+        counts = plan(args.rows)
+        counts['donations'] = counts['bags'] = int(Dataset(
+            args.seed, counts, args.end_date or date.today(), args.years,
+            dict.fromkeys(TABLES, 0), '').donations)
+        print(json.dumps(counts, indent=2))
+        return
+    print(json.dumps(generate(args.rows, seed=args.seed, jobs=args.jobs, chunk=args.chunk,
+                              end=args.end_date, years=args.years, truncate=args.truncate),
+                     indent=2))
+
+
+if __name__ == '__main__':
+    main()
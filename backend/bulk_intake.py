@@ -0,0 +1,309 @@
+"""
+Bulk intake: validate uploaded rows as they stream in and load them with COPY
+
+An upload is a JSON array of objects or a CSV file whose header row uses the
+same field names as the single-record endpoints (camelCase, or the column
+names). Each row is validated in Python while the body is read; valid rows
+are COPY'd into a temporary staging table, rows that clash with the database
+(duplicate keys, missing parents) are removed from it with one set-based
+statement per check, and the rest is inserted into the target table with a
+single INSERT ... SELECT. Everything happens in the caller's transaction.
+"""
+import codecs
+import csv
+import io
+import json
+import os
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+BULK_MAX_ROWS = int(os.getenv('BULK_MAX_ROWS', '100000'))
+BULK_MAX_ERRORS = int(os.getenv('BULK_MAX_ERRORS', '1000'))
+
+BLOOD_TYPES = ('O+', 'O-', 'A+', 'A-', 'B+', 'B-', 'AB+', 'AB-')
+
+
+class BulkIntakeError(ValueError):
+    """Raised when an upload cannot be read at all (as opposed to bad rows)"""
+
+
+# Field parsers: take the raw value (never None or '') and return the value to
+# store, raising ValueError with a message for the error report.
+
+def text(max_length):
+    def parse(value):
+        value = str(value).strip()
+        if len(value) > max_length:
+            raise ValueError(f'longer than {max_length} characters')
+        return value
+    return parse
+
+
+def integer(minimum=None, maximum=None):
+    def parse(value):
+        if isinstance(value, bool):
+            raise ValueError('must be an integer')
+        try:
+            number = int(value)
+        except (TypeError, ValueError):
+            raise ValueError('must be an integer')
+        if isinstance(value, float) and value != number:
+            raise ValueError('must be an integer')
+        if minimum is not None and number < minimum:
+            raise ValueError(f'must be at least {minimum}')
+        if maximum is not None and number > maximum:
+            raise ValueError(f'must be at most {maximum}')
+        return number
+    return parse
+
+
+def decimal(max_value):
+    def parse(value):
+        try:
+            number = Decimal(str(value))
+        except InvalidOperation:
+            raise ValueError('must be a number')
+        if not number.is_finite() or abs(number) > max_value:
+            raise ValueError(f'must be a number below {max_value}')
+        return number
+    return parse
+
+
+def iso_date(value):
+    try:
+        return date.fromisoformat(str(value).strip()[:10]).isoformat()
+    except ValueError:
+        raise ValueError('must be a date (YYYY-MM-DD)')
+
+
+def boolean(value):
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    normalized = str(value).strip().lower()
+    if normalized in ('true', 't', '1', 'yes', 'y'):
+        return 't'
+    if normalized in ('false', 'f', '0', 'no', 'n'):
+        return 'f'
+    raise ValueError('must be true or false')
+
+
+def choice(*values):
+    def parse(value):
+        value = str(value).strip()
+        if value not in values:
+            raise ValueError(f"must be one of {', '.join(values)}")
+        return value
+    return parse
+
+
+class BulkField:
+    """One uploaded field: its JSON key, target column, parser and default"""
+
+    __slots__ = ('key', 'column', 'parse', 'required', 'default')
+
+    def __init__(self, key, column, parse, required=False, default=None):
+        self.key = key
+        self.column = column
+        self.parse = parse
+        self.required = required
+        self.default = default
+
+
+class BulkIntake:
+    """
+    Bulk loader for one table
+
+    Args:
+        table: Target table
+        fields: BulkField list, in column order
+        unique: Columns that must not repeat within one upload
+        checks: (message, SQL condition over the staging row aliased s) pairs;
+            staged rows matching a condition are rejected with message
+    """
+
+    def __init__(self, table, fields, unique=(), checks=()):
+        self.table = table
+        self.fields = fields
+        self.unique = unique
+        self.checks = checks
+        self.columns = ', '.join(f.column for f in fields)
+
+    def validate(self, raw):
+        """Return (values, errors) for one uploaded row"""
+        if not isinstance(raw, dict):
+            return None, ['row must be an object']
+        values = []
+        errors = []
+        for field in self.fields:
+            value = raw.get(field.key)
+            if value is None:
+                value = raw.get(field.column)
+            if isinstance(value, str) and not value.strip():
+                value = None
+            if value is None:
+                if field.required:
+                    errors.append(f'{field.key}: required')
+                values.append(field.default)
+                continue
+            try:
+                values.append(field.parse(value))
+            except ValueError as e:
+                errors.append(f'{field.key}: {e}')
+        return values, errors
+
+    def load(self, cursor, rows, atomic=False, max_rows=BULK_MAX_ROWS):
+        """
+        Validate and insert rows (an iterable of dicts) using cursor
+
+        Returns a report with the number of rows received and inserted and
+        the errors of rejected rows (1-based row numbers, at most
+        BULK_MAX_ERRORS listed). With atomic=True nothing is inserted when
+        any row is rejected.
+        """
+        errors = []
+        rejected = 0
+        received = 0
+        seen = {column: set() for column in self.unique}
+        positions = {f.column: i for i, f in enumerate(self.fields)}
+
+        staged = io.StringIO()
+        writer = csv.writer(staged)
+        for received, raw in enumerate(rows, start=1):
+            if received > max_rows:
+                raise BulkIntakeError(f'At most {max_rows} rows per upload')
+            values, row_errors = self.validate(raw)
+            if not row_errors:
+                for column, keys in seen.items():
+                    key = values[positions[column]]
+                    if key is None:
+                        continue
+                    if key in keys:
+                        row_errors.append(f'{column}: duplicated within the upload')
+                    keys.add(key)
+            if row_errors:
+                rejected += 1
+                if len(errors) < BULK_MAX_ERRORS:
+                    errors.append({'row': received, 'errors': row_errors})
+                continue
+            writer.writerow([received] + values)
+
+        inserted = 0
+        if received > rejected:
+            cursor.execute("DROP TABLE IF EXISTS pg_temp.bulk_stage")
+            cursor.execute(f"""
+                CREATE TEMP TABLE bulk_stage ON COMMIT DROP AS
+                SELECT 0 as row_no, {self.columns} FROM {self.table} WITH NO DATA
+            """)
+            staged.seek(0)
+            cursor.copy_expert(
+                f"COPY bulk_stage (row_no, {self.columns}) FROM STDIN WITH (FORMAT csv)", staged
+            )
+
+            for message, condition in self.checks:
+                cursor.execute(f"DELETE FROM bulk_stage s WHERE {condition} RETURNING row_no")
+                for row in cursor.fetchall():
+                    rejected += 1
+                    if len(errors) < BULK_MAX_ERRORS:
+                        errors.append({'row': row['row_no'], 'errors': [message]})
+
+            if not (atomic and rejected):
+                cursor.execute(f"""
+                    INSERT INTO {self.table} ({self.columns})
+                    SELECT {self.columns} FROM bulk_stage ORDER BY row_no
+                """)
+                inserted = cursor.rowcount
+            cursor.execute("DROP TABLE bulk_stage")
+
+        errors.sort(key=lambda e: e['row'])
+        return {
+            'received': received,
+            'inserted': inserted,
+            'rejected': rejected,
+            'errors': errors,
+        }
+
+
+def bulk_status(report):
+    """HTTP status for a load report: 201 if anything was inserted, 422 if only rejects"""
+    if report['inserted']:
+        return 201
+    return 422 if report['rejected'] else 200
+
+
+def iter_json_array(stream, chunk_size=1 << 16):
+    """Yield the elements of a JSON array read incrementally from a binary stream"""
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[pos:] + text_decoder.decode(chunk, final=eof)
+        pos = 0
+
+    def next_char():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                pos += 1
+            if pos < len(buffer) or eof:
+                return buffer[pos] if pos < len(buffer) else ''
+            fill()
+
+    if next_char() == '\ufeff':   # byte order mark
+        pos += 1
+    if next_char() != '[':
+        raise BulkIntakeError('Expected a JSON array')
+    pos += 1
+    if next_char() == ']':
+        return
+
+    while True:
+        next_char()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                if eof:
+                    raise BulkIntakeError(f'Invalid JSON: {e}')
+                fill()
+                continue
+            if end == len(buffer) and not eof:
+                fill()   # a number may continue in the next chunk
+                continue
+            break
+        pos = end
+        yield value
+
+        separator = next_char()
+        pos += 1
+        if separator == ']':
+            if next_char():
+                raise BulkIntakeError('Invalid JSON: trailing data after the array')
+            return
+        if separator != ',':
+            raise BulkIntakeError('Invalid JSON: expected , or ] between rows')
+
+
+def iter_csv(stream):
+    """Yield one dict per CSV data row, keyed by the header row"""
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    if not reader.fieldnames:
+        return
+    yield from reader
+
+
+def request_rows(req):
+    """Rows of a bulk upload: CSV body or file field 'file', otherwise a JSON array"""
+    if req.mimetype == 'multipart/form-data':
+        upload = req.files.get('file')
+        if upload is None:
+            raise BulkIntakeError("Expected a CSV file in form field 'file'")
+        return iter_csv(upload.stream)
+    if req.mimetype in ('text/csv', 'application/csv'):
+        return iter_csv(req.stream)
+    return iter_json_array(req.stream)
@@ -0,0 +1,246 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, make_response, request
+
+from change_feed import change_feed
+from db_utils import on_commit
+from watermarks import table_watermarks
+
+
+class _Flight:
+    """A computation in progress that concurrent callers wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class AggregateCache:
+    """
+    Bounded LRU cache for aggregate query results
+
+    Entries expire after their TTL and are dropped as soon as one of the tables
+    they were computed from is written. Concurrent misses on the same key are
+    collapsed so the value is computed only once.
+    """
+
+    def __init__(self, max_entries=256, default_ttl=30.0):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (value, expires_at, tables)
+        self._by_table = {}             # table -> set of keys
+        self._generations = {}          # table -> write counter
+        self._inflight = {}             # key -> _Flight
+        self._epoch = 0                 # bumped by invalidate_all
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.coalesced = 0
+
+    def _drop(self, key):
+        _, _, tables = self._entries.pop(key)
+        for table in tables:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
+
+    def get_or_compute(self, key, tables, compute, ttl=None):
+        """Return the cached value for key, computing and storing it on a miss"""
+        ttl = self.default_ttl if ttl is None else ttl
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                self._drop(key)
+                self.expirations += 1
+
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if not leader:
+                self.coalesced += 1
+            else:
+                self.misses += 1
+                flight = _Flight()
+                self._inflight[key] = flight
+                generations = (self._epoch,) + tuple(self._generations.get(t, 0) for t in tables)
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            value = compute()
+        except Exception as e:
+            flight.error = e
+            raise
+        else:
+            flight.value = value
+            with self._lock:
+                # Skip storing if a write landed while we were computing.
+                current = (self._epoch,) + tuple(self._generations.get(t, 0) for t in tables)
+                if value is not None and current == generations and self.max_entries > 0:
+                    if key in self._entries:
+                        self._drop(key)
+                    self._entries[key] = (value, time.monotonic() + ttl, tuple(tables))
+                    for table in tables:
+                        self._by_table.setdefault(table, set()).add(key)
+                    while len(self._entries) > self.max_entries:
+                        self._drop(next(iter(self._entries)))
+                        self.evictions += 1
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def invalidate_tables(self, *tables):
+        """Drop every entry computed from any of the given tables"""
+        with self._lock:
+            for table in tables:
+                self._generations[table] = self._generations.get(table, 0) + 1
+                for key in list(self._by_table.get(table, ())):
+                    if key in self._entries:
+                        self._drop(key)
+                        self.invalidations += 1
+
+    def invalidate_all(self):
+        """Drop every entry, and keep values being computed right now from being stored"""
+        with self._lock:
+            self._epoch += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._by_table.clear()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_table.clear()
+
+    def stats(self):
+        """Hit/miss/eviction counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'coalesced': self.coalesced,
+                'inflight': len(self._inflight),
+            }
+
+
+aggregate_cache = AggregateCache(
+    max_entries=int(os.getenv('AGGREGATE_CACHE_SIZE', '256')),
+    default_ttl=float(os.getenv('AGGREGATE_CACHE_TTL', '30'))
+)
+
+
+def _apply_change(change):
+    # Writes by other worker processes; our own come back too and are no-ops.
+    if change.table is None:
+        aggregate_cache.invalidate_all()
+    else:
+        aggregate_cache.invalidate_tables(change.table)
+
+
+change_feed.subscribe(None, _apply_change)
+
+
+def invalidate_tables(*tables):
+    """
+    Bump the tables' change watermarks with the current transaction and
+    invalidate cached aggregates for them once it commits
+    """
+    table_watermarks.touch(*tables)
+    on_commit(lambda: aggregate_cache.invalidate_tables(*tables))
+
+
+class _CachedResponse:
+    def __init__(self, data, mimetype):
+        self.data = data
+        self.mimetype = mimetype
+
+
+def _aggregate_key(endpoint, query_args, view_args=None):
+    return (endpoint, tuple(sorted((view_args or {}).items())),
+            tuple(sorted(query_args.items(multi=True))))
+
+
+def cached_aggregate(tables, ttl=None):
+    """
+    Cache a GET view's successful response, keyed by endpoint and normalized
+    query args, until ttl expires or one of tables is written.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = _aggregate_key(request.endpoint, request.args, kwargs)
+            hit = [True]
+
+            def compute():
+                hit[0] = False
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    # Errors are returned to this caller but never stored.
+                    compute.response = response
+                    return None
+                return _CachedResponse(response.get_data(), response.mimetype)
+
+            compute.response = None
+            cached = aggregate_cache.get_or_compute(key, tables, compute, ttl)
+            if cached is None:
+                if compute.response is not None:
+                    return compute.response
+                # A concurrent leader got a non-200 response; compute our own.
+                return view(*args, **kwargs)
+
+            response = current_app.response_class(cached.data, mimetype=cached.mimetype)
+            response.headers['X-Cache'] = 'HIT' if hit[0] else 'MISS'
+            return response
+        wrapper.aggregate_tables = tables
+        wrapper.aggregate_ttl = ttl
+        return wrapper
+    return decorator
+
+
+def cached_view_data(endpoint, query_args, compute):
+    """
+    The data a cached_aggregate JSON view returns for query_args, read from
+    the same cache entry; on a miss compute() builds it and the entry is
+    stored as the view would have, so callers that bypass the view (such
+    as a report batch) and the view itself share entries.
+    """
+    view = current_app.view_functions[endpoint]
+    computed = []
+
+    def render():
+        computed.append(compute())
+        return _CachedResponse(current_app.json.response(computed[0]).get_data(),
+                               'application/json')
+
+    cached = aggregate_cache.get_or_compute(_aggregate_key(endpoint, query_args),
+                                            view.aggregate_tables, render, view.aggregate_ttl)
+    return computed[0] if computed else current_app.json.loads(cached.data)
@@ -0,0 +1,302 @@
+"""
+Change feed: cross-process invalidation over PostgreSQL LISTEN/NOTIFY
+
+Triggers (migration 0008) publish a notification on the change_feed channel
+for every committed write to donor, hospital, blood_donation,
+blood_inventory, recipient_request and transaction_log. Each worker process
+runs one listener thread on a dedicated connection that hands every change
+to the callbacks registered with change_feed.subscribe(); that is how the
+aggregate cache, the donor suggest index and the watermark cache of a
+worker hear about writes made by the others.
+
+Notifications are only delivered to a connected listener. Whenever the
+listener (re)connects it first LISTENs and then sends every callback a
+resync change (table None, op 'resync'), so anything missed while it was
+down is dropped wholesale instead. A ping through the channel every
+CHANGE_FEED_PING seconds proves the connection still delivers; a ping not
+back within CHANGE_FEED_PING_TIMEOUT counts as a lost connection. Pings carry
+the listener's backend pid, so each worker only counts its own.
+
+Delivery lag is the time from the trigger to the callback (server and
+worker clocks are assumed to agree) and, for pings, the round trip through
+the server. Both are reported in GET /health and /metrics.
+
+    python change_feed.py      # print the feed as it arrives
+"""
+import json
+import logging
+import os
+import select
+import threading
+import time
+from collections import deque, namedtuple
+
+import psycopg2
+import psycopg2.extensions
+
+from db_utils import DB_CONFIG
+from metrics import render_gauges
+
+logger = logging.getLogger('blood_bank.change_feed')
+
+CHANNEL = 'change_feed'
+FEED_TABLES = ('donor', 'hospital', 'blood_donation', 'blood_inventory',
+               'recipient_request', 'transaction_log')
+PING = '_ping'
+
+# table is None for a resync; ids is None when the statement touched more
+# than 100 rows or truncated the table, and for nested writes (made by
+# another trigger, count is None too); lag is in seconds, None if unknown.
+Change = namedtuple('Change', 'table op ids count lag')
+
+
+def _percentile(ordered, pct):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1)]
+
+
+class ChangeFeed:
+    """
+    LISTENs on the change feed in a background thread and dispatches changes
+
+    Args:
+        enabled: Run the listener at all
+        ping_interval: Seconds between pings through the channel
+        ping_timeout: Seconds a ping may take before the connection is dropped
+        reconnect_delay: First wait before reconnecting; doubles up to 30s
+        lag_window: Recent deliveries kept for the lag percentiles
+    """
+
+    def __init__(self, enabled=True, ping_interval=30.0, ping_timeout=10.0,
+                 reconnect_delay=1.0, lag_window=1000):
+        self.enabled = enabled
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.reconnect_delay = reconnect_delay
+
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._subscribers = []          # (frozenset of tables or None, callback)
+        self._lags = deque(maxlen=lag_window)
+        self._ping_lags = deque(maxlen=lag_window)
+        self._ping_sent = None
+        self.connected = False
+        self.backend_pid = None
+
+        self.received = 0
+        self.dispatched = 0
+        self.pings = 0
+        self.resyncs = 0
+        self.connects = 0
+        self.errors = 0
+        self.callback_errors = 0
+        self.last_event = 0.0
+        self.disconnected_seconds = 0.0
+
+    def subscribe(self, tables, callback):
+        """Call callback(change) for changes to tables (None = all) and on every resync"""
+        with self._lock:
+            self._subscribers.append((frozenset(tables) if tables is not None else None, callback))
+
+    def _dispatch(self, change):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for tables, callback in subscribers:
+            if change.table is not None and tables is not None and change.table not in tables:
+                continue
+            try:
+                callback(change)
+            except Exception:
+                with self._lock:
+                    self.callback_errors += 1
+                logger.exception('Change feed callback %r failed for %s', callback, change)
+        with self._lock:
+            self.dispatched += 1
+
+    def _handle(self, payload):
+        received = time.time()
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.warning('Ignoring malformed change feed payload: %.200s', payload)
+            return
+        lag = max(received - float(event['ts']), 0.0) if event.get('ts') else None
+        if event.get('t') == PING:
+            # Every listener on the channel hears every worker's pings; only
+            # our own prove that this connection delivers.
+            if event.get('pid') != self.backend_pid:
+                return
+            with self._lock:
+                self.pings += 1
+                self._ping_lags.append(lag)
+                self._ping_sent = None
+            return
+        with self._lock:
+            self.received += 1
+            self.last_event = received
+            if lag is not None:
+                self._lags.append(lag)
+        self._dispatch(Change(event.get('t'), event.get('op'), event.get('ids'), event.get('n'), lag))
+
+    def _connect(self):
+        conn = psycopg2.connect(**DB_CONFIG, keepalives=1, keepalives_idle=30,
+                                keepalives_interval=10, keepalives_count=3,
+                                application_name='blood_bank_change_feed')
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cursor:
+            cursor.execute(f'LISTEN {CHANNEL}')
+        return conn
+
+    def _ping(self, conn):
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)',
+                           (CHANNEL, json.dumps({'t': PING, 'ts': time.time(),
+                                                 'pid': self.backend_pid})))
+        self._ping_sent = time.monotonic()
+
+    def _listen(self, conn):
+        next_ping = time.monotonic() + self.ping_interval
+        while not self._stop.is_set():
+            if select.select([conn], [], [], 1.0)[0]:
+                conn.poll()
+                while conn.notifies:
+                    self._handle(conn.notifies.pop(0).payload)
+            now = time.monotonic()
+            sent = self._ping_sent
+            if sent is not None and now - sent > self.ping_timeout:
+                raise psycopg2.OperationalError(f'ping not delivered within {self.ping_timeout}s')
+            if sent is None and now >= next_ping:
+                self._ping(conn)
+                next_ping = now + self.ping_interval
+
+    def resync(self):
+        """Tell every subscriber that changes may have been missed"""
+        with self._lock:
+            self.resyncs += 1
+        self._dispatch(Change(None, 'resync', None, None, None))
+
+    def _run(self):
+        delay = self.reconnect_delay
+        down_since = time.monotonic()
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                with self._lock:
+                    self.connected = True
+                    self.connects += 1
+                    self.backend_pid = conn.get_backend_pid()
+                    self.disconnected_seconds += time.monotonic() - down_since
+                    self._ping_sent = None
+                # Listening before the resync: nothing falls between the two.
+                self.resync()
+                delay = self.reconnect_delay
+                self._listen(conn)
+            except psycopg2.Error as e:
+                with self._lock:
+                    self.errors += 1
+                logger.warning('Change feed connection lost (%s); reconnecting in %.1fs',
+                               str(e).strip(), delay)
+            except Exception:
+                with self._lock:
+                    self.errors += 1
+                logger.exception('Change feed listener failed; reconnecting in %.1fs', delay)
+            finally:
+                if self.connected:
+                    down_since = time.monotonic()
+                with self._lock:
+                    self.connected = False
+                    self.backend_pid = None
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except psycopg2.Error:
+                        pass
+            if self._stop.wait(delay):
+                break
+            delay = min(delay * 2, 30.0)
+
+    def start(self):
+        """Start listening in a daemon thread (no-op if disabled or already running)"""
+        with self._lock:
+            if not self.enabled or (self._thread is not None and self._thread.is_alive()):
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='change-feed', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def stats(self):
+        with self._lock:
+            lags = sorted(self._lags)
+            ping_lags = sorted(self._ping_lags)
+            return {
+                'running': self._thread is not None and self._thread.is_alive(),
+                'connected': self.connected,
+                'received': self.received,
+                'dispatched': self.dispatched,
+                'pings': self.pings,
+                'resyncs': self.resyncs,
+                'connects': self.connects,
+                'errors': self.errors,
+                'callback_errors': self.callback_errors,
+                'disconnected_seconds': round(self.disconnected_seconds, 3),
+                'lag_p50_ms': round(_percentile(lags, 50) * 1000, 3),
+                'lag_p99_ms': round(_percentile(lags, 99) * 1000, 3),
+                'lag_max_ms': round(lags[-1] * 1000, 3) if lags else 0.0,
+                'ping_p50_ms': round(_percentile(ping_lags, 50) * 1000, 3),
+                'ping_max_ms': round(ping_lags[-1] * 1000, 3) if ping_lags else 0.0,
+                'last_event_timestamp': round(self.last_event, 3),
+            }
+
+    def render(self):
+        """Prometheus samples: totals as counters, state and lag as gauges"""
+        stats = self.stats()
+        totals = ('received', 'dispatched', 'pings', 'resyncs', 'connects', 'errors',
+                  'callback_errors')
+        return (
+            render_gauges('bloodbank_change_feed',
+                          {f'{k}_total': stats[k] for k in totals}, kind='counter')
+            + render_gauges('bloodbank_change_feed',
+                            {k: v for k, v in stats.items() if k not in totals})
+        )
+
+
+change_feed = ChangeFeed(
+    enabled=os.getenv('CHANGE_FEED_ENABLED', '1') == '1',
+    ping_interval=float(os.getenv('CHANGE_FEED_PING', '30')),
+    ping_timeout=float(os.getenv('CHANGE_FEED_PING_TIMEOUT', '10'))
+)
+
+
+def init_change_feed(app):
+    """
+    Start the listener on the first request rather than at import, so it runs
+    in the serving process and not in a parent that forks workers.
+    """
+    if not change_feed.enabled:
+        return
+
+    @app.before_request
+    def start_change_feed():
+        if change_feed._thread is None:
+            change_feed.start()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    change_feed.subscribe(None, lambda change: print(
+        change.table, change.op, change.count, change.ids,
+        f'{change.lag * 1000:.1f}ms' if change.lag is not None else '', flush=True))
+    change_feed.start()
+    try:
+        change_feed._thread.join()
+    except KeyboardInterrupt:
+        change_feed.stop()
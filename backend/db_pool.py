@@ -0,0 +1,200 @@
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within the timeout"""
+
+
+class ConnectionPool:
+    """
+    Thread-safe, bounded pool of PostgreSQL connections
+
+    Args:
+        conn_kwargs: Keyword arguments passed to psycopg2.connect
+        min_size: Connections opened up front and kept around
+        max_size: Hard upper bound on open connections
+        timeout: Seconds to wait for a free connection before PoolTimeout
+        validate_after: Idle seconds after which a connection is pinged on checkout
+        max_lifetime: Seconds after which a connection is closed and replaced
+    """
+
+    def __init__(self, conn_kwargs, min_size=1, max_size=10, timeout=30.0,
+                 validate_after=30.0, max_lifetime=3600.0):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError('Invalid pool size: min=%s max=%s' % (min_size, max_size))
+
+        self.conn_kwargs = dict(conn_kwargs)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.validate_after = validate_after
+        self.max_lifetime = max_lifetime
+
+        self._cond = threading.Condition()
+        self._idle = deque()       # (conn, created_at, last_used)
+        self._created = {}         # id(conn) -> created_at, for checked-out connections
+        self._size = 0
+        self._waiting = 0
+        self._closed = False
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._recycled = 0
+        self._discarded = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+        for _ in range(min_size):
+            conn = self._connect()
+            self._idle.append((conn, time.monotonic(), time.monotonic()))
+            self._size += 1
+
+    def _connect(self):
+        return psycopg2.connect(**self.conn_kwargs)
+
+    def _expired(self, created_at, now):
+        return self.max_lifetime and now - created_at > self.max_lifetime
+
+    def _is_usable(self, conn, last_used, now):
+        if conn.closed:
+            return False
+        if self.validate_after is not None and now - last_used > self.validate_after:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                conn.rollback()
+            except psycopg2.Error:
+                return False
+        return True
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def getconn(self, timeout=None):
+        """Check out a connection, waiting up to timeout seconds for one to free up"""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolTimeout('Connection pool is closed')
+
+                if self._idle:
+                    conn, created_at, last_used = self._idle.pop()
+                    break
+
+                if self._size < self.max_size:
+                    self._size += 1
+                    conn = None
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(
+                        'Timed out after %.1fs waiting for a database connection' % timeout
+                    )
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+        # Connecting and validating happen outside the lock so slow handshakes
+        # do not block other threads returning connections.
+        now = time.monotonic()
+        if conn is not None:
+            if self._expired(created_at, now) or not self._is_usable(conn, last_used, now):
+                self._close_quietly(conn)
+                with self._cond:
+                    self._recycled += 1
+                conn = None
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            created_at = time.monotonic()
+
+        waited = time.monotonic() - started
+        with self._cond:
+            self._created[id(conn)] = created_at
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return conn
+
+    def putconn(self, conn, discard=False):
+        """Return a connection to the pool, closing it if broken, old or discarded"""
+        if not discard and not conn.closed:
+            status = conn.info.transaction_status
+            if status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+
+        now = time.monotonic()
+        with self._cond:
+            created_at = self._created.pop(id(conn), now)
+            if discard or conn.closed or self._closed or self._expired(created_at, now):
+                self._size -= 1
+                if discard or conn.closed:
+                    self._discarded += 1
+                else:
+                    self._recycled += 1
+                close = True
+            else:
+                self._idle.append((conn, created_at, now))
+                close = False
+            self._cond.notify()
+
+        if close:
+            self._close_quietly(conn)
+
+    def stats(self):
+        """Snapshot of pool usage counters"""
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'size': self._size,
+                'in_use': self._size - idle,
+                'idle': idle,
+                'waiting': self._waiting,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'recycled': self._recycled,
+                'discarded': self._discarded,
+                'checkout_wait_avg_ms': round(
+                    self._wait_total / self._checkouts * 1000, 3
+                ) if self._checkouts else 0.0,
+                'checkout_wait_max_ms': round(self._wait_max * 1000, 3),
+            }
+
+    def closeall(self):
+        """Close idle connections and refuse further checkouts"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+
+        for conn, _, _ in idle:
+            self._close_quietly(conn)
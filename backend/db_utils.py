@@ -1,8 +1,18 @@
 import psycopg2
 import psycopg2.extras
 from contextlib import contextmanager
+from functools import wraps
 import os
+import re
+import threading
+import time
 from dotenv import load_dotenv
+from flask import Response, current_app, g, has_request_context, jsonify
+
+from db_pool import ConnectionPool
+from json_provider import dumps as json_dumps
+from metrics import query_metrics
+from profiling import record_phase, request_profiler
 
 load_dotenv()
 
@@ -14,34 +24,358 @@ DB_CONFIG = {
     'password': os.getenv('DB_PASSWORD', 'postgres')
 }
 
+POOL_CONFIG = {
+    'min_size': int(os.getenv('DB_POOL_MIN', '1')),
+    'max_size': int(os.getenv('DB_POOL_MAX', '10')),
+    'timeout': float(os.getenv('DB_POOL_TIMEOUT', '30')),
+    'validate_after': float(os.getenv('DB_POOL_VALIDATE_AFTER', '30')),
+    'max_lifetime': float(os.getenv('DB_POOL_MAX_LIFETIME', '3600'))
+}
+
+# execute_many() takes its multi-row fast path for "... VALUES %s" queries.
+MULTI_ROW_VALUES = re.compile(r'\bVALUES\s+%s', re.IGNORECASE)
+EXECUTE_MANY_PAGE_SIZE = 500
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_CONFIG, **POOL_CONFIG)
+    return _pool
+
+def close_pool():
+    """Close all pooled connections"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+# Pools inherited across fork(): never used or closed in the child, only kept
+# referenced, because closing (or garbage collecting) a connection sends a
+# terminate message on a socket the parent still uses.
+_inherited_pools = []
+
+def reset_pool_after_fork():
+    """Drop the pool inherited from the parent process; the child opens its own"""
+    global _pool, _pool_lock
+    if _pool is not None:
+        _inherited_pools.append(_pool)
+    _pool = None
+    _pool_lock = threading.Lock()
+
+def get_pool_stats():
+    """Return connection pool statistics (in use, idle, waiting, checkout latency)"""
+    if _pool is None:
+        return {'size': 0, 'in_use': 0, 'idle': 0, 'waiting': 0}
+    return _pool.stats()
+
+def _checkout(pool):
+    """Check out a pooled connection, timing the wait when metrics or profiling are enabled"""
+    if not (query_metrics.enabled or request_profiler.enabled):
+        return pool.getconn()
+    started = time.perf_counter()
+    conn = pool.getconn()
+    elapsed = time.perf_counter() - started
+    if query_metrics.enabled:
+        query_metrics.observe_acquire(elapsed)
+    if request_profiler.enabled:
+        record_phase('db-connect', elapsed)
+    return conn
+
+class InstrumentedCursor(psycopg2.extras.RealDictCursor):
+    """RealDictCursor that reports each statement's duration and row count"""
+
+    def _observe(self, query, elapsed, failed):
+        if query_metrics.enabled:
+            query_metrics.observe_query(query, elapsed, 0 if failed else self.rowcount, failed)
+        if request_profiler.enabled:
+            record_phase('sql', elapsed)
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = super().execute(query, vars)
+            failed = False
+            return result
+        finally:
+            self._observe(query, time.perf_counter() - started, failed)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = super().executemany(query, vars_list)
+            failed = False
+            return result
+        finally:
+            self._observe(query, time.perf_counter() - started, failed)
+
+    # Rows arrive with execute(); fetching turns them into dicts.
+    def fetchone(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            record_phase('rows', time.perf_counter() - started)
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        try:
+            return super().fetchmany(size)
+        finally:
+            record_phase('rows', time.perf_counter() - started)
+
+    def fetchall(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            record_phase('rows', time.perf_counter() - started)
+
+def _cursor_factory():
+    """InstrumentedCursor when anything records statement timings, else RealDictCursor"""
+    if query_metrics.enabled or request_profiler.enabled:
+        return InstrumentedCursor
+    return psycopg2.extras.RealDictCursor
+
+class DBSession:
+    """A pooled connection and open transaction shared by one Flask request (or worker_session block)"""
+
+    def __init__(self, conn, read_only=False):
+        self.conn = conn
+        self.read_only = read_only
+        self.failed = False
+        self.before_commit_callbacks = []
+        self.commit_callbacks = []
+
+    def rollback(self):
+        """Abort the transaction after a failed query; the request will not commit"""
+        self.failed = True
+        try:
+            self.conn.rollback()
+        except psycopg2.Error:
+            pass
+
+# Sessions opened by worker_session(), for code running outside a request.
+_worker = threading.local()
+
+def _session_enabled():
+    return has_request_context() and 'db_session' in current_app.extensions
+
+def _open_session(read_only):
+    conn = _checkout(get_pool())
+    try:
+        if read_only:
+            conn.set_session(isolation_level='REPEATABLE READ', readonly=True)
+    except Exception:
+        get_pool().putconn(conn, discard=True)
+        raise
+    return DBSession(conn, read_only)
+
+def _joined_session():
+    """The session queries join right now (without opening one), or None"""
+    if _session_enabled():
+        return g.get('_db_session')
+    return getattr(_worker, 'session', None)
+
+def _current_session():
+    """Return the request's DBSession, opening one on first use"""
+    if not _session_enabled():
+        return getattr(_worker, 'session', None)
+
+    session = g.get('_db_session')
+    if session is None:
+        session = _open_session(g.get('_db_read_only', False))
+        g._db_session = session
+    return session
+
+def _release_session(session, commit):
+    pool = get_pool()
+    conn = session.conn
+    broken = False
+    committed = False
+    try:
+        if commit and not session.failed and not conn.closed:
+            if session.before_commit_callbacks:
+                with conn.cursor() as cursor:
+                    for callback in session.before_commit_callbacks:
+                        callback(cursor)
+            if request_profiler.enabled:
+                started = time.perf_counter()
+                conn.commit()
+                record_phase('commit', time.perf_counter() - started)
+            else:
+                conn.commit()
+            committed = True
+        elif not conn.closed:
+            conn.rollback()
+        if session.read_only and not conn.closed:
+            conn.set_session(isolation_level='DEFAULT', readonly='DEFAULT')
+    except psycopg2.Error:
+        broken = True
+        raise
+    finally:
+        pool.putconn(conn, discard=broken or conn.closed)
+
+    if committed:
+        for callback in session.commit_callbacks:
+            callback()
+
+def on_commit(callback):
+    """
+    Run callback once the current request's transaction has committed, or
+    immediately when there is no request session.
+    """
+    session = _joined_session()
+    if session is None:
+        callback()
+    else:
+        session.commit_callbacks.append(callback)
+
+def before_commit(callback):
+    """
+    Run callback(cursor) as the last step of the current request's
+    transaction, so its writes commit (or fail) together with the request's.
+    Without a request session it runs at once in a transaction of its own.
+    Returns whether the callback was deferred to the request's commit.
+    """
+    session = _joined_session()
+    if session is None:
+        with _own_connection() as conn:
+            with conn.cursor() as cursor:
+                callback(cursor)
+        return False
+    session.before_commit_callbacks.append(callback)
+    return True
+
+def read_only_transaction(view):
+    """
+    Run every query of the decorated view in one REPEATABLE READ, read-only
+    transaction so the response is built from a single consistent snapshot.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if _session_enabled() and g.get('_db_session') is None:
+            g._db_read_only = True
+        return view(*args, **kwargs)
+    return wrapper
+
+def init_db_session(app):
+    """Tie a per-request database session to the Flask request lifecycle"""
+    app.extensions['db_session'] = True
+
+    @app.after_request
+    def commit_db_session(response):
+        session = g.pop('_db_session', None)
+        if session is None:
+            return response
+        try:
+            _release_session(session, commit=response.status_code < 500)
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+        return response
+
+    @app.teardown_request
+    def close_db_session(exception=None):
+        session = g.pop('_db_session', None)
+        if session is not None:
+            _release_session(session, commit=False)
+
+@contextmanager
+def worker_session(read_only=False):
+    """
+    Session for a background thread: the queries inside the block share one
+    pooled connection and transaction, committed when the block exits
+    cleanly, as they would in a request. read_only gives them one
+    REPEATABLE READ snapshot. Ignored by queries made inside a request.
+    """
+    session = _open_session(read_only)
+    _worker.session = session
+    try:
+        yield session
+    except Exception:
+        _worker.session = None
+        _release_session(session, commit=False)
+        raise
+    _worker.session = None
+    _release_session(session, commit=True)
+
 @contextmanager
 def get_db_connection():
-    """Context manager for database connections"""
-    conn = None
+    """
+    Context manager for database connections
+
+    Inside a Flask request the request's shared connection is used and the
+    transaction is committed once the response is ready; inside a
+    worker_session block, the block's. Otherwise a connection is checked
+    out of the pool and committed on exit.
+    """
+    session = _current_session()
+    if session is not None:
+        try:
+            yield session.conn
+        except Exception as e:
+            session.rollback()
+            raise e
+        return
+
+    with _own_connection() as conn:
+        yield conn
+
+@contextmanager
+def _own_connection():
+    pool = get_pool()
+    conn = _checkout(pool)
+    broken = False
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
         yield conn
         conn.commit()
     except Exception as e:
-        if conn:
+        try:
             conn.rollback()
+        except psycopg2.Error:
+            broken = True
+        if isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+            broken = True
         raise e
     finally:
-        if conn:
-            conn.close()
+        pool.putconn(conn, discard=broken or conn.closed)
 
 @contextmanager
 def get_db_cursor(commit=True):
-    """Context manager for database cursor with auto-commit"""
+    """
+    Context manager for database cursor with auto-commit outside a request session
+
+    When query metrics or profiling are enabled the cursor records per-statement timings.
+    """
     with get_db_connection() as conn:
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cursor = conn.cursor(cursor_factory=_cursor_factory())
         try:
             yield cursor
-            if commit:
+            if commit and _joined_session() is None:
                 conn.commit()
-        except Exception as e:
-            conn.rollback()
-            raise e
+        finally:
+            cursor.close()
+
+@contextmanager
+def get_separate_cursor():
+    """
+    Cursor on a pooled connection of its own, committed on exit
+
+    Never joins the request session, so whatever it writes is committed, and
+    visible to the request's own queries, as soon as the block ends.
+    """
+    with _own_connection() as conn:
+        cursor = conn.cursor(cursor_factory=_cursor_factory())
+        try:
+            yield cursor
         finally:
             cursor.close()
 
@@ -65,11 +399,28 @@ def execute_query(query, params=None, fetch=True):
         else:
             return cursor.rowcount
 
-def execute_many(query, params_list):
-    """Execute the same query with multiple parameter sets"""
+def execute_many(query, params_list, page_size=EXECUTE_MANY_PAGE_SIZE):
+    """
+    Execute the same query with multiple parameter sets
+
+    A query written with a single ``VALUES %s`` placeholder (see
+    psycopg2.extras.execute_values) is sent as multi-row statements of
+    page_size rows each, one round trip per page. Any other query falls back to
+    executemany, which sends one statement per parameter set. Returns the total
+    number of affected rows.
+    """
     with get_db_cursor() as cursor:
-        cursor.executemany(query, params_list)
-        return cursor.rowcount
+        if not MULTI_ROW_VALUES.search(query):
+            cursor.executemany(query, params_list)
+            return cursor.rowcount
+        
+        total = 0
+        params_list = list(params_list)
+        for start in range(0, len(params_list), page_size):
+            page = params_list[start:start + page_size]
+            psycopg2.extras.execute_values(cursor, query, page, page_size=len(page))
+            total += cursor.rowcount
+        return total
 
 def fetch_one(query, params=None):
     """Execute query and fetch single result"""
@@ -89,6 +440,105 @@ def insert_and_return_id(query, params=None):
         cursor.execute(query + " RETURNING *", params)
         return cursor.fetchone()
 
+DEFAULT_ITERSIZE = int(os.getenv('DB_ITERSIZE', '2000'))
+
+class RowStream:
+    """
+    Rows read incrementally from a named (server-side) cursor
+
+    Holds its own pooled connection until the stream is exhausted or closed,
+    so it can outlive the request session and feed a streaming response.
+    Streaming views must therefore query nothing else: a stream opened while
+    the request (or worker_session) already holds a connection would take a
+    second pool slot, and raises RuntimeError instead.
+    """
+
+    def __init__(self, query, params=None, itersize=DEFAULT_ITERSIZE, as_dict=True):
+        if _joined_session() is not None:
+            raise RuntimeError('Cannot stream rows after other queries in the same session')
+        self.itersize = itersize
+        self._pool = get_pool()
+        self._conn = _checkout(self._pool)
+        self._closed = False
+        try:
+            self._cursor = self._conn.cursor(
+                name=f'stream_{id(self):x}',
+                cursor_factory=psycopg2.extras.RealDictCursor if as_dict else None
+            )
+            self._cursor.itersize = itersize
+            self._cursor.execute(query, params)
+            # Named cursors only describe their columns after the first fetch;
+            # fetching eagerly also surfaces query errors before streaming starts.
+            self._first_batch = self._cursor.fetchmany(itersize)
+            self.columns = [col[0] for col in self._cursor.description]
+        except Exception:
+            self.close()
+            raise
+
+    def batches(self):
+        """Yield lists of at most itersize rows, releasing the connection at the end"""
+        try:
+            batch, self._first_batch = self._first_batch, None
+            while batch:
+                yield batch
+                batch = self._cursor.fetchmany(self.itersize)
+        finally:
+            self.close()
+
+    def __iter__(self):
+        for batch in self.batches():
+            yield from batch
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if getattr(self, '_cursor', None) is not None and not self._cursor.closed:
+                self._cursor.close()
+        except psycopg2.Error:
+            pass
+        finally:
+            self._pool.putconn(self._conn, discard=self._conn.closed)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def stream_rows(query, params=None, itersize=DEFAULT_ITERSIZE, as_dict=True):
+    """
+    Execute query on a server-side cursor and return a RowStream
+
+    Args:
+        query: SQL query string
+        params: Query parameters (tuple or dict)
+        itersize: Rows fetched from the server per round trip
+        as_dict: Yield dictionaries (True) or plain tuples (False)
+    """
+    return RowStream(query, params, itersize, as_dict)
+
+def stream_json_array(query, params=None, itersize=DEFAULT_ITERSIZE):
+    """Build a response that streams query results as a JSON array, batch by batch"""
+    # Tuple rows are cheaper to fetch than RealDictRows; each batch is zipped
+    # into plain dicts and encoded in one call.
+    rows = stream_rows(query, params, itersize, as_dict=False)
+    columns = rows.columns
+
+    def generate():
+        yield '['
+        first = True
+        for batch in rows.batches():
+            chunk = json_dumps([dict(zip(columns, row)) for row in batch])[1:-1]
+            yield chunk if first else ',' + chunk
+            first = False
+        yield ']'
+
+    response = Response(generate(), mimetype='application/json')
+    response.call_on_close(rows.close)
+    return response
+
 def test_connection():
     """Test database connection"""
     try:
@@ -0,0 +1,201 @@
+"""
+Background sweeper that marks bags past their expiry date as expired
+
+The expire_inventory trigger only fires when a bag row is written, so bags
+nobody touches would stay 'available' forever. The sweeper updates them in
+small batches, each in its own short transaction with a pause in between, so
+it never holds row locks for long or competes with allocators (rows they hold
+are skipped and picked up on the next run). Every change is written to
+audit_log in the same statement.
+
+Runs inside the API process every EXPIRY_SWEEP_INTERVAL seconds (0 disables
+it), or once from cron:
+
+    python expiry_sweeper.py
+"""
+import logging
+import os
+import threading
+import time
+
+from cache import invalidate_tables
+from db_utils import get_db_cursor
+from metrics import render_gauges
+
+logger = logging.getLogger('blood_bank.expiry_sweeper')
+
+# Transaction-level advisory lock: concurrent sweepers (several workers, a
+# cron run) do not step on each other; the loser simply stops for this run.
+LOCK_KEY = 7_262_636_002
+
+# Available and reserved bags stop being usable once expired. Assigned and
+# used bags have already left the shelf and keep their status.
+SWEEP_BATCH_QUERY = """
+    WITH batch AS (
+        SELECT bag_id, status
+        FROM blood_inventory
+        WHERE status IN ('available', 'reserved') AND expiry_date < CURRENT_DATE
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    ),
+    expired AS (
+        UPDATE blood_inventory b
+        SET status = 'expired'
+        FROM batch
+        WHERE b.bag_id = batch.bag_id
+        RETURNING b.bag_id, b.bag_number, b.expiry_date, batch.status as old_status
+    )
+    INSERT INTO audit_log (table_name, record_id, action, old_values, new_values, changed_by)
+    SELECT 'blood_inventory', bag_id, 'expire',
+           jsonb_build_object('status', old_status),
+           jsonb_build_object('status', 'expired', 'bag_number', bag_number,
+                              'expiry_date', expiry_date),
+           'expiry_sweeper'
+    FROM expired
+"""
+
+
+class ExpirySweeper:
+    """
+    Periodically expires bags in bounded batches
+
+    Args:
+        batch_size: Bags updated per transaction
+        pause: Seconds to sleep between batches
+        interval: Seconds between sweeps when running in the background
+    """
+
+    def __init__(self, batch_size=500, pause=0.05, interval=300.0):
+        self.batch_size = batch_size
+        self.pause = pause
+        self.interval = interval
+
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+        self.runs = 0
+        self.batches = 0
+        self.bags_expired = 0
+        self.errors = 0
+        self.last_run_expired = 0
+        self.last_run_seconds = 0.0
+        self.last_success = 0.0
+
+    def _sweep_batch(self):
+        """Expire one batch; returns the number of bags, or None if another sweeper holds the lock"""
+        with get_db_cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_xact_lock(%s) as locked", (LOCK_KEY,))
+            if not cursor.fetchone()['locked']:
+                return None
+            cursor.execute(SWEEP_BATCH_QUERY, (self.batch_size,))
+            return cursor.rowcount
+
+    def sweep(self):
+        """Expire every overdue bag, batch by batch; returns how many were expired"""
+        started = time.perf_counter()
+        expired = 0
+        try:
+            while True:
+                count = self._sweep_batch()
+                if count is None:
+                    break
+                with self._lock:
+                    self.batches += 1
+                    self.bags_expired += count
+                expired += count
+                if count < self.batch_size or self._stop.is_set():
+                    break
+                time.sleep(self.pause)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            logger.exception('Expiry sweep failed after %d bags', expired)
+            raise
+        finally:
+            if expired:
+                invalidate_tables('blood_inventory')
+            with self._lock:
+                self.runs += 1
+                self.last_run_expired = expired
+                self.last_run_seconds = time.perf_counter() - started
+
+        with self._lock:
+            self.last_success = time.time()
+        if expired:
+            logger.info('Expired %d bags in %.2fs', expired, self.last_run_seconds)
+        return expired
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sweep()
+            except Exception:
+                pass   # logged and counted by sweep(); retry next interval
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """Start sweeping in a daemon thread (no-op if already running or interval <= 0)"""
+        with self._lock:
+            if self.interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='expiry-sweeper', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'running': self._thread is not None and self._thread.is_alive(),
+                'runs': self.runs,
+                'batches': self.batches,
+                'bags_expired': self.bags_expired,
+                'errors': self.errors,
+                'last_run_expired': self.last_run_expired,
+                'last_run_seconds': round(self.last_run_seconds, 3),
+                'last_success_timestamp': round(self.last_success, 3),
+            }
+
+    def render(self):
+        """Prometheus samples: totals as counters, the last run as gauges"""
+        stats = self.stats()
+        totals = ('runs', 'batches', 'bags_expired', 'errors')
+        return (
+            render_gauges('bloodbank_expiry_sweeper',
+                          {f'{k}_total': stats[k] for k in totals}, kind='counter')
+            + render_gauges('bloodbank_expiry_sweeper',
+                            {k: v for k, v in stats.items() if k not in totals})
+        )
+
+
+expiry_sweeper = ExpirySweeper(
+    batch_size=int(os.getenv('EXPIRY_SWEEP_BATCH', '500')),
+    pause=float(os.getenv('EXPIRY_SWEEP_PAUSE', '0.05')),
+    interval=float(os.getenv('EXPIRY_SWEEP_INTERVAL', '300'))
+)
+
+
+def init_expiry_sweeper(app):
+    """
+    Start the background sweeper on the first request rather than at import,
+    so it runs in the serving process and not in a parent that forks workers.
+    """
+    if expiry_sweeper.interval <= 0:
+        return
+
+    @app.before_request
+    def start_expiry_sweeper():
+        if expiry_sweeper._thread is None:
+            expiry_sweeper.start()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    count = expiry_sweeper.sweep()
+    print(f'{count} bag(s) expired')
@@ -27,7 +27,25 @@ if [ $? -ne 0 ]; then
     exit 1
 fi
 
-psql -d $DB_NAME -f database/schema.sql
+# An existing schema dump is loaded first if present; the migrations then
+# create anything missing (the baseline is skipped when tables already exist).
+if [ -f database/schema.sql ]; then
+    psql -d $DB_NAME -f database/schema.sql || exit 1
+fi
+
+DB_NAME=$DB_NAME python migrate.py
+
+if [ $? -ne 0 ]; then
+    echo "Failed to apply migrations. Run 'python migrate.py status' for details."
+    exit 1
+fi
+
+# Optional synthetic data, e.g. SEED_ROWS=1000000 ./init_db.sh; the same SEED and
+# SEED_END_DATE (default today) give the same rows
+if [ -n "$SEED_ROWS" ]; then
+    DB_NAME=$DB_NAME python -m benchmarks.generate_dataset --rows "$SEED_ROWS" --seed "${SEED:-42}" \
+        ${SEED_END_DATE:+--end-date "$SEED_END_DATE"}
+fi
 
 if [ $? -eq 0 ]; then
     echo "Database setup completed successfully!"
@@ -41,6 +59,6 @@ if [ $? -eq 0 ]; then
     echo ""
     echo "Done"
 else
-    echo "Failed to load schema. Please check the SQL file for errors."
+    echo "Failed to load synthetic data."
     exit 1
 fi
@@ -0,0 +1,60 @@
+import datetime
+import decimal
+import json
+import uuid
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional, compiled encoder
+    orjson = None
+
+
+def default(value):
+    """
+    Encode the non-JSON types psycopg2 returns
+
+    Dates and datetimes become ISO 8601 strings, matching what the routes used
+    to produce with per-row isoformat() loops. Decimals are kept as strings so
+    no precision is lost. PostgreSQL enums already arrive as str.
+    """
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    if isinstance(value, memoryview):
+        return value.tobytes().decode('utf-8', 'replace')
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj, sort_keys=False):
+        """Serialize obj to a JSON string using orjson"""
+        option = _ORJSON_OPTIONS | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        return orjson.dumps(obj, default=default, option=option).decode('utf-8')
+else:
+    def dumps(obj, sort_keys=False):
+        """Serialize obj to a JSON string using the standard library"""
+        return json.dumps(obj, default=default, sort_keys=sort_keys, separators=(',', ':'))
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider that encodes database rows directly
+
+    Uses orjson when it is installed and falls back to the standard library
+    otherwise. Either way date/datetime/Decimal values are handled during
+    encoding, so routes can pass fetched rows straight to jsonify.
+    """
+
+    default = staticmethod(default)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs.get('indent') or kwargs.get('cls'):
+            return super().dumps(obj, **kwargs)
+        return dumps(obj, sort_keys=kwargs.get('sort_keys', self.sort_keys))
@@ -0,0 +1,276 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from functools import lru_cache
+
+from flask import g, has_request_context, request
+
+logger = logging.getLogger('blood_bank.slow_query')
+
+# Seconds; roughly the Prometheus client defaults with finer steps below 5ms.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_COMMENT = re.compile(r'--[^\n]*|/\*.*?\*/', re.S)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_PARAM = re.compile(r'%\(\w+\)s|%s')
+_NUMBER = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=2048)
+def normalize_statement(query):
+    """
+    Reduce a SQL string to its shape: literals and placeholders become ?,
+    IN lists collapse to (?...) and whitespace is squeezed.
+    """
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    text = _COMMENT.sub(' ', str(query))
+    text = _STRING.sub('?', text)
+    text = _PARAM.sub('?', text)
+    text = _NUMBER.sub('?', text)
+    text = _IN_LIST.sub('(?...)', text)
+    return _SPACE.sub(' ', text).strip()
+
+
+@lru_cache(maxsize=2048)
+def _statement_labels(query):
+    statement = normalize_statement(query)
+    query_id = hashlib.sha1(statement.encode('utf-8')).hexdigest()[:10]
+    return query_id, statement[:160]
+
+
+def current_endpoint():
+    """Flask endpoint of the running request, or 'none' outside a request"""
+    if has_request_context():
+        return request.endpoint or 'unmatched'
+    return 'none'
+
+
+class Histogram:
+    """Cumulative-on-render latency histogram (not thread-safe on its own)"""
+
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, buckets, value):
+        self.counts[bisect_left(buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class QueryMetrics:
+    """
+    In-process registry of query, connection and request timings
+
+    Everything is keyed by label tuples and guarded by a single lock; the
+    recording methods are only called when enabled is true, so a disabled
+    registry costs one attribute check per query.
+
+    Args:
+        enabled: Record anything at all
+        slow_query_ms: Queries at or above this duration are logged
+        slow_log_size: Number of recent slow queries kept for /metrics/slow-queries
+        buckets: Histogram upper bounds in seconds
+    """
+
+    def __init__(self, enabled=False, slow_query_ms=500.0, slow_log_size=100,
+                 buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.slow_query_ms = slow_query_ms
+        self.buckets = tuple(buckets)
+
+        self._lock = threading.Lock()
+        self._queries = {}       # (query_id, statement, endpoint) -> Histogram
+        self._rows = {}          # same key -> rows returned or affected
+        self._errors = {}        # same key -> failed executions
+        self._slow = {}          # same key -> slow executions
+        self._acquire = Histogram(self.buckets)
+        self._requests = {}      # (method, endpoint, status) -> Histogram
+        self._slow_log = deque(maxlen=slow_log_size)
+
+    def observe_query(self, query, seconds, rows=0, error=False):
+        """Record one statement execution"""
+        query_id, statement = _statement_labels(query)
+        endpoint = current_endpoint()
+        key = (query_id, statement, endpoint)
+        slow = seconds * 1000 >= self.slow_query_ms
+
+        with self._lock:
+            histogram = self._queries.get(key)
+            if histogram is None:
+                histogram = self._queries[key] = Histogram(self.buckets)
+            histogram.observe(self.buckets, seconds)
+            if rows and rows > 0:
+                self._rows[key] = self._rows.get(key, 0) + rows
+            if error:
+                self._errors[key] = self._errors.get(key, 0) + 1
+            if slow:
+                self._slow[key] = self._slow.get(key, 0) + 1
+                self._slow_log.append({
+                    'query_id': query_id,
+                    'statement': normalize_statement(query),
+                    'endpoint': endpoint,
+                    'duration_ms': round(seconds * 1000, 3),
+                    'rows': rows,
+                    'error': error,
+                    'at': time.time(),
+                })
+
+        if slow:
+            logger.warning('Slow query %.1fms [%s] endpoint=%s rows=%s: %s',
+                           seconds * 1000, query_id, endpoint, rows,
+                           normalize_statement(query))
+
+    def observe_acquire(self, seconds):
+        """Record time spent checking a connection out of the pool"""
+        with self._lock:
+            self._acquire.observe(self.buckets, seconds)
+
+    def observe_request(self, method, endpoint, status, seconds):
+        key = (method, endpoint, str(status))
+        with self._lock:
+            histogram = self._requests.get(key)
+            if histogram is None:
+                histogram = self._requests[key] = Histogram(self.buckets)
+            histogram.observe(self.buckets, seconds)
+
+    def slow_queries(self):
+        """Most recent slow queries, newest first"""
+        with self._lock:
+            return list(reversed(self._slow_log))
+
+    def reset(self):
+        with self._lock:
+            self._queries.clear()
+            self._rows.clear()
+            self._errors.clear()
+            self._slow.clear()
+            self._acquire = Histogram(self.buckets)
+            self._requests.clear()
+            self._slow_log.clear()
+
+    def render(self):
+        """Prometheus text exposition of everything recorded so far"""
+        with self._lock:
+            queries = [(k, _copy(h)) for k, h in self._queries.items()]
+            rows = dict(self._rows)
+            errors = dict(self._errors)
+            slow = dict(self._slow)
+            acquire = _copy(self._acquire)
+            requests = [(k, _copy(h)) for k, h in self._requests.items()]
+
+        query_labels = ('query_id', 'statement', 'endpoint')
+        lines = []
+
+        _header(lines, 'bloodbank_db_query_duration_seconds', 'histogram',
+                'Statement execution time by normalized statement and endpoint')
+        for key, histogram in queries:
+            _histogram(lines, 'bloodbank_db_query_duration_seconds',
+                       dict(zip(query_labels, key)), histogram, self.buckets)
+
+        for name, kind, text, values in (
+            ('bloodbank_db_query_rows_total', 'counter', 'Rows returned or affected', rows),
+            ('bloodbank_db_query_errors_total', 'counter', 'Statements that raised', errors),
+            ('bloodbank_db_slow_queries_total', 'counter',
+             'Statements at or above the slow query threshold', slow),
+        ):
+            _header(lines, name, kind, text)
+            for key, value in values.items():
+                lines.append(f'{name}{_labels(dict(zip(query_labels, key)))} {value}')
+
+        _header(lines, 'bloodbank_db_connection_acquire_seconds', 'histogram',
+                'Time spent waiting for a pooled connection')
+        _histogram(lines, 'bloodbank_db_connection_acquire_seconds', {}, acquire, self.buckets)
+
+        _header(lines, 'bloodbank_http_request_duration_seconds', 'histogram',
+                'Request handling time by method, endpoint and status')
+        for key, histogram in requests:
+            _histogram(lines, 'bloodbank_http_request_duration_seconds',
+                       dict(zip(('method', 'endpoint', 'status'), key)), histogram, self.buckets)
+
+        lines.append(f'bloodbank_slow_query_threshold_seconds {self.slow_query_ms / 1000}')
+        return '\n'.join(lines) + '\n'
+
+
+def _copy(histogram):
+    copy = Histogram.__new__(Histogram)
+    copy.counts = list(histogram.counts)
+    copy.sum = histogram.sum
+    copy.count = histogram.count
+    return copy
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+
+
+def _header(lines, name, kind, text):
+    lines.append(f'# HELP {name} {text}')
+    lines.append(f'# TYPE {name} {kind}')
+
+
+def _histogram(lines, name, labels, histogram, buckets):
+    cumulative = 0
+    for bound, count in zip(buckets, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{_labels({**labels, "le": repr(bound)})} {cumulative}')
+    lines.append(f'{name}_bucket{_labels({**labels, "le": "+Inf"})} {histogram.count}')
+    lines.append(f'{name}_sum{_labels(labels)} {histogram.sum:.6f}')
+    lines.append(f'{name}_count{_labels(labels)} {histogram.count}')
+
+
+def render_gauges(prefix, stats, kind='gauge'):
+    """Render a flat dict of numeric stats (pool, cache) as Prometheus samples"""
+    lines = []
+    for key, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        name = f'{prefix}_{key}'
+        lines.append(f'# TYPE {name} {kind}')
+        lines.append(f'{name} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+query_metrics = QueryMetrics(
+    enabled=os.getenv('METRICS_ENABLED', '0') == '1',
+    slow_query_ms=float(os.getenv('SLOW_QUERY_MS', '500')),
+    slow_log_size=int(os.getenv('SLOW_QUERY_LOG_SIZE', '100'))
+)
+
+
+def init_request_metrics(app):
+    """Time every request when metrics are enabled (no hooks are added otherwise)"""
+    if not query_metrics.enabled:
+        return
+
+    @app.before_request
+    def start_request_timer():
+        g._request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_time(response):
+        started = g.pop('_request_started', None)
+        if started is not None:
+            query_metrics.observe_request(
+                request.method, request.endpoint or 'unmatched',
+                response.status_code, time.perf_counter() - started
+            )
+        return response
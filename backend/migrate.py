@@ -0,0 +1,228 @@
+"""
+Versioned schema migrations
+
+Migrations live in migrations/NNNN_name.py. Each module defines STATEMENTS
+(a list of SQL strings) and may set TRANSACTIONAL = False for statements
+such as CREATE INDEX CONCURRENTLY. Applied versions are recorded in
+schema_migrations together with a checksum of their statements.
+
+Usage (from backend/):
+    python migrate.py              # apply all pending migrations
+    python migrate.py --target 1   # apply up to and including version 1
+    python migrate.py status
+"""
+import argparse
+import hashlib
+import importlib.util
+import os
+import re
+import sys
+import time
+
+import psycopg2
+
+from db_utils import DB_CONFIG
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_FILE = re.compile(r'^(\d{4})_(\w+)\.py$')
+
+# Session-level advisory lock so two deploys never migrate concurrently.
+LOCK_KEY = 7_262_636_001
+
+
+class MigrationError(Exception):
+    """Raised for malformed, edited or failing migrations"""
+
+
+class Migration:
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+
+        spec = importlib.util.spec_from_file_location(f'migration_{version:04d}', path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+        self.statements = list(getattr(module, 'STATEMENTS', []))
+        if not self.statements:
+            raise MigrationError(f'{os.path.basename(path)} defines no STATEMENTS')
+        self.transactional = getattr(module, 'TRANSACTIONAL', True)
+        self.description = (module.__doc__ or '').strip().splitlines()[0] if module.__doc__ else ''
+        self.checksum = hashlib.sha256('\n;\n'.join(self.statements).encode('utf-8')).hexdigest()
+
+    def __repr__(self):
+        return f'{self.version:04d}_{self.name}'
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    """Return the migrations in directory ordered by version"""
+    migrations = {}
+    for filename in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE.match(filename)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise MigrationError(f'Duplicate migration version {version:04d}')
+        migrations[version] = Migration(version, match.group(2), os.path.join(directory, filename))
+    return [migrations[v] for v in sorted(migrations)]
+
+
+def ensure_migrations_table(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INT PRIMARY KEY,
+                name VARCHAR(200) NOT NULL,
+                checksum CHAR(64) NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                duration_ms NUMERIC(12, 1)
+            )
+        """)
+
+
+def applied_migrations(conn):
+    """Return {version: row} for every recorded migration"""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT version, name, checksum, applied_at, duration_ms "
+            "FROM schema_migrations ORDER BY version"
+        )
+        return {row[0]: row for row in cursor.fetchall()}
+
+
+def _drop_invalid_indexes(conn, migration):
+    """
+    Drop INVALID indexes left behind by an interrupted CONCURRENTLY build of
+    this migration; IF NOT EXISTS would otherwise skip them on retry.
+    """
+    text = '\n'.join(migration.statements)
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT c.relname
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE NOT i.indisvalid AND n.nspname = current_schema()
+        """)
+        for (index_name,) in cursor.fetchall():
+            if re.search(r'\b%s\b' % re.escape(index_name), text):
+                cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{index_name}"')
+
+
+def apply_migration(conn, migration):
+    """Run one migration and record it; returns the duration in milliseconds"""
+    started = time.perf_counter()
+    try:
+        if migration.transactional:
+            conn.autocommit = False
+            with conn.cursor() as cursor:
+                for statement in migration.statements:
+                    cursor.execute(statement)
+        else:
+            conn.autocommit = True
+            _drop_invalid_indexes(conn, migration)
+            with conn.cursor() as cursor:
+                for statement in migration.statements:
+                    cursor.execute(statement)
+            conn.autocommit = False
+
+        duration_ms = round((time.perf_counter() - started) * 1000, 1)
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, name, checksum, duration_ms) "
+                "VALUES (%s, %s, %s, %s)",
+                (migration.version, migration.name, migration.checksum, duration_ms)
+            )
+        conn.commit()
+        return duration_ms
+    except psycopg2.Error as e:
+        if not conn.autocommit:
+            conn.rollback()
+        conn.autocommit = False
+        raise MigrationError(f'{migration} failed: {e}'.strip())
+
+
+def migrate(conn, target=None, migrations=None, log=print):
+    """
+    Apply pending migrations up to target (all when None)
+
+    Returns the list of migrations applied. Raises MigrationError if an
+    already applied migration has been edited since.
+    """
+    migrations = load_migrations() if migrations is None else migrations
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(%s)", (LOCK_KEY,))
+    try:
+        conn.autocommit = False
+        ensure_migrations_table(conn)
+        conn.commit()
+        applied = applied_migrations(conn)
+        conn.commit()
+
+        done = []
+        for migration in migrations:
+            if target is not None and migration.version > target:
+                break
+            row = applied.get(migration.version)
+            if row is not None:
+                if row[2] != migration.checksum:
+                    raise MigrationError(
+                        f'{migration} was edited after it was applied (checksum mismatch); '
+                        'add a new migration instead'
+                    )
+                continue
+            log(f'Applying {migration} ...')
+            duration_ms = apply_migration(conn, migration)
+            log(f'  done in {duration_ms}ms')
+            done.append(migration)
+        return done
+    finally:
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (LOCK_KEY,))
+        conn.autocommit = False
+
+
+def status(conn, migrations=None):
+    """Return (migration, applied_row or None) pairs"""
+    migrations = load_migrations() if migrations is None else migrations
+    ensure_migrations_table(conn)
+    applied = applied_migrations(conn)
+    conn.commit()
+    return [(m, applied.get(m.version)) for m in migrations]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply versioned schema migrations')
+    parser.add_argument('command', nargs='?', default='up', choices=['up', 'status'])
+    parser.add_argument('--target', type=int, help='highest version to apply')
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        if args.command == 'status':
+            for migration, row in status(conn):
+                if row is None:
+                    state = 'pending'
+                elif row[2] != migration.checksum:
+                    state = 'EDITED'
+                else:
+                    state = f'applied {row[3]:%Y-%m-%d %H:%M}'
+                print(f'{migration!r:40} {state:24} {migration.description}')
+            return 0
+
+        applied = migrate(conn, target=args.target)
+        print(f'{len(applied)} migration(s) applied' if applied else 'Database is up to date')
+        return 0
+    except MigrationError as e:
+        print(f'Migration error: {e}', file=sys.stderr)
+        return 1
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
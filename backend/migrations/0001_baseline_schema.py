@@ -0,0 +1,209 @@
+"""
+Baseline schema: enum types, the 8 tables and their triggers
+
+Reconstructed from the columns the routes read and write and the types and
+triggers described in the README. The whole block is skipped when a donor
+table already exists, so databases created from an older schema.sql are
+recorded as baselined without being touched.
+"""
+
+STATEMENTS = [
+    """
+    DO $baseline$
+    BEGIN
+        IF to_regclass('public.donor') IS NOT NULL THEN
+            RETURN;
+        END IF;
+
+        CREATE TYPE blood_group AS ENUM ('O+', 'O-', 'A+', 'A-', 'B+', 'B-', 'AB+', 'AB-');
+        CREATE TYPE urgency_level_t AS ENUM ('Routine', 'Urgent', 'Emergency');
+        CREATE TYPE request_status_t AS ENUM ('pending', 'approved', 'rejected', 'fulfilled');
+        CREATE TYPE inventory_status_t AS ENUM ('available', 'reserved', 'assigned', 'expired', 'used');
+        CREATE TYPE testing_status_t AS ENUM ('pending', 'passed', 'failed');
+        CREATE TYPE transaction_type_t AS ENUM ('issue', 'return', 'discard');
+        CREATE TYPE user_role_t AS ENUM ('admin', 'hospital', 'donor', 'staff');
+
+        CREATE TABLE donor (
+            donor_id SERIAL PRIMARY KEY,
+            first_name VARCHAR(50) NOT NULL,
+            last_name VARCHAR(50) NOT NULL,
+            email VARCHAR(100) UNIQUE,
+            phone VARCHAR(20) NOT NULL,
+            blood_type blood_group NOT NULL,
+            gender VARCHAR(10),
+            date_of_birth DATE NOT NULL,
+            address TEXT,
+            city VARCHAR(50),
+            state VARCHAR(50),
+            zip_code VARCHAR(10),
+            status VARCHAR(20) DEFAULT 'available',
+            medical_history TEXT,
+            last_donation_date DATE,
+            total_donations INT DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE TABLE hospital (
+            hospital_id SERIAL PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            registration_number VARCHAR(50) UNIQUE,
+            email VARCHAR(100),
+            phone VARCHAR(20) NOT NULL,
+            address TEXT,
+            city VARCHAR(50) NOT NULL,
+            state VARCHAR(50) NOT NULL,
+            zip_code VARCHAR(10),
+            contact_person VARCHAR(100),
+            contact_person_phone VARCHAR(20),
+            contact_person_email VARCHAR(100),
+            hospital_type VARCHAR(50),
+            bed_capacity INT,
+            license_status VARCHAR(20) DEFAULT 'active',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE TABLE blood_donation (
+            donation_id SERIAL PRIMARY KEY,
+            donor_id INT NOT NULL REFERENCES donor(donor_id) ON DELETE CASCADE,
+            donation_date DATE NOT NULL,
+            location VARCHAR(100),
+            volume_ml INT NOT NULL,
+            blood_type blood_group NOT NULL,
+            hemoglobin_level NUMERIC(4, 1),
+            blood_pressure_systolic INT,
+            blood_pressure_diastolic INT,
+            donation_status VARCHAR(20) DEFAULT 'completed',
+            screened BOOLEAN DEFAULT FALSE,
+            screening_results TEXT,
+            staff_name VARCHAR(100),
+            notes TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE TABLE recipient_request (
+            request_id SERIAL PRIMARY KEY,
+            hospital_id INT NOT NULL REFERENCES hospital(hospital_id),
+            blood_type blood_group NOT NULL,
+            units_requested INT NOT NULL CHECK (units_requested > 0),
+            units_fulfilled INT DEFAULT 0,
+            urgency_level urgency_level_t DEFAULT 'Routine',
+            patient_name VARCHAR(100),
+            patient_age INT,
+            patient_gender VARCHAR(10),
+            diagnosis_reason TEXT,
+            doctor_name VARCHAR(100),
+            doctor_contact_number VARCHAR(20),
+            required_by_date DATE,
+            request_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            request_status request_status_t DEFAULT 'pending',
+            approved_by VARCHAR(100),
+            approved_date TIMESTAMP,
+            fulfilled_date TIMESTAMP,
+            rejection_reason TEXT,
+            notes TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE TABLE blood_inventory (
+            bag_id SERIAL PRIMARY KEY,
+            bag_number VARCHAR(50) UNIQUE NOT NULL,
+            donation_id INT REFERENCES blood_donation(donation_id) ON DELETE CASCADE,
+            donor_id INT REFERENCES donor(donor_id) ON DELETE CASCADE,
+            blood_type blood_group NOT NULL,
+            collection_date DATE NOT NULL,
+            expiry_date DATE NOT NULL,
+            volume_ml INT NOT NULL,
+            component_type VARCHAR(50) DEFAULT 'Whole Blood',
+            storage_location VARCHAR(100),
+            testing_status testing_status_t DEFAULT 'pending',
+            status inventory_status_t DEFAULT 'available',
+            assigned_to_request INT REFERENCES recipient_request(request_id),
+            quality_check_date DATE,
+            notes TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE TABLE transaction_log (
+            transaction_id SERIAL PRIMARY KEY,
+            request_id INT REFERENCES recipient_request(request_id),
+            bag_id INT REFERENCES blood_inventory(bag_id),
+            units_ml INT,
+            transaction_type transaction_type_t NOT NULL,
+            issued_by VARCHAR(100),
+            issue_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            remarks TEXT
+        );
+
+        CREATE TABLE users (
+            user_id SERIAL PRIMARY KEY,
+            username VARCHAR(50) UNIQUE NOT NULL,
+            email VARCHAR(100) UNIQUE NOT NULL,
+            password_hash VARCHAR(255) NOT NULL,
+            full_name VARCHAR(100),
+            role user_role_t NOT NULL,
+            donor_id INT REFERENCES donor(donor_id),
+            hospital_id INT REFERENCES hospital(hospital_id),
+            is_active BOOLEAN DEFAULT TRUE,
+            last_login TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE TABLE audit_log (
+            log_id SERIAL PRIMARY KEY,
+            table_name VARCHAR(50) NOT NULL,
+            record_id INT,
+            action VARCHAR(20) NOT NULL,
+            old_values JSONB,
+            new_values JSONB,
+            changed_by VARCHAR(100),
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE FUNCTION set_updated_at() RETURNS trigger AS $fn$
+        BEGIN
+            NEW.updated_at := CURRENT_TIMESTAMP;
+            RETURN NEW;
+        END;
+        $fn$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER donor_updated_at BEFORE UPDATE ON donor
+            FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+        CREATE TRIGGER hospital_updated_at BEFORE UPDATE ON hospital
+            FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+        CREATE TRIGGER recipient_request_updated_at BEFORE UPDATE ON recipient_request
+            FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+        CREATE TRIGGER blood_inventory_updated_at BEFORE UPDATE ON blood_inventory
+            FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+        CREATE FUNCTION update_donor_stats() RETURNS trigger AS $fn$
+        BEGIN
+            UPDATE donor
+            SET total_donations = COALESCE(total_donations, 0) + 1,
+                last_donation_date = GREATEST(last_donation_date, NEW.donation_date)
+            WHERE donor_id = NEW.donor_id;
+            RETURN NEW;
+        END;
+        $fn$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER blood_donation_donor_stats AFTER INSERT ON blood_donation
+            FOR EACH ROW EXECUTE FUNCTION update_donor_stats();
+
+        CREATE FUNCTION expire_inventory() RETURNS trigger AS $fn$
+        BEGIN
+            IF NEW.status = 'available' AND NEW.expiry_date < CURRENT_DATE THEN
+                NEW.status := 'expired';
+            END IF;
+            RETURN NEW;
+        END;
+        $fn$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER blood_inventory_expire BEFORE INSERT OR UPDATE ON blood_inventory
+            FOR EACH ROW EXECUTE FUNCTION expire_inventory();
+    END
+    $baseline$
+    """,
+]
@@ -0,0 +1,80 @@
+"""
+Indexes for the routes' filter and sort paths
+
+List endpoints page on (sort column, primary key), so each filter gets a
+composite index ending in that pair and a filtered page is a single index
+range scan. Built CONCURRENTLY so the migration can run against a live
+database without blocking writes.
+"""
+
+# CREATE INDEX CONCURRENTLY cannot run inside a transaction block.
+TRANSACTIONAL = False
+
+STATEMENTS = [
+    # donor list: ORDER BY created_at DESC, donor_id DESC with optional filters
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_donor_created "
+    "ON donor (created_at DESC, donor_id DESC)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_donor_blood_type_created "
+    "ON donor (blood_type, created_at DESC, donor_id DESC)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_donor_status_created "
+    "ON donor (status, created_at DESC, donor_id DESC)",
+
+    # blood_inventory list (ORDER BY expiry_date, bag_id), expiring window,
+    # exports by collection date and the donor/donation foreign keys
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_inventory_expiry "
+    "ON blood_inventory (expiry_date, bag_id)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_inventory_blood_type_expiry "
+    "ON blood_inventory (blood_type, expiry_date, bag_id)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_inventory_status_expiry "
+    "ON blood_inventory (status, expiry_date, bag_id)",
+    # Available stock by type, soonest expiry first (the allocation path).
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_inventory_available_type_expiry "
+    "ON blood_inventory (blood_type, expiry_date, bag_id) WHERE status = 'available'",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_inventory_collection "
+    "ON blood_inventory (collection_date DESC)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_inventory_donation "
+    "ON blood_inventory (donation_id)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_inventory_donor "
+    "ON blood_inventory (donor_id)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_inventory_assigned_request "
+    "ON blood_inventory (assigned_to_request) WHERE assigned_to_request IS NOT NULL",
+
+    # recipient_request list/hospital pages (ORDER BY request_date DESC,
+    # request_id DESC), date-window reports and recent activity
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_request_date "
+    "ON recipient_request (request_date DESC, request_id DESC)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_request_status_date "
+    "ON recipient_request (request_status, request_date DESC, request_id DESC)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_request_hospital_date "
+    "ON recipient_request (hospital_id, request_date DESC, request_id DESC)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_request_pending "
+    "ON recipient_request (request_date DESC, request_id DESC) WHERE request_status = 'pending'",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_request_created "
+    "ON recipient_request (created_at DESC)",
+
+    # transaction_log list (ORDER BY issue_date DESC, transaction_id DESC)
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_transaction_issue_date "
+    "ON transaction_log (issue_date DESC, transaction_id DESC)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_transaction_request_issue_date "
+    "ON transaction_log (request_id, issue_date DESC, transaction_id DESC)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_transaction_bag "
+    "ON transaction_log (bag_id)",
+
+    # blood_donation list (ORDER BY donation_date DESC, donation_id DESC),
+    # per-donor history, date-window reports and recent activity
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_donation_date "
+    "ON blood_donation (donation_date DESC, donation_id DESC)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_donation_donor_date "
+    "ON blood_donation (donor_id, donation_date DESC, donation_id DESC)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_donation_created "
+    "ON blood_donation (created_at DESC)",
+
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_hospital_name ON hospital (name)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_created ON users (created_at DESC)",
+
+    "ANALYZE donor",
+    "ANALYZE blood_inventory",
+    "ANALYZE recipient_request",
+    "ANALYZE transaction_log",
+    "ANALYZE blood_donation",
+]
@@ -0,0 +1,28 @@
+"""
+Full-text donor search: donor_search_vector() and a GIN index over it
+
+Names carry weight A, email and phone digits weight B. Emails are indexed
+whole and split at '@' and '.', so "r@x" finds "r@x.com". Phone numbers are
+indexed as bare digits plus their last ten digits, so "+91 98765-43210",
+"9876543210" and "98765" all find the same donor. Uses the built-in
+'simple' configuration (no stemming, no extension needed).
+"""
+
+TRANSACTIONAL = False
+
+STATEMENTS = [
+    r"""
+    CREATE OR REPLACE FUNCTION donor_search_vector(
+        first_name TEXT, last_name TEXT, email TEXT, phone TEXT
+    ) RETURNS tsvector AS $$
+        SELECT setweight(to_tsvector('simple', coalesce(first_name, '') || ' ' || coalesce(last_name, '')), 'A')
+            || setweight(to_tsvector('simple', coalesce(email, '') || ' ' || translate(coalesce(email, ''), '@.', '  ')), 'B')
+            || setweight(to_tsvector('simple',
+                   regexp_replace(coalesce(phone, ''), '\D', '', 'g') || ' '
+                   || right(regexp_replace(coalesce(phone, ''), '\D', '', 'g'), 10)), 'B')
+    $$ LANGUAGE SQL IMMUTABLE PARALLEL SAFE
+    """,
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_donor_search "
+    "ON donor USING GIN (donor_search_vector(first_name, last_name, email, phone))",
+    "ANALYZE donor",
+]
@@ -0,0 +1,17 @@
+"""
+Partial index serving the allocation queue (open requests by urgency)
+
+Batch allocators take the most urgent, soonest needed open request with
+FOR UPDATE SKIP LOCKED; with this index each pick is an ordered index scan
+that stops at the first unlocked row instead of sorting every open request.
+Bags are claimed through idx_inventory_status_expiry from 0002.
+"""
+
+TRANSACTIONAL = False
+
+STATEMENTS = [
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_request_allocation_queue "
+    "ON recipient_request (urgency_level DESC, required_by_date, request_date, request_id) "
+    "WHERE request_status IN ('pending', 'approved')",
+    "ANALYZE recipient_request",
+]
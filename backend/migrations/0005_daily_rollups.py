@@ -0,0 +1,155 @@
+"""
+Daily rollups of donations and requests, kept current from a change queue
+
+donation_daily holds one row per day and blood type, request_daily one row
+per day, blood type and status with the request count and units, and
+request_hospital_daily one row per day and hospital. Requests are split over
+two tables because hospitals multiply the row count: a single day x type x
+hospital x status table holds about one row per request on a busy network.
+Statement-level triggers on blood_donation and recipient_request queue the
+days a write touched in rollup_change; rollups.py folds the queue into the
+rollups by recomputing just those days. rollup_state records the watermark
+(highest change folded in) and when that happened.
+"""
+
+STATEMENTS = [
+    """
+    CREATE TABLE donation_daily (
+        day DATE NOT NULL,
+        blood_type blood_group NOT NULL,
+        donations INT NOT NULL,
+        PRIMARY KEY (day, blood_type)
+    )
+    """,
+    # request_status may be NULL, so no primary key; refreshes replace whole
+    # days, which keeps (day, blood_type, request_status) unique.
+    """
+    CREATE TABLE request_daily (
+        day DATE NOT NULL,
+        blood_type blood_group NOT NULL,
+        request_status request_status_t,
+        requests INT NOT NULL,
+        units_requested BIGINT NOT NULL
+    )
+    """,
+    "CREATE INDEX idx_request_daily_day ON request_daily (day)",
+    """
+    CREATE TABLE request_hospital_daily (
+        day DATE NOT NULL,
+        hospital_id INT NOT NULL,
+        requests INT NOT NULL,
+        PRIMARY KEY (day, hospital_id)
+    )
+    """,
+    """
+    CREATE TABLE rollup_change (
+        change_id BIGSERIAL PRIMARY KEY,
+        source VARCHAR(20) NOT NULL,
+        day DATE NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE rollup_state (
+        name VARCHAR(50) PRIMARY KEY,
+        watermark BIGINT NOT NULL DEFAULT 0,
+        refreshed_at TIMESTAMP
+    )
+    """,
+    """
+    CREATE FUNCTION queue_donation_rollup() RETURNS trigger AS $fn$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO rollup_change (source, day)
+            SELECT DISTINCT 'donation', donation_date FROM new_rows;
+        ELSIF TG_OP = 'DELETE' THEN
+            INSERT INTO rollup_change (source, day)
+            SELECT DISTINCT 'donation', donation_date FROM old_rows;
+        ELSE
+            INSERT INTO rollup_change (source, day)
+            SELECT DISTINCT 'donation', v.day
+            FROM old_rows o JOIN new_rows n ON n.donation_id = o.donation_id,
+                 LATERAL (VALUES (o.donation_date), (n.donation_date)) v(day)
+            WHERE (o.donation_date, o.blood_type) IS DISTINCT FROM (n.donation_date, n.blood_type);
+        END IF;
+        RETURN NULL;
+    END;
+    $fn$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE FUNCTION queue_request_rollup() RETURNS trigger AS $fn$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO rollup_change (source, day)
+            SELECT DISTINCT 'request', request_date::date FROM new_rows
+            WHERE request_date IS NOT NULL;
+        ELSIF TG_OP = 'DELETE' THEN
+            INSERT INTO rollup_change (source, day)
+            SELECT DISTINCT 'request', request_date::date FROM old_rows
+            WHERE request_date IS NOT NULL;
+        ELSE
+            INSERT INTO rollup_change (source, day)
+            SELECT DISTINCT 'request', v.day
+            FROM old_rows o JOIN new_rows n ON n.request_id = o.request_id,
+                 LATERAL (VALUES (o.request_date::date), (n.request_date::date)) v(day)
+            WHERE v.day IS NOT NULL
+              AND (o.request_date, o.blood_type, o.hospital_id, o.request_status, o.units_requested)
+                  IS DISTINCT FROM
+                  (n.request_date, n.blood_type, n.hospital_id, n.request_status, n.units_requested);
+        END IF;
+        RETURN NULL;
+    END;
+    $fn$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER blood_donation_rollup_insert AFTER INSERT ON blood_donation
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION queue_donation_rollup()
+    """,
+    """
+    CREATE TRIGGER blood_donation_rollup_update AFTER UPDATE ON blood_donation
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION queue_donation_rollup()
+    """,
+    """
+    CREATE TRIGGER blood_donation_rollup_delete AFTER DELETE ON blood_donation
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION queue_donation_rollup()
+    """,
+    """
+    CREATE TRIGGER recipient_request_rollup_insert AFTER INSERT ON recipient_request
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION queue_request_rollup()
+    """,
+    """
+    CREATE TRIGGER recipient_request_rollup_update AFTER UPDATE ON recipient_request
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION queue_request_rollup()
+    """,
+    """
+    CREATE TRIGGER recipient_request_rollup_delete AFTER DELETE ON recipient_request
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION queue_request_rollup()
+    """,
+    # Initial build; later changes arrive through the queue.
+    """
+    INSERT INTO donation_daily (day, blood_type, donations)
+    SELECT donation_date, blood_type, COUNT(*)
+    FROM blood_donation
+    GROUP BY donation_date, blood_type
+    """,
+    """
+    INSERT INTO request_daily (day, blood_type, request_status, requests, units_requested)
+    SELECT request_date::date, blood_type, request_status, COUNT(*), SUM(units_requested)
+    FROM recipient_request
+    WHERE request_date IS NOT NULL
+    GROUP BY request_date::date, blood_type, request_status
+    """,
+    """
+    INSERT INTO request_hospital_daily (day, hospital_id, requests)
+    SELECT request_date::date, hospital_id, COUNT(*)
+    FROM recipient_request
+    WHERE request_date IS NOT NULL
+    GROUP BY request_date::date, hospital_id
+    """,
+    "INSERT INTO rollup_state (name, refreshed_at) VALUES ('daily', CURRENT_TIMESTAMP)",
+]
@@ -0,0 +1,41 @@
+"""
+Background report jobs and their stored results
+
+report_job is both the queue and the result store, so any API process can
+take a job, and any process can answer a status poll or a download. Workers
+claim queued rows with FOR UPDATE SKIP LOCKED and heartbeat while they run;
+a running job whose heartbeat stops is claimed again, and attempts tells the
+old and new run apart. The partial unique index on job_key allows one queued
+or running job per report and parameter set, which is what deduplicates
+identical submissions. Finished rows carry the result until expires_at.
+"""
+
+STATEMENTS = [
+    """
+    CREATE TABLE report_job (
+        job_id VARCHAR(32) PRIMARY KEY,
+        job_key TEXT NOT NULL,
+        report VARCHAR(50) NOT NULL,
+        path VARCHAR(200) NOT NULL,
+        params JSONB NOT NULL DEFAULT '{}',
+        status VARCHAR(20) NOT NULL DEFAULT 'queued'
+            CHECK (status IN ('queued', 'running', 'done', 'failed')),
+        attempts INT NOT NULL DEFAULT 0,
+        bytes_done BIGINT NOT NULL DEFAULT 0,
+        error TEXT,
+        result BYTEA,
+        mimetype VARCHAR(100),
+        filename VARCHAR(200),
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        started_at TIMESTAMP,
+        heartbeat_at TIMESTAMP,
+        finished_at TIMESTAMP,
+        expires_at TIMESTAMP
+    )
+    """,
+    "CREATE UNIQUE INDEX idx_report_job_inflight ON report_job (job_key) "
+    "WHERE status IN ('queued', 'running')",
+    "CREATE INDEX idx_report_job_queue ON report_job (created_at) "
+    "WHERE status IN ('queued', 'running')",
+    "CREATE INDEX idx_report_job_expires ON report_job (expires_at)",
+]
@@ -0,0 +1,24 @@
+"""
+Per-table change watermarks for conditional GETs
+
+table_watermark holds one row per table the API writes: version goes up by
+one, and changed_at moves to the commit time, in the same transaction as
+every write (watermarks.py bumps it just before the request commits). GET
+responses derive their ETag from the versions of the tables they read, so a
+client's cached copy stays valid until one of them is written.
+"""
+
+STATEMENTS = [
+    """
+    CREATE TABLE table_watermark (
+        table_name VARCHAR(63) PRIMARY KEY,
+        version BIGINT NOT NULL DEFAULT 0,
+        changed_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    INSERT INTO table_watermark (table_name)
+    VALUES ('donor'), ('hospital'), ('blood_donation'), ('blood_inventory'),
+           ('recipient_request'), ('transaction_log'), ('users')
+    """,
+]
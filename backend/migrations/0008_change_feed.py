@@ -0,0 +1,82 @@
+"""
+Change feed: NOTIFY on every write to the tables the API caches
+
+Statement-level triggers publish one notification per statement on the
+change_feed channel, delivered when the writing transaction commits (and
+never if it rolls back). The payload is compact JSON:
+
+    {"t": "donor", "op": "update", "n": 3, "ids": [17, 18, 40], "ts": 1760000000.123}
+
+ids holds the primary keys of up to 100 affected rows and is null for
+larger statements and TRUNCATE; ts is the trigger's clock time, used to
+measure delivery lag. Writes made by other triggers (the donor statistics
+kept by update_donor_stats, one UPDATE per donation) send just
+{"t": "donor", "op": "update", "nested": true}, which PostgreSQL folds into
+a single notification per transaction. change_feed.py listens in every
+worker process.
+"""
+
+FEED_TABLES = {
+    'donor': 'donor_id',
+    'hospital': 'hospital_id',
+    'blood_donation': 'donation_id',
+    'blood_inventory': 'bag_id',
+    'recipient_request': 'request_id',
+    'transaction_log': 'transaction_id',
+}
+
+TRANSITION_TABLES = {
+    'insert': 'REFERENCING NEW TABLE AS new_rows',
+    'update': 'REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows',
+    'delete': 'REFERENCING OLD TABLE AS old_rows',
+}
+
+STATEMENTS = [
+    """
+    CREATE FUNCTION notify_change() RETURNS trigger AS $fn$
+    DECLARE
+        affected BIGINT;
+        ids BIGINT[];
+    BEGIN
+        IF pg_trigger_depth() > 1 THEN
+            PERFORM pg_notify('change_feed', json_build_object(
+                't', TG_TABLE_NAME, 'op', lower(TG_OP), 'nested', true)::text);
+            RETURN NULL;
+        END IF;
+        IF TG_OP <> 'TRUNCATE' THEN
+            -- TG_ARGV[0] is the primary key column; the transition tables
+            -- are only reachable through dynamic SQL here.
+            EXECUTE format(
+                'SELECT (SELECT count(*) FROM %1$I), ARRAY(SELECT %2$I FROM %1$I LIMIT 101)',
+                CASE TG_OP WHEN 'DELETE' THEN 'old_rows' ELSE 'new_rows' END, TG_ARGV[0]
+            ) INTO affected, ids;
+            IF affected = 0 THEN
+                RETURN NULL;
+            END IF;
+        END IF;
+        PERFORM pg_notify('change_feed', json_build_object(
+            't', TG_TABLE_NAME,
+            'op', lower(TG_OP),
+            'n', affected,
+            'ids', CASE WHEN affected <= 100 THEN ids END,
+            'ts', extract(epoch FROM clock_timestamp())
+        )::text);
+        RETURN NULL;
+    END;
+    $fn$ LANGUAGE plpgsql
+    """,
+] + [
+    f"""
+    CREATE TRIGGER {table}_change_feed_{op} AFTER {op.upper()} ON {table}
+        {referencing}
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_change('{key}')
+    """
+    for table, key in FEED_TABLES.items()
+    for op, referencing in TRANSITION_TABLES.items()
+] + [
+    f"""
+    CREATE TRIGGER {table}_change_feed_truncate AFTER TRUNCATE ON {table}
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_change('{key}')
+    """
+    for table, key in FEED_TABLES.items()
+]
@@ -0,0 +1,22 @@
+"""
+NOT NULL on the timestamp columns list endpoints page by
+
+Keyset paging compares (sort column, id) row values against the cursor, and
+a NULL sort column compares as unknown: such rows would never appear after
+the first page and a NULL in a cursor would end paging early. donor.created_at,
+recipient_request.request_date and transaction_log.issue_date always get
+their CURRENT_TIMESTAMP default from the API, so rows that still hold NULL
+(written outside it) are backfilled from the closest timestamp available.
+"""
+
+STATEMENTS = [
+    "UPDATE donor SET created_at = COALESCE(updated_at, CURRENT_TIMESTAMP) WHERE created_at IS NULL",
+    "ALTER TABLE donor ALTER COLUMN created_at SET NOT NULL",
+    """
+    UPDATE recipient_request SET request_date = COALESCE(created_at, CURRENT_TIMESTAMP)
+    WHERE request_date IS NULL
+    """,
+    "ALTER TABLE recipient_request ALTER COLUMN request_date SET NOT NULL",
+    "UPDATE transaction_log SET issue_date = CURRENT_TIMESTAMP WHERE issue_date IS NULL",
+    "ALTER TABLE transaction_log ALTER COLUMN issue_date SET NOT NULL",
+]
@@ -0,0 +1,122 @@
+import base64
+import json
+import os
+
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', '1000'))
+
+
+class PaginationError(ValueError):
+    """Raised for malformed limit, cursor or fields arguments"""
+
+
+def encode_cursor(values):
+    """Encode the sort-key values of the last row of a page as an opaque token"""
+    payload = [v.isoformat() if hasattr(v, 'isoformat') else v for v in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, size):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise PaginationError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise PaginationError('Invalid cursor')
+    return values
+
+
+class KeysetPage:
+    """
+    Keyset (cursor) pagination and field projection for a list query
+
+    Args:
+        args: request.args
+        columns: Ordered mapping of output field name -> SQL select expression
+            (aliased where the expression does not already yield that name)
+        order_by: List of (SQL expression, output field) pairs forming a unique
+            sort key, most significant first
+        descending: Sort direction shared by every key column
+    """
+
+    def __init__(self, args, columns, order_by, descending=True):
+        self.columns = columns
+        self.order_by = order_by
+        self.descending = descending
+        # Streamed responses (stream=1) are unbounded and keep every key column.
+        self.streaming = args.get('stream') == '1'
+
+        cursor = args.get('cursor')
+        self.cursor = decode_cursor(cursor, len(order_by)) if cursor else None
+
+        # Paging is opt-in: without limit= or cursor= the whole list is
+        # returned, as it was before paging existed.
+        self.limit = None
+        if 'limit' in args or self.cursor is not None:
+            try:
+                limit = int(args.get('limit', MAX_PAGE_SIZE))
+            except ValueError:
+                raise PaginationError('limit must be an integer')
+            if limit < 1:
+                raise PaginationError('limit must be positive')
+            self.limit = min(limit, MAX_PAGE_SIZE)
+        self.paged = self.limit is not None and not self.streaming
+
+        fields = args.get('fields')
+        if fields:
+            self.fields = [f.strip() for f in fields.split(',') if f.strip()]
+            unknown = [f for f in self.fields if f not in columns]
+            if unknown:
+                raise PaginationError(f"Unknown field(s): {', '.join(unknown)}")
+        else:
+            self.fields = list(columns)
+
+        # While paging the sort keys are selected so the next cursor can be built,
+        # and removed again from the rows if they were not asked for.
+        self._hidden = [
+            key for _, key in order_by
+            if key not in self.fields and self.paged
+        ]
+
+    def select_list(self):
+        """Comma-separated select expressions for the projected fields"""
+        return ', '.join(self.columns[name] for name in self.fields + self._hidden)
+
+    def where(self):
+        """SQL fragment and params restricting rows to those after the cursor"""
+        if self.cursor is None:
+            return '', []
+        keys = ', '.join(expr for expr, _ in self.order_by)
+        marks = ', '.join(['%s'] * len(self.order_by))
+        op = '<' if self.descending else '>'
+        return f" AND ({keys}) {op} ({marks})", list(self.cursor)
+
+    def order_limit(self):
+        """ORDER BY on the sort key plus the page LIMIT (omitted when not paging)"""
+        direction = ' DESC' if self.descending else ''
+        clause = ' ORDER BY ' + ', '.join(expr + direction for expr, _ in self.order_by)
+        if self.paged:
+            # One extra row tells us whether another page exists.
+            clause += f' LIMIT {self.limit + 1}'
+        return clause
+
+    def finish(self, rows):
+        """Trim the look-ahead row and return (rows, next_cursor)"""
+        next_cursor = None
+        if self.paged and len(rows) > self.limit:
+            rows = rows[:self.limit]
+            last = rows[-1]
+            next_cursor = encode_cursor([last[key] for _, key in self.order_by])
+        if self._hidden:
+            for row in rows:
+                for key in self._hidden:
+                    row.pop(key, None)
+        return rows, next_cursor
+
+
+def with_next_cursor(response, next_cursor):
+    """Attach the next page's cursor to a list response"""
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
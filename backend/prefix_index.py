@@ -0,0 +1,173 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+
+class _KeyView:
+    """Sequence view over the packed keys so bisect can search them in place"""
+
+    __slots__ = ('blob', 'offsets')
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.blob[self.offsets[i]:self.offsets[i + 1]]
+
+
+class PrefixIndex:
+    """
+    Compact in-memory prefix index mapping string keys to integer ids
+
+    All keys are packed into one UTF-8 bytes object with an offsets array, so
+    a million-row table costs a few tens of megabytes instead of millions of
+    Python objects. Writes land in a small overlay that lookups consult and
+    the next rebuild folds in; rebuilds run in a background thread while the
+    old snapshot keeps serving.
+
+    Args:
+        loader: Callable returning an iterable of (key, id) pairs sorted by
+            key in code point order (COLLATE "C")
+        refresh_interval: Seconds after which the snapshot is rebuilt
+        max_overlay: Overlay size that triggers an early rebuild
+    """
+
+    def __init__(self, loader, refresh_interval=300.0, max_overlay=1000):
+        self.loader = loader
+        self.refresh_interval = refresh_interval
+        self.max_overlay = max_overlay
+
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._keys = None
+        self._ids = array('I')
+        self._built_at = 0.0
+        self._build_seconds = 0.0
+        self._stale = False
+        self._rebuilding = False
+        self._overlay = {}   # id -> (keys or None when deleted, sequence number)
+        self._seq = 0
+
+    def _build(self):
+        started = time.monotonic()
+        with self._lock:
+            seq = self._seq
+
+        blob = bytearray()
+        offsets = array('I', [0])
+        ids = array('I')
+        for key, item_id in self.loader():
+            blob += key.encode('utf-8')
+            offsets.append(len(blob))
+            ids.append(item_id)
+
+        with self._lock:
+            self._keys = _KeyView(bytes(blob), offsets)
+            self._ids = ids
+            self._built_at = time.monotonic()
+            self._build_seconds = self._built_at - started
+            self._stale = False
+            # Writes committed before the load started are in the snapshot.
+            self._overlay = {k: v for k, v in self._overlay.items() if v[1] > seq}
+
+    def _rebuild_in_background(self):
+        try:
+            with self._build_lock:
+                self._build()
+        finally:
+            with self._lock:
+                self._rebuilding = False
+
+    def _maybe_refresh(self):
+        if self._keys is None:
+            with self._build_lock:
+                if self._keys is None:
+                    self._build()
+            return
+
+        with self._lock:
+            due = (
+                self._stale
+                or len(self._overlay) > self.max_overlay
+                or time.monotonic() - self._built_at > self.refresh_interval
+            )
+            if not due or self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._rebuild_in_background, daemon=True).start()
+
+    def search(self, prefix, limit=10):
+        """Ids whose keys start with prefix, in key order, without duplicates"""
+        if not prefix or limit < 1:
+            return []
+        self._maybe_refresh()
+        needle = prefix.encode('utf-8')
+
+        with self._lock:
+            keys, ids, overlay = self._keys, self._ids, dict(self._overlay)
+
+        matches = []
+        seen = set()
+        i = bisect_left(keys, needle)
+        while i < len(keys) and len(seen) < limit:
+            key = keys[i]
+            if not key.startswith(needle):
+                break
+            item_id = ids[i]
+            if item_id not in seen and item_id not in overlay:
+                seen.add(item_id)
+                matches.append((key, item_id))
+            i += 1
+
+        for item_id, (item_keys, _) in overlay.items():
+            if item_keys is None:
+                continue
+            hits = [k for k in item_keys if k.startswith(needle)]
+            if hits:
+                matches.append((min(hits), item_id))
+
+        matches.sort()
+        result = []
+        seen = set()
+        for _, item_id in matches:
+            if item_id not in seen:
+                seen.add(item_id)
+                result.append(item_id)
+                if len(result) == limit:
+                    break
+        return result
+
+    def upsert(self, item_id, keys):
+        """Index item_id under keys, replacing whatever it had before"""
+        encoded = sorted(k.encode('utf-8') for k in keys if k)
+        with self._lock:
+            self._seq += 1
+            self._overlay[item_id] = (encoded, self._seq)
+
+    def remove(self, item_id):
+        with self._lock:
+            self._seq += 1
+            self._overlay[item_id] = (None, self._seq)
+
+    def invalidate(self):
+        """Rebuild from the loader on next use (e.g. after bulk changes)"""
+        with self._lock:
+            self._stale = True
+
+    def stats(self):
+        with self._lock:
+            keys = self._keys
+            return {
+                'loaded': keys is not None,
+                'keys': len(keys) if keys is not None else 0,
+                'bytes': (len(keys.blob) + keys.offsets.itemsize * len(keys.offsets)
+                          + self._ids.itemsize * len(self._ids)) if keys is not None else 0,
+                'overlay': len(self._overlay),
+                'age_seconds': round(time.monotonic() - self._built_at, 1) if keys is not None else None,
+                'build_seconds': round(self._build_seconds, 3),
+            }
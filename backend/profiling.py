@@ -0,0 +1,313 @@
+"""
+Opt-in request profiling
+
+With PROFILING_ENABLED=1 every response carries a Server-Timing header
+splitting the request into phases:
+
+    db-connect  waiting for a pooled connection (and setting up its session)
+    sql         executing statements, desc = statement count
+    rows        fetching rows and building the row dicts
+    json        encoding the response body
+    commit      committing the request's transaction
+    app         everything else (view code, hooks)
+    total       the whole request, as the server saw it
+
+A single request can also be profiled by sending `X-Profile: cprofile` (or
+`sample`), or adding `?_profile=cprofile`. cProfile traces every call of
+the request thread and costs several times the request's own time; the
+sampling profiler looks at the thread's stack every PROFILE_SAMPLE_MS and
+barely slows it down. The response carries X-Profile-Id; the report is
+kept in memory (last PROFILE_KEEP, per worker) and served by
+GET /admin/profiles/<id>. When PROFILE_TOKEN is set, profiling a request and
+reading profiles both need the X-Profile-Token header.
+
+When disabled no hooks are installed and the database layer only checks
+request_profiler.enabled.
+"""
+import cProfile
+import hmac
+import io
+import itertools
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+from flask import g, has_request_context, request
+
+from json_provider import FastJSONProvider
+
+PROFILE_KINDS = ('cprofile', 'sample')
+
+# Server-Timing order; app and total are added when the response is sent.
+PHASES = ('db-connect', 'sql', 'rows', 'json', 'commit')
+
+
+def record_phase(name, seconds):
+    """Add seconds to a phase of the current request (no-op outside a profiled app)"""
+    if not has_request_context():
+        return
+    timings = g.get('_timings')
+    if timings is not None:
+        phase = timings.get(name)
+        if phase is None:
+            timings[name] = [seconds, 1]
+        else:
+            phase[0] += seconds
+            phase[1] += 1
+
+
+def server_timing(timings, total):
+    """Format phase timings (name -> [seconds, count]) as a Server-Timing value"""
+    parts = []
+    measured = 0.0
+    for name in PHASES:
+        if name in timings:
+            seconds, count = timings[name]
+            measured += seconds
+            desc = f';desc="statements: {count}"' if name == 'sql' else ''
+            parts.append(f'{name};dur={seconds * 1000:.2f}{desc}')
+    parts.append(f'app;dur={max(total - measured, 0) * 1000:.2f}')
+    parts.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(parts)
+
+
+class TimedJSONProvider(FastJSONProvider):
+    """FastJSONProvider that records its encoding time as the json phase"""
+
+    def dumps(self, obj, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            record_phase('json', time.perf_counter() - started)
+
+
+class StackSampler:
+    """
+    Samples one thread's Python stack at a fixed interval from a helper thread
+
+    Stacks are counted in collapsed form (outermost frame first, ';'-joined),
+    the input format of flame graph tools.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def report(self, limit=40):
+        """Functions by share of samples on top of the stack (own) and anywhere in it (total)"""
+        own, anywhere = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = [frame.rsplit(':', 1)[0] for frame in stack.split(';')]
+            own[frames[-1]] += count
+            for frame in set(frames):
+                anywhere[frame] += count
+        total = self.samples or 1
+        lines = [f'{self.samples} samples every {self.interval * 1000:g} ms', '',
+                 f"{'own%':>6} {'total%':>7}  function"]
+        for frame, count in own.most_common(limit):
+            lines.append(f'{100 * count / total:>6.1f} {100 * anywhere[frame] / total:>7.1f}  {frame}')
+        return '\n'.join(lines) + '\n'
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class RequestProfiler:
+    """
+    Server-Timing phases for every request and on-demand per-request profiles
+
+    Args:
+        enabled: Install the request hooks at all
+        keep: Profiles kept in memory for /admin/profiles
+        token: Secret required in X-Profile-Token to profile or read profiles (optional)
+        sample_interval: Seconds between stack samples of the sampling profiler
+    """
+
+    def __init__(self, enabled=False, keep=50, token=None, sample_interval=0.005):
+        self.enabled = enabled
+        self.token = token or None
+        self.sample_interval = sample_interval
+
+        self._lock = threading.Lock()
+        self._profiles = deque(maxlen=keep)
+        self._ids = itertools.count(1)
+        # cProfile can only trace one request at a time (sys.monitoring allows
+        # a single profiler per process from Python 3.12 on).
+        self._cprofile_busy = threading.Lock()
+
+        self.captured = 0
+        self.skipped = 0
+
+    def authorized(self):
+        """Whether the current request may profile or read profiles"""
+        if self.token is None:
+            return True
+        return hmac.compare_digest(request.headers.get('X-Profile-Token', ''), self.token)
+
+    def requested_kind(self):
+        """Profiler asked for by the current request, or None"""
+        kind = request.headers.get('X-Profile') or request.args.get('_profile')
+        if not kind:
+            return None
+        kind = kind.lower()
+        if kind in ('1', 'true'):
+            kind = 'cprofile'
+        return kind if kind in PROFILE_KINDS else None
+
+    def start(self, kind):
+        """Start profiling the current thread; returns the profiler or None if busy"""
+        if kind == 'sample':
+            sampler = StackSampler(threading.get_ident(), self.sample_interval)
+            sampler.start()
+            return sampler
+        if not self._cprofile_busy.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:   # another profiling tool is active
+            self._cprofile_busy.release()
+            return None
+        return profile
+
+    def stop(self, profiler):
+        if isinstance(profiler, StackSampler):
+            profiler.stop()
+        else:
+            profiler.disable()
+            self._cprofile_busy.release()
+
+    def store(self, profiler, timings, total, status):
+        """Keep a finished profile; returns its id"""
+        if isinstance(profiler, StackSampler):
+            kind, text, raw = 'sample', profiler.report(), profiler.collapsed().encode('utf-8')
+        else:
+            stream = io.StringIO()
+            stats = pstats.Stats(profiler, stream=stream)
+            stats.sort_stats('cumulative').print_stats(40)
+            kind, text, raw = 'cprofile', stream.getvalue(), marshal.dumps(stats.stats)
+
+        entry = {
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'endpoint': request.endpoint or 'unmatched',
+            'status': status,
+            'kind': kind,
+            'duration_ms': round(total * 1000, 3),
+            'phases': {name: {'ms': round(seconds * 1000, 3), 'count': count}
+                       for name, (seconds, count) in timings.items()},
+            'at': time.time(),
+        }
+        with self._lock:
+            entry['id'] = str(next(self._ids))
+            self._profiles.append((entry, text, raw))
+            self.captured += 1
+        return entry['id']
+
+    def profiles(self):
+        """Summaries of the kept profiles, newest first"""
+        with self._lock:
+            return [entry for entry, _, _ in reversed(self._profiles)]
+
+    def get(self, profile_id):
+        """(summary, text report, raw data) of one profile, or None"""
+        with self._lock:
+            for entry, text, raw in self._profiles:
+                if entry['id'] == profile_id:
+                    return entry, text, raw
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._profiles.clear()
+
+    def stats(self):
+        with self._lock:
+            kept = len(self._profiles)
+        return {
+            'enabled': self.enabled,
+            'profiles_kept': kept,
+            'profiles_captured': self.captured,
+            'profiles_skipped': self.skipped,
+        }
+
+
+request_profiler = RequestProfiler(
+    enabled=os.getenv('PROFILING_ENABLED', '0') == '1',
+    keep=int(os.getenv('PROFILE_KEEP', '50')),
+    token=os.getenv('PROFILE_TOKEN'),
+    sample_interval=float(os.getenv('PROFILE_SAMPLE_MS', '5')) / 1000
+)
+
+
+def init_profiling(app):
+    """Add Server-Timing and on-demand profiling to every request (no hooks when disabled)"""
+    if not request_profiler.enabled:
+        return
+
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def start_profiling():
+        g._timings = {}
+        g._profile_started = time.perf_counter()
+        kind = request_profiler.requested_kind()
+        if kind and request_profiler.authorized():
+            g._profiler = request_profiler.start(kind)
+            if g._profiler is None:
+                request_profiler.skipped += 1
+                g._profile_busy = True
+
+    @app.after_request
+    def finish_profiling(response):
+        started = g.pop('_profile_started', None)
+        if started is None:
+            return response
+        profiler = g.pop('_profiler', None)
+        if profiler is not None:
+            request_profiler.stop(profiler)
+        total = time.perf_counter() - started
+        timings = g.pop('_timings', {})
+        response.headers['Server-Timing'] = server_timing(timings, total)
+        if profiler is not None:
+            response.headers['X-Profile-Id'] = request_profiler.store(
+                profiler, timings, total, response.status_code)
+        elif g.pop('_profile_busy', False):
+            response.headers['X-Profile-Id'] = 'busy'
+        return response
+
+    @app.teardown_request
+    def stop_profiling(exception=None):
+        # after_request is skipped when a response could not be built.
+        profiler = g.pop('_profiler', None)
+        if profiler is not None:
+            request_profiler.stop(profiler)
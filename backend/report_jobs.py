@@ -0,0 +1,372 @@
+"""
+Background report jobs: submit now, poll for progress, download when done
+
+A job runs one registered report (the report functions of reports_bp,
+exports included) on a small pool of worker threads, outside any request, so
+a multi-year report or a full export neither holds a request worker nor hits
+a proxy timeout. A running job holds at most one pooled connection; its
+progress and heartbeats are written by one heartbeat thread per process on a
+connection of its own. The queue and the results live in report_job (migration
+0006): every process answers polls and downloads, and identical jobs that
+are still queued or running are merged into one. Results are kept for
+REPORT_JOB_TTL seconds.
+
+Workers start with the first request (REPORT_JOB_WORKERS=0 leaves them out
+of the API process), or run on their own with:
+
+    python report_jobs.py
+"""
+import io
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from urllib.parse import urlencode
+
+import psycopg2
+
+from db_utils import DB_CONFIG, get_db_cursor, get_separate_cursor, on_commit
+from metrics import render_gauges
+
+logger = logging.getLogger('blood_bank.report_jobs')
+
+INFLIGHT = "status IN ('queued', 'running')"
+
+# Takes the oldest queued job, or a running one whose worker stopped
+# heartbeating, and bumps attempts so a late finish of the old run is ignored.
+CLAIM_QUERY = f"""
+    UPDATE report_job j
+    SET status = 'running', attempts = j.attempts + 1, bytes_done = 0,
+        started_at = CURRENT_TIMESTAMP, heartbeat_at = CURRENT_TIMESTAMP
+    FROM (
+        SELECT job_id
+        FROM report_job
+        WHERE {INFLIGHT}
+            AND (status = 'queued' OR heartbeat_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 second')
+        ORDER BY created_at
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    ) next
+    WHERE j.job_id = next.job_id
+    RETURNING j.job_id, j.report, j.path, j.params, j.attempts
+"""
+
+STATUS_COLUMNS = """
+    job_id, report, params, status, attempts, bytes_done, error, mimetype, filename,
+    octet_length(result) as result_bytes, created_at, started_at, finished_at, expires_at
+"""
+
+
+class ReportQueueFull(Exception):
+    """Raised when REPORT_JOB_QUEUE_MAX jobs are already waiting"""
+
+
+def job_key(report, params):
+    """Identity of a job: the report and its parameters in a canonical order"""
+    return report + '?' + urlencode(sorted((k, str(v)) for k, v in params.items()))
+
+
+class ReportJobRunner:
+    """
+    Queue, worker pool and result store for report jobs
+
+    Args:
+        workers: Worker threads per process; at most this many jobs run here at once
+        queue_max: Queued jobs accepted before submit() raises ReportQueueFull
+        ttl: Seconds a finished job and its result are kept
+        max_bytes: Largest result stored; bigger ones fail the job
+        stale_after: Seconds without a heartbeat before a running job is retried
+        poll: Seconds an idle worker waits before looking for jobs queued elsewhere
+        progress_interval: Seconds between progress writes for running jobs
+    """
+
+    def __init__(self, workers=2, queue_max=100, ttl=3600.0, max_bytes=256 << 20,
+                 stale_after=120.0, poll=2.0, progress_interval=1.0):
+        self.workers = workers
+        self.queue_max = queue_max
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.stale_after = stale_after
+        self.poll = poll
+        self.progress_interval = progress_interval
+
+        self._lock = threading.Lock()
+        self._threads = []
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._reports = {}  # report name -> produce(params)
+        self._active = {}   # job_id -> [attempts, bytes done], for the heartbeat thread
+
+        self.submitted = 0
+        self.deduplicated = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+
+    def wake(self):
+        self._wake.set()
+
+    def register(self, report, produce):
+        """
+        Make report runnable as a job
+
+        produce(params) returns (chunks, mimetype, filename): an iterable of
+        bytes, which must release whatever it holds once exhausted or
+        closed, and how to serve the joined result.
+        """
+        self._reports[report] = produce
+
+    def submit(self, report, path, params):
+        """
+        Queue a job unless an identical one is queued or running
+
+        Returns (job_id, deduplicated). Uses the request's transaction; the
+        workers are woken once it commits.
+        """
+        key = job_key(report, params)
+        with get_db_cursor() as cursor:
+            for _ in range(3):
+                cursor.execute(f"SELECT job_id FROM report_job WHERE job_key = %s AND {INFLIGHT}",
+                               (key,))
+                existing = cursor.fetchone()
+                if existing:
+                    with self._lock:
+                        self.deduplicated += 1
+                    return existing['job_id'], True
+
+                cursor.execute("SELECT COUNT(*) as queued FROM report_job WHERE status = 'queued'")
+                if cursor.fetchone()['queued'] >= self.queue_max:
+                    with self._lock:
+                        self.rejected += 1
+                    raise ReportQueueFull(f'{self.queue_max} report jobs are already queued')
+
+                # A concurrent identical submit wins the unique index; loop to find it.
+                cursor.execute(f"""
+                    INSERT INTO report_job (job_id, job_key, report, path, params)
+                    VALUES (%s, %s, %s, %s, %s)
+                    ON CONFLICT (job_key) WHERE {INFLIGHT} DO NOTHING
+                    RETURNING job_id
+                """, (uuid.uuid4().hex, key, report, path, json.dumps(params)))
+                created = cursor.fetchone()
+                if created:
+                    on_commit(self.wake)
+                    with self._lock:
+                        self.submitted += 1
+                    return created['job_id'], False
+        raise RuntimeError('Could not queue the report job')
+
+    def status(self, job_id):
+        """The job without its result, or None if unknown or expired"""
+        with get_db_cursor() as cursor:
+            cursor.execute(f"""
+                SELECT {STATUS_COLUMNS}
+                FROM report_job
+                WHERE job_id = %s AND (expires_at IS NULL OR expires_at > CURRENT_TIMESTAMP)
+            """, (job_id,))
+            return cursor.fetchone()
+
+    def result(self, job_id):
+        """(status, error, result bytes, mimetype, filename), or None if unknown or expired"""
+        with get_db_cursor() as cursor:
+            cursor.execute("""
+                SELECT status, error, result, mimetype, filename
+                FROM report_job
+                WHERE job_id = %s AND (expires_at IS NULL OR expires_at > CURRENT_TIMESTAMP)
+            """, (job_id,))
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        result = bytes(row['result']) if row['result'] is not None else None
+        return row['status'], row['error'], result, row['mimetype'], row['filename']
+
+    def _claim(self):
+        with get_separate_cursor() as cursor:
+            cursor.execute(CLAIM_QUERY, (self.stale_after,))
+            return cursor.fetchone()
+
+    def _execute(self, job):
+        """Run the report and collect its output; returns (result, mimetype, filename)"""
+        produce = self._reports.get(job['report'])
+        if produce is None:
+            raise ValueError(f"Unknown report: {job['report']}")
+        chunks, mimetype, filename = produce(job['params'])
+        out = io.BytesIO()
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+                if out.tell() > self.max_bytes:
+                    raise ValueError(f'Result is larger than {self.max_bytes} bytes')
+                # Written to the database by the heartbeat thread.
+                with self._lock:
+                    self._active[job['job_id']][1] = out.tell()
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+        return out.getvalue(), mimetype, filename
+
+    def _finish(self, job, status, result=None, error=None, mimetype=None, filename=None):
+        with get_separate_cursor() as cursor:
+            cursor.execute("""
+                UPDATE report_job
+                SET status = %s, result = %s, error = %s, mimetype = %s, filename = %s,
+                    bytes_done = COALESCE(%s, bytes_done),
+                    finished_at = CURRENT_TIMESTAMP,
+                    expires_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second'
+                WHERE job_id = %s AND attempts = %s AND status = 'running'
+            """, (status, result, error, mimetype, filename,
+                  len(result) if result is not None else None, self.ttl,
+                  job['job_id'], job['attempts']))
+
+    def run_job(self, job):
+        """Run one claimed job and store its outcome"""
+        with self._lock:
+            self._active[job['job_id']] = [job['attempts'], 0]
+        try:
+            result, mimetype, filename = self._execute(job)
+            self._finish(job, 'done', result=result, mimetype=mimetype, filename=filename)
+            with self._lock:
+                self.completed += 1
+        except Exception as e:
+            logger.warning('Report job %s (%s) failed: %s', job['job_id'], job['report'], e)
+            self._finish(job, 'failed', error=str(e))
+            with self._lock:
+                self.failed += 1
+        finally:
+            with self._lock:
+                self._active.pop(job['job_id'], None)
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                job = self._claim()
+            except Exception:
+                logger.exception('Could not claim a report job')
+                job = None
+            if job is None:
+                self._wake.wait(self.poll)
+                self._wake.clear()
+                continue
+            try:
+                self.run_job(job)
+            except Exception:
+                logger.exception('Could not record the outcome of report job %s', job['job_id'])
+
+    def _connect(self):
+        conn = psycopg2.connect(**DB_CONFIG, application_name='blood_bank_report_jobs')
+        conn.autocommit = True
+        return conn
+
+    def _heartbeat(self):
+        """
+        Write running jobs' progress, keep them claimed and drop expired
+        results, all on one connection outside the pool
+        """
+        conn = None
+        written = {}    # job_id -> (attempts, bytes done) last written
+        last_beat = time.monotonic()
+        while not self._stop.wait(self.progress_interval):
+            with self._lock:
+                active = {job_id: tuple(state) for job_id, state in self._active.items()}
+            beat = time.monotonic() - last_beat >= self.stale_after / 4
+            try:
+                if conn is None:
+                    conn = self._connect()
+                with conn.cursor() as cursor:
+                    for job_id, (attempts, bytes_done) in active.items():
+                        if beat or written.get(job_id) != (attempts, bytes_done):
+                            cursor.execute("""
+                                UPDATE report_job
+                                SET bytes_done = %s, heartbeat_at = CURRENT_TIMESTAMP
+                                WHERE job_id = %s AND attempts = %s AND status = 'running'
+                            """, (bytes_done, job_id, attempts))
+                            written[job_id] = (attempts, bytes_done)
+                    if beat:
+                        cursor.execute("DELETE FROM report_job WHERE expires_at < CURRENT_TIMESTAMP")
+                        last_beat = time.monotonic()
+                written = {job_id: w for job_id, w in written.items() if job_id in active}
+            except Exception:
+                logger.exception('Report job heartbeat failed')
+                if conn is not None:
+                    conn.close()
+                conn = None
+        if conn is not None:
+            conn.close()
+
+    def start(self):
+        """Start the worker and heartbeat threads (no-op if running or workers <= 0)"""
+        with self._lock:
+            if self.workers <= 0 or any(t.is_alive() for t in self._threads):
+                return
+            self._stop.clear()
+            self._threads = [
+                threading.Thread(target=self._work, name=f'report-job-{i}', daemon=True)
+                for i in range(self.workers)
+            ] + [threading.Thread(target=self._heartbeat, name='report-job-heartbeat', daemon=True)]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'running': len(self._active),
+                'submitted': self.submitted,
+                'deduplicated': self.deduplicated,
+                'rejected': self.rejected,
+                'completed': self.completed,
+                'failed': self.failed,
+            }
+
+    def render(self):
+        stats = self.stats()
+        totals = ('submitted', 'deduplicated', 'rejected', 'completed', 'failed')
+        return (
+            render_gauges('bloodbank_report_jobs',
+                          {f'{k}_total': stats[k] for k in totals}, kind='counter')
+            + render_gauges('bloodbank_report_jobs',
+                            {k: v for k, v in stats.items() if k not in totals})
+        )
+
+
+report_jobs = ReportJobRunner(
+    workers=int(os.getenv('REPORT_JOB_WORKERS', '2')),
+    queue_max=int(os.getenv('REPORT_JOB_QUEUE_MAX', '100')),
+    ttl=float(os.getenv('REPORT_JOB_TTL', '3600')),
+    max_bytes=int(os.getenv('REPORT_JOB_MAX_BYTES', str(256 << 20))),
+    stale_after=float(os.getenv('REPORT_JOB_STALE', '120'))
+)
+
+
+def init_report_jobs(app):
+    """Start the runner's workers with the first request"""
+    if report_jobs.workers <= 0:
+        return
+
+    @app.before_request
+    def start_report_jobs():
+        if not report_jobs._threads:
+            report_jobs.start()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    # Reports register with the runner of the imported module, not __main__'s.
+    import routes.reports  # noqa: F401
+    from report_jobs import report_jobs
+    report_jobs.workers = max(report_jobs.workers, 1)
+    report_jobs.start()
+    logger.info('Running %d report job worker(s)', report_jobs.workers)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        report_jobs.stop()
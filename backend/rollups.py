@@ -0,0 +1,249 @@
+"""
+Daily rollups behind the report endpoints
+
+donation_daily, request_daily and request_hospital_daily (migration 0005) are
+refreshed incrementally: triggers queue every day a write touched in
+rollup_change, and refresh() takes the queued changes, recomputes only those
+days from the raw tables and advances the watermark in rollup_state, all in
+one transaction. Report views read the rollups as they are, so their cost
+follows the number of days in range rather than the table sizes, and a
+report GET never writes.
+
+Refreshing happens off the request path, in a background thread per worker
+process. The change feed wakes it on writes to blood_donation or
+recipient_request; it then waits ROLLUP_REFRESH_MIN_GAP seconds so a burst of
+writes is folded in at once. Without the feed it polls every
+ROLLUP_REFRESH_INTERVAL seconds. Only one process refreshes at a time; the
+others skip instead of queueing on the lock. A refresh announces itself on
+the change feed, so every worker drops the cached reports built from the
+days it replaced.
+
+Reports therefore lag writes by about ROLLUP_REFRESH_MIN_GAP plus the
+refresh time while the change feed is connected, and by at most
+ROLLUP_REFRESH_INTERVAL otherwise (plus AGGREGATE_CACHE_TTL for another
+worker's cached copy while its feed is down). ROLLUP_REFRESH_INTERVAL=0
+leaves the thread out; then run one refresh from cron with:
+
+    python rollups.py
+"""
+import logging
+import os
+import threading
+import time
+
+from cache import aggregate_cache
+from change_feed import CHANNEL, change_feed
+from db_utils import get_separate_cursor
+from metrics import render_gauges
+
+logger = logging.getLogger('blood_bank.rollups')
+
+# Serializes refreshes across threads, workers and hosts.
+LOCK_KEY = 7_262_636_003
+
+# rollup_change.source -> the table its days come from.
+SOURCE_TABLES = {'donation': 'blood_donation', 'request': 'recipient_request'}
+
+REFRESH_DONATION_DAYS = """
+    INSERT INTO donation_daily (day, blood_type, donations)
+    SELECT donation_date, blood_type, COUNT(*)
+    FROM blood_donation
+    WHERE donation_date = ANY(%s::date[])
+    GROUP BY donation_date, blood_type
+"""
+
+# Both request rollups are rebuilt from one pass over the affected days.
+REFRESH_REQUEST_DAYS = """
+    WITH changed AS (
+        SELECT d.day, rr.blood_type, rr.hospital_id, rr.request_status, rr.units_requested
+        FROM unnest(%s::date[]) d(day)
+        JOIN recipient_request rr ON rr.request_date >= d.day AND rr.request_date < d.day + 1
+    ), by_hospital AS (
+        INSERT INTO request_hospital_daily (day, hospital_id, requests)
+        SELECT day, hospital_id, COUNT(*) FROM changed GROUP BY day, hospital_id
+    )
+    INSERT INTO request_daily (day, blood_type, request_status, requests, units_requested)
+    SELECT day, blood_type, request_status, COUNT(*), SUM(units_requested)
+    FROM changed
+    GROUP BY day, blood_type, request_status
+"""
+
+# Sent with the refresh's commit as a 'rollup' change of each source table,
+# so cached reports built on the old rollups are dropped in every worker.
+NOTIFY_REFRESHED = """
+    SELECT pg_notify(%s, json_build_object(
+        't', t, 'op', 'rollup', 'ts', extract(epoch FROM clock_timestamp()))::text)
+    FROM unnest(%s::text[]) t
+"""
+
+
+class RollupRefresher:
+    """
+    Folds queued changes into the daily rollups in a background thread
+
+    Args:
+        interval: Seconds between refreshes when nothing wakes the thread
+            (<= 0 disables the thread)
+        min_gap: Seconds to wait after a wake-up before refreshing
+    """
+
+    def __init__(self, interval=30.0, min_gap=1.0):
+        self.interval = interval
+        self.min_gap = min_gap
+
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+        self.refreshes = 0
+        self.skipped = 0
+        self.errors = 0
+        self.changes = 0
+        self.days = 0
+        self.last_refresh_seconds = 0.0
+        self.last_success = 0.0
+
+    def refresh(self, wait=True):
+        """
+        Recompute every queued day; returns the number of days recomputed,
+        or None when wait is False and another process is refreshing
+        """
+        started = time.perf_counter()
+        with get_separate_cursor() as cursor:
+            cursor.execute("SELECT EXISTS (SELECT 1 FROM rollup_change) as pending")
+            if not cursor.fetchone()['pending']:
+                return 0
+
+            if wait:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", (LOCK_KEY,))
+            else:
+                cursor.execute("SELECT pg_try_advisory_xact_lock(%s) as locked", (LOCK_KEY,))
+                if not cursor.fetchone()['locked']:
+                    with self._lock:
+                        self.skipped += 1
+                    return None
+            # Only committed changes are visible here; later ones stay queued.
+            cursor.execute("DELETE FROM rollup_change RETURNING change_id, source, day")
+            taken = cursor.fetchall()
+            if not taken:
+                return 0
+
+            donation_days = sorted({r['day'] for r in taken if r['source'] == 'donation'})
+            request_days = sorted({r['day'] for r in taken if r['source'] == 'request'})
+            if donation_days:
+                cursor.execute("DELETE FROM donation_daily WHERE day = ANY(%s::date[])",
+                               (donation_days,))
+                cursor.execute(REFRESH_DONATION_DAYS, (donation_days,))
+            if request_days:
+                cursor.execute("DELETE FROM request_daily WHERE day = ANY(%s::date[])",
+                               (request_days,))
+                cursor.execute("DELETE FROM request_hospital_daily WHERE day = ANY(%s::date[])",
+                               (request_days,))
+                cursor.execute(REFRESH_REQUEST_DAYS, (request_days,))
+
+            cursor.execute("""
+                UPDATE rollup_state
+                SET watermark = GREATEST(watermark, %s), refreshed_at = CURRENT_TIMESTAMP
+                WHERE name = 'daily'
+            """, (max(r['change_id'] for r in taken),))
+            tables = sorted({SOURCE_TABLES[r['source']] for r in taken})
+            cursor.execute(NOTIFY_REFRESHED, (CHANNEL, tables))
+
+        # The feed tells every worker, this one too; this covers a feed that is down.
+        aggregate_cache.invalidate_tables(*tables)
+        with self._lock:
+            self.refreshes += 1
+            self.changes += len(taken)
+            self.days += len(donation_days) + len(request_days)
+            self.last_refresh_seconds = time.perf_counter() - started
+            self.last_success = time.time()
+        return len(donation_days) + len(request_days)
+
+    def wake(self, change=None):
+        """Change feed callback: refresh soon after a write (not after another refresh)"""
+        if change is None or change.op != 'rollup':
+            self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self.refresh(wait=False) is None:
+                    # Another process is refreshing; changes committed after
+                    # it started are still queued, so look again shortly.
+                    self._wake.set()
+            except Exception:
+                with self._lock:
+                    self.errors += 1
+                logger.exception('Rollup refresh failed')
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.wait(self.min_gap):
+                break
+
+    def start(self):
+        """Start refreshing in a daemon thread (no-op if already running or interval <= 0)"""
+        with self._lock:
+            if self.interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='rollup-refresher', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'running': self._thread is not None and self._thread.is_alive(),
+                'refreshes': self.refreshes,
+                'skipped': self.skipped,
+                'errors': self.errors,
+                'changes': self.changes,
+                'days': self.days,
+                'last_refresh_seconds': round(self.last_refresh_seconds, 4),
+                'last_success_timestamp': round(self.last_success, 3),
+            }
+
+    def render(self):
+        stats = self.stats()
+        totals = ('refreshes', 'skipped', 'errors', 'changes', 'days')
+        return (
+            render_gauges('bloodbank_rollup',
+                          {f'{k}_total': stats[k] for k in totals}, kind='counter')
+            + render_gauges('bloodbank_rollup',
+                            {k: v for k, v in stats.items() if k not in totals})
+        )
+
+
+rollup_refresher = RollupRefresher(
+    interval=float(os.getenv('ROLLUP_REFRESH_INTERVAL', '30')),
+    min_gap=float(os.getenv('ROLLUP_REFRESH_MIN_GAP', '1'))
+)
+change_feed.subscribe(tuple(SOURCE_TABLES.values()), rollup_refresher.wake)
+
+
+def init_rollups(app):
+    """
+    Start the background refresher on the first request rather than at
+    import, so it runs in the serving process and not in a parent that forks
+    workers.
+    """
+    if rollup_refresher.interval <= 0:
+        return
+
+    @app.before_request
+    def start_rollup_refresher():
+        if rollup_refresher._thread is None:
+            rollup_refresher.start()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    days = rollup_refresher.refresh()
+    print(f'{days} day(s) recomputed')
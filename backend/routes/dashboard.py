@@ -1,88 +1,94 @@
 from flask import Blueprint, jsonify, request
-from db_utils import fetch_all, fetch_one
+from db_utils import fetch_all, fetch_one, read_only_transaction
+from cache import cached_aggregate
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
+# Every table is scanned once: blood_inventory, recipient_request and
+# blood_donation are grouped a single time and the counters are folded out
+# of those groups, so the whole dashboard costs one round trip. Overdue bags
+# are moved out of 'available' by expiry_sweeper, so status alone decides
+# availability.
+DASHBOARD_STATS_QUERY = """
+    WITH inventory AS (
+        SELECT
+            blood_type,
+            COUNT(*) as total,
+            COUNT(*) FILTER (WHERE status = 'available') as available,
+            COUNT(*) FILTER (
+                WHERE expiry_date BETWEEN CURRENT_DATE AND CURRENT_DATE + INTERVAL '7 days'
+                      AND status IN ('available', 'reserved')
+            ) as expiring
+        FROM blood_inventory
+        GROUP BY blood_type
+    ),
+    requests AS (
+        SELECT request_status, COUNT(*) as count
+        FROM recipient_request
+        GROUP BY request_status
+    ),
+    donations AS (
+        SELECT
+            CASE WHEN donation_date >= CURRENT_DATE - INTERVAL '6 months'
+                 THEN DATE_TRUNC('month', donation_date)
+            END as month_date,
+            COUNT(*) as count
+        FROM blood_donation
+        GROUP BY 1
+    )
+    SELECT
+        (SELECT COUNT(*) FROM donor) as total_donors,
+        (SELECT COUNT(*) FROM hospital) as total_hospitals,
+        (SELECT COALESCE(SUM(count), 0)::bigint FROM donations) as total_donations,
+        (SELECT COALESCE(SUM(total), 0)::bigint FROM inventory) as total_inventory,
+        (SELECT COALESCE(SUM(count), 0)::bigint FROM requests) as total_requests,
+        (SELECT COALESCE(SUM(available), 0)::bigint FROM inventory) as available_units,
+        (SELECT COALESCE(SUM(expiring), 0)::bigint FROM inventory) as expiring_soon,
+        (SELECT COALESCE(SUM(count) FILTER (WHERE request_status = 'pending'), 0)::bigint
+         FROM requests) as pending_requests,
+        (SELECT COALESCE(
+                    json_object_agg(blood_type::text, available ORDER BY blood_type)
+                        FILTER (WHERE available > 0),
+                    '{}'::json)
+         FROM inventory) as blood_type_distribution,
+        (SELECT COALESCE(
+                    json_agg(json_build_object(
+                        'month', TO_CHAR(month_date, 'Mon'),
+                        'donations', count
+                    ) ORDER BY month_date) FILTER (WHERE month_date IS NOT NULL),
+                    '[]'::json)
+         FROM donations) as monthly_donations,
+        (SELECT COALESCE(json_object_agg(request_status::text, count), '{}'::json)
+         FROM requests) as requests_by_status
+"""
+
 @dashboard_bp.route('/stats', methods=['GET'])
+@cached_aggregate(tables=('donor', 'hospital', 'blood_donation', 'blood_inventory', 'recipient_request'))
+@read_only_transaction
 def get_dashboard_stats():
     """Get comprehensive dashboard statistics"""
     
     try:
-        total_donors = fetch_one("SELECT COUNT(*) as count FROM donor")['count']
-        total_hospitals = fetch_one("SELECT COUNT(*) as count FROM hospital")['count']
-        total_donations = fetch_one("SELECT COUNT(*) as count FROM blood_donation")['count']
-        
-        available_units = fetch_one("""
-            SELECT COUNT(*) as count 
-            FROM blood_inventory 
-            WHERE status = 'available' AND expiry_date >= CURRENT_DATE
-        """)['count']
-        
-        pending_requests = fetch_one("""
-            SELECT COUNT(*) as count 
-            FROM recipient_request 
-            WHERE request_status = 'pending'
-        """)['count']
-        
-        blood_type_data = fetch_all("""
-            SELECT blood_type::text as name, COUNT(*) as units
-            FROM blood_inventory
-            WHERE status = 'available' AND expiry_date >= CURRENT_DATE
-            GROUP BY blood_type
-            ORDER BY blood_type
-        """)
-        
-        monthly_donations = fetch_all("""
-            SELECT 
-                TO_CHAR(donation_date, 'Mon') as month,
-                COUNT(*) as donations
-            FROM blood_donation
-            WHERE donation_date >= CURRENT_DATE - INTERVAL '6 months'
-            GROUP BY TO_CHAR(donation_date, 'Mon'), DATE_TRUNC('month', donation_date)
-            ORDER BY DATE_TRUNC('month', donation_date)
-        """)
-        
-        request_status = fetch_all("""
-            SELECT request_status::text as status, COUNT(*) as count
-            FROM recipient_request
-            GROUP BY request_status
-        """)
-        
-        requests_by_status = {row['status']: row['count'] for row in request_status}
-        
-        blood_type_distribution = {row['name']: row['units'] for row in blood_type_data}
-        
-        expiring_soon = fetch_one("""
-            SELECT COUNT(*) as count
-            FROM blood_inventory
-            WHERE expiry_date BETWEEN CURRENT_DATE AND CURRENT_DATE + INTERVAL '7 days'
-                  AND status IN ('available', 'reserved')
-        """)['count']
-        
-        total_inventory = fetch_one("""
-            SELECT COUNT(*) as count FROM blood_inventory
-        """)['count']
-        
-        total_requests = fetch_one("""
-            SELECT COUNT(*) as count FROM recipient_request
-        """)['count']
+        stats = fetch_one(DASHBOARD_STATS_QUERY)
         
         return jsonify({
-            'total_donors': total_donors,
-            'total_hospitals': total_hospitals,
-            'total_donations': total_donations,
-            'total_inventory': total_inventory,
-            'total_requests': total_requests,
-            'available_units': available_units,
-            'expiring_soon': expiring_soon,
-            'blood_type_distribution': blood_type_distribution,
-            'monthly_donations': monthly_donations,
-            'requests_by_status': requests_by_status
+            'total_donors': stats['total_donors'],
+            'total_hospitals': stats['total_hospitals'],
+            'total_donations': stats['total_donations'],
+            'total_inventory': stats['total_inventory'],
+            'total_requests': stats['total_requests'],
+            'available_units': stats['available_units'],
+            'expiring_soon': stats['expiring_soon'],
+            'blood_type_distribution': stats['blood_type_distribution'],
+            'monthly_donations': stats['monthly_donations'],
+            'requests_by_status': stats['requests_by_status']
         }), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @dashboard_bp.route('/recent-activity', methods=['GET'])
+@cached_aggregate(tables=('blood_donation', 'donor', 'recipient_request', 'hospital'))
+@read_only_transaction
 def get_recent_activity():
     """Get recent activity across all tables"""
     
@@ -118,17 +124,13 @@ def get_recent_activity():
         all_activity = recent_donations + recent_requests
         all_activity.sort(key=lambda x: x['created_at'], reverse=True)
         
-        for activity in all_activity:
-            if activity.get('date'):
-                activity['date'] = activity['date'].isoformat()
-            if activity.get('created_at'):
-                activity['created_at'] = activity['created_at'].isoformat()
-        
         return jsonify(all_activity[:10]), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @dashboard_bp.route('/monthly-comparison', methods=['GET'])
+@cached_aggregate(tables=('blood_donation', 'recipient_request'))
+@read_only_transaction
 def get_monthly_comparison():
     """Get monthly donations vs requests for comparison chart"""
     
@@ -137,24 +139,24 @@ def get_monthly_comparison():
         
         monthly_donations = fetch_all(f"""
             SELECT 
-                TO_CHAR(donation_date, 'Mon') as month,
-                DATE_TRUNC('month', donation_date) as month_date,
-                COUNT(*) as donations
-            FROM blood_donation
-            WHERE donation_date >= CURRENT_DATE - INTERVAL '{months} months'
-            GROUP BY TO_CHAR(donation_date, 'Mon'), DATE_TRUNC('month', donation_date)
-            ORDER BY DATE_TRUNC('month', donation_date)
+                TO_CHAR(day, 'Mon') as month,
+                DATE_TRUNC('month', day) as month_date,
+                SUM(donations)::bigint as donations
+            FROM donation_daily
+            WHERE day >= (CURRENT_DATE - INTERVAL '{months} months')::date
+            GROUP BY TO_CHAR(day, 'Mon'), DATE_TRUNC('month', day)
+            ORDER BY DATE_TRUNC('month', day)
         """)
         
         monthly_requests = fetch_all(f"""
             SELECT 
-                TO_CHAR(request_date, 'Mon') as month,
-                DATE_TRUNC('month', request_date) as month_date,
-                SUM(units_requested) as requests
-            FROM recipient_request
-            WHERE request_date >= CURRENT_DATE - INTERVAL '{months} months'
-            GROUP BY TO_CHAR(request_date, 'Mon'), DATE_TRUNC('month', request_date)
-            ORDER BY DATE_TRUNC('month', request_date)
+                TO_CHAR(day, 'Mon') as month,
+                DATE_TRUNC('month', day) as month_date,
+                SUM(units_requested)::bigint as requests
+            FROM request_daily
+            WHERE day >= (CURRENT_DATE - INTERVAL '{months} months')::date
+            GROUP BY TO_CHAR(day, 'Mon'), DATE_TRUNC('month', day)
+            ORDER BY DATE_TRUNC('month', day)
         """)
         
         result = {}
@@ -1,21 +1,58 @@
 from flask import Blueprint, request, jsonify
-from db_utils import fetch_all, fetch_one, insert_and_return_id
+from db_utils import fetch_all, fetch_one, insert_and_return_id, stream_json_array, get_db_cursor
+from cache import invalidate_tables
+from bulk_intake import (BLOOD_TYPES, BulkField, BulkIntake, boolean, bulk_status, choice, decimal,
+                         integer, iso_date, request_rows, text)
+from pagination import KeysetPage, PaginationError, with_next_cursor
 
 donations_bp = Blueprint('donations', __name__)
 
+DONATION_LIST_COLUMNS = {
+    'donation_id': 'bd.donation_id', 'donor_id': 'bd.donor_id',
+    'donation_date': 'bd.donation_date', 'location': 'bd.location',
+    'volume_ml': 'bd.volume_ml', 'blood_type': 'bd.blood_type::text',
+    'hemoglobin_level': 'bd.hemoglobin_level',
+    'blood_pressure_systolic': 'bd.blood_pressure_systolic',
+    'blood_pressure_diastolic': 'bd.blood_pressure_diastolic',
+    'donation_status': 'bd.donation_status', 'screened': 'bd.screened',
+    'screening_results': 'bd.screening_results', 'staff_name': 'bd.staff_name',
+    'notes': 'bd.notes', 'created_at': 'bd.created_at',
+    'donor_name': "d.first_name || ' ' || d.last_name as donor_name"
+}
+
+DONATION_LIST_ORDER = [('bd.donation_date', 'donation_date'), ('bd.donation_id', 'donation_id')]
+
+DONATION_INTAKE = BulkIntake('blood_donation', [
+    BulkField('donorId', 'donor_id', integer(minimum=1), required=True),
+    BulkField('donationDate', 'donation_date', iso_date, required=True),
+    BulkField('location', 'location', text(100)),
+    BulkField('volumeMl', 'volume_ml', integer(minimum=1, maximum=10000), required=True),
+    BulkField('bloodType', 'blood_type', choice(*BLOOD_TYPES), required=True),
+    BulkField('hemoglobinLevel', 'hemoglobin_level', decimal(999)),
+    BulkField('bloodPressureSystolic', 'blood_pressure_systolic', integer(minimum=0, maximum=400)),
+    BulkField('bloodPressureDiastolic', 'blood_pressure_diastolic', integer(minimum=0, maximum=400)),
+    BulkField('status', 'donation_status', text(20), default='completed'),
+    BulkField('screened', 'screened', boolean, default='f'),
+    BulkField('screeningResults', 'screening_results', text(10000)),
+    BulkField('staffName', 'staff_name', text(100)),
+    BulkField('notes', 'notes', text(10000)),
+], checks=[
+    ('donorId: donor does not exist',
+     "NOT EXISTS (SELECT 1 FROM donor d WHERE d.donor_id = s.donor_id)"),
+])
+
 @donations_bp.route('', methods=['GET'])
 def get_donations():
     """Get all donations"""
     donor_id = request.args.get('donor_id')
     
-    query = """
-        SELECT 
-            bd.donation_id, bd.donor_id, bd.donation_date, bd.location,
-            bd.volume_ml, bd.blood_type::text, bd.hemoglobin_level,
-            bd.blood_pressure_systolic, bd.blood_pressure_diastolic,
-            bd.donation_status, bd.screened, bd.screening_results,
-            bd.staff_name, bd.notes, bd.created_at,
-            d.first_name || ' ' || d.last_name as donor_name
+    try:
+        page = KeysetPage(request.args, DONATION_LIST_COLUMNS, DONATION_LIST_ORDER)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    query = f"""
+        SELECT {page.select_list()}
         FROM blood_donation bd
         JOIN donor d ON bd.donor_id = d.donor_id
         WHERE 1=1
@@ -26,17 +63,17 @@ def get_donations():
         query += " AND bd.donor_id = %s"
         params.append(donor_id)
     
-    query += " ORDER BY bd.donation_date DESC"
+    cursor_filter, cursor_params = page.where()
+    query += cursor_filter + page.order_limit()
+    params.extend(cursor_params)
     
     try:
-        donations = fetch_all(query, tuple(params) if params else None)
-        for donation in donations:
-            if donation.get('donation_date'):
-                donation['donation_date'] = donation['donation_date'].isoformat()
-            if donation.get('created_at'):
-                donation['created_at'] = donation['created_at'].isoformat()
+        if page.streaming:
+            return stream_json_array(query, tuple(params) if params else None)
         
-        return jsonify(donations), 200
+        donations, next_cursor = page.finish(fetch_all(query, tuple(params) if params else None))
+        
+        return with_next_cursor(jsonify(donations), next_cursor), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -78,10 +115,22 @@ def create_donation():
     
     try:
         donation = insert_and_return_id(query, params)
-        donation['blood_type'] = str(donation['blood_type'])
-        if donation.get('donation_date'):
-            donation['donation_date'] = donation['donation_date'].isoformat()
+        invalidate_tables('blood_donation', 'donor')
         
         return jsonify({'message': 'Donation recorded successfully', 'donation': donation}), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 400
+
+@donations_bp.route('/bulk', methods=['POST'])
+def bulk_create_donations():
+    """Record many donations from a JSON array or CSV upload"""
+    try:
+        with get_db_cursor() as cursor:
+            report = DONATION_INTAKE.load(cursor, request_rows(request),
+                                          atomic=request.args.get('atomic') == '1')
+        if report['inserted']:
+            invalidate_tables('blood_donation', 'donor')
+        
+        return jsonify(report), bulk_status(report)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
@@ -1,58 +1,226 @@
 from flask import Blueprint, request, jsonify
-from db_utils import fetch_all, fetch_one, execute_query, insert_and_return_id
+from db_utils import (fetch_all, fetch_one, execute_query, insert_and_return_id, on_commit,
+                      stream_json_array, stream_rows, get_db_cursor)
+from cache import invalidate_tables
+from change_feed import change_feed
+from bulk_intake import (BLOOD_TYPES, BulkField, BulkIntake, bulk_status, choice, iso_date,
+                         request_rows, text)
+from pagination import KeysetPage, PaginationError, with_next_cursor
+from prefix_index import PrefixIndex
+from watermarks import conditional_get
 from datetime import datetime
+import os
+import re
 
 donors_bp = Blueprint('donors', __name__)
 
+DONOR_LIST_COLUMNS = {
+    'donor_id': 'donor_id', 'first_name': 'first_name', 'last_name': 'last_name',
+    'email': 'email', 'phone': 'phone', 'blood_type': 'blood_type::text',
+    'gender': 'gender', 'date_of_birth': 'date_of_birth', 'address': 'address',
+    'city': 'city', 'state': 'state', 'zip_code': 'zip_code', 'status': 'status',
+    'medical_history': 'medical_history', 'last_donation_date': 'last_donation_date',
+    'total_donations': 'total_donations', 'created_at': 'created_at',
+    'updated_at': 'updated_at'
+}
+
+DONOR_LIST_ORDER = [('created_at', 'created_at'), ('donor_id', 'donor_id')]
+
+DONOR_SEARCH_VECTOR = "donor_search_vector(first_name, last_name, email, phone)"
+DONOR_SEARCH_LIMIT = int(os.getenv('DONOR_SEARCH_LIMIT', '50'))
+DONOR_SEARCH_CANDIDATES = int(os.getenv('DONOR_SEARCH_CANDIDATES', '5000'))
+DONOR_SUGGEST_MAX = 50
+
+DONOR_INTAKE = BulkIntake('donor', [
+    BulkField('firstName', 'first_name', text(50), required=True),
+    BulkField('lastName', 'last_name', text(50), required=True),
+    BulkField('email', 'email', text(100)),
+    BulkField('phone', 'phone', text(20), required=True),
+    BulkField('bloodType', 'blood_type', choice(*BLOOD_TYPES), required=True),
+    BulkField('gender', 'gender', text(10)),
+    BulkField('dateOfBirth', 'date_of_birth', iso_date, required=True),
+    BulkField('address', 'address', text(1000)),
+    BulkField('city', 'city', text(50)),
+    BulkField('state', 'state', text(50)),
+    BulkField('zipCode', 'zip_code', text(10)),
+    BulkField('medicalHistory', 'medical_history', text(10000)),
+    BulkField('status', 'status', text(20), default='available'),
+], unique=('email',), checks=[
+    ('email: already registered',
+     "s.email IS NOT NULL AND EXISTS (SELECT 1 FROM donor d WHERE d.email = s.email)"),
+])
+
+_PHONE_LIKE = re.compile(r'^[\d\s()+.-]+$')
+_NON_DIGITS = re.compile(r'\D')
+
+def phone_digits(phone):
+    """Strip a phone number down to its digits"""
+    return _NON_DIGITS.sub('', phone or '')
+
+def normalize_search_term(term):
+    """Lower-case and squeeze a search term; phone-like terms become bare digits"""
+    term = (term or '').strip()
+    if _PHONE_LIKE.match(term) and len(phone_digits(term)) >= 3:
+        return phone_digits(term)
+    return ' '.join(term.lower().split())
+
+def donor_tsquery(term):
+    """Build a prefix tsquery matching every word of term, or None if it has none"""
+    words = [w for w in normalize_search_term(term).split() if any(c.isalnum() for c in w)]
+    if not words:
+        return None
+    return ' & '.join("'" + w.replace('\\', '').replace("'", "''") + "':*" for w in words)
+
+def donor_suggest_keys(first_name, last_name, phone):
+    """Keys a donor is suggested under: full name, last name and phone digits"""
+    digits = phone_digits(phone)
+    keys = [f'{first_name} {last_name}'.lower(), (last_name or '').lower(), digits]
+    if len(digits) > 10:
+        keys.append(digits[-10:])
+    return [k for k in keys if k]
+
+def _load_suggest_keys():
+    # Sorted by the database in code point order so the index is built in one pass.
+    rows = stream_rows(r"""
+        SELECT key, donor_id FROM (
+            SELECT lower(first_name || ' ' || last_name) as key, donor_id FROM donor
+            UNION ALL
+            SELECT lower(last_name), donor_id FROM donor
+            UNION ALL
+            SELECT regexp_replace(phone, '\D', '', 'g'), donor_id FROM donor
+            UNION ALL
+            SELECT right(regexp_replace(phone, '\D', '', 'g'), 10), donor_id FROM donor
+            WHERE length(regexp_replace(phone, '\D', '', 'g')) > 10
+        ) keys
+        WHERE key <> ''
+        ORDER BY key COLLATE "C"
+    """, as_dict=False)
+    with rows:
+        yield from rows
+
+donor_suggest_index = PrefixIndex(
+    _load_suggest_keys,
+    refresh_interval=float(os.getenv('DONOR_SUGGEST_REFRESH', '300'))
+)
+
+def _index_donor(donor):
+    keys = donor_suggest_keys(donor['first_name'], donor['last_name'], donor['phone'])
+    on_commit(lambda: donor_suggest_index.upsert(donor['donor_id'], keys))
+
+def _sync_suggest_index(change):
+    """Apply donor writes reported by the change feed (other workers' included)"""
+    if change.ids is None:
+        # Nested writes are the donation trigger's statistics updates, which
+        # leave names and phones alone; anything else (a resync, a bulk
+        # statement, a truncate) rebuilds the index on next use.
+        if change.count is None and change.op == 'update':
+            return
+        donor_suggest_index.invalidate()
+        return
+    rows = [] if change.op == 'delete' else fetch_all(
+        "SELECT donor_id, first_name, last_name, phone FROM donor WHERE donor_id = ANY(%s)",
+        (change.ids,)
+    )
+    for row in rows:
+        donor_suggest_index.upsert(
+            row['donor_id'], donor_suggest_keys(row['first_name'], row['last_name'], row['phone']))
+    for donor_id in set(change.ids) - {row['donor_id'] for row in rows}:
+        donor_suggest_index.remove(donor_id)
+
+change_feed.subscribe(('donor',), _sync_suggest_index)
+
 @donors_bp.route('', methods=['GET'])
+@conditional_get(tables=('donor',))
 def get_donors():
     """Get all donors or filter by query parameters"""
     blood_type = request.args.get('blood_type')
     search = request.args.get('search')
     status = request.args.get('status')
     
-    query = """
-        SELECT donor_id, first_name, last_name, email, phone, 
-               blood_type::text, gender, date_of_birth, address, city, state, zip_code,
-               status, medical_history, last_donation_date, total_donations,
-               created_at, updated_at
-        FROM donor
-        WHERE 1=1
-    """
+    try:
+        page = KeysetPage(request.args, DONOR_LIST_COLUMNS, DONOR_LIST_ORDER)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    filters = ""
     params = []
     
     if blood_type:
-        query += " AND blood_type = %s"
+        filters += " AND blood_type = %s"
         params.append(blood_type)
     
     if status:
-        query += " AND status = %s"
+        filters += " AND status = %s"
         params.append(status)
     
     if search:
-        query += " AND (first_name ILIKE %s OR last_name ILIKE %s OR email ILIKE %s OR phone ILIKE %s)"
-        search_param = f"%{search}%"
-        params.extend([search_param, search_param, search_param, search_param])
+        # Ranked by relevance, so a search returns one bounded page (no cursor).
+        if 'cursor' in request.args:
+            return jsonify({'error': 'cursor cannot be combined with search'}), 400
+        tsquery = donor_tsquery(search)
+        if tsquery is None:
+            return jsonify([]), 200
+        limit = page.limit if page.limit is not None else DONOR_SEARCH_LIMIT
+        # Ranking computes every candidate's vector, so very broad terms are
+        # ranked within their DONOR_SEARCH_CANDIDATES most recently registered
+        # matches (a fixed set, not whichever rows the scan meets first).
+        query = f"""
+            SELECT {page.select_list()}
+            FROM (
+                SELECT * FROM donor
+                WHERE {DONOR_SEARCH_VECTOR} @@ to_tsquery('simple', %s){filters}
+                ORDER BY donor_id DESC
+                LIMIT {DONOR_SEARCH_CANDIDATES}
+            ) donor
+            ORDER BY ts_rank({DONOR_SEARCH_VECTOR}, to_tsquery('simple', %s)) DESC, donor_id DESC
+            LIMIT {limit}
+        """
+        params = [tsquery] + params + [tsquery]
+    else:
+        cursor_filter, cursor_params = page.where()
+        query = f"""
+            SELECT {page.select_list()}
+            FROM donor
+            WHERE 1=1{filters}
+        """ + cursor_filter + page.order_limit()
+        params.extend(cursor_params)
     
-    query += " ORDER BY created_at DESC"
+    try:
+        if page.streaming:
+            return stream_json_array(query, tuple(params) if params else None)
+        
+        donors, next_cursor = page.finish(fetch_all(query, tuple(params) if params else None))
+        
+        return with_next_cursor(jsonify(donors), next_cursor), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@donors_bp.route('/suggest', methods=['GET'])
+def suggest_donors():
+    """Autocomplete donors by name, last name or phone prefix"""
+    term = normalize_search_term(request.args.get('q'))
+    limit = min(max(request.args.get('limit', 10, type=int), 1), DONOR_SUGGEST_MAX)
+    if not term:
+        return jsonify([]), 200
     
     try:
-        donors = fetch_all(query, tuple(params) if params else None)
-        for donor in donors:
-            if donor.get('date_of_birth'):
-                donor['date_of_birth'] = donor['date_of_birth'].isoformat()
-            if donor.get('last_donation_date'):
-                donor['last_donation_date'] = donor['last_donation_date'].isoformat()
-            if donor.get('created_at'):
-                donor['created_at'] = donor['created_at'].isoformat()
-            if donor.get('updated_at'):
-                donor['updated_at'] = donor['updated_at'].isoformat()
+        donor_ids = donor_suggest_index.search(term, limit)
+        if not donor_ids:
+            return jsonify([]), 200
         
-        return jsonify(donors), 200
+        rows = fetch_all("""
+            SELECT donor_id, first_name, last_name, phone, blood_type::text, city
+            FROM donor
+            WHERE donor_id = ANY(%s)
+        """, (donor_ids,))
+        by_id = {row['donor_id']: row for row in rows}
+        
+        return jsonify([by_id[i] for i in donor_ids if i in by_id]), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @donors_bp.route('/<int:donor_id>', methods=['GET'])
+@conditional_get(tables=('donor',))
 def get_donor(donor_id):
     """Get a specific donor by ID"""
     query = """
@@ -69,15 +237,6 @@ def get_donor(donor_id):
         if not donor:
             return jsonify({'error': 'Donor not found'}), 404
         
-        if donor.get('date_of_birth'):
-            donor['date_of_birth'] = donor['date_of_birth'].isoformat()
-        if donor.get('last_donation_date'):
-            donor['last_donation_date'] = donor['last_donation_date'].isoformat()
-        if donor.get('created_at'):
-            donor['created_at'] = donor['created_at'].isoformat()
-        if donor.get('updated_at'):
-            donor['updated_at'] = donor['updated_at'].isoformat()
-        
         return jsonify(donor), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -119,11 +278,8 @@ def create_donor():
     
     try:
         donor = insert_and_return_id(query, params)
-        
-        if donor.get('date_of_birth'):
-            donor['date_of_birth'] = donor['date_of_birth'].isoformat()
-        if donor.get('created_at'):
-            donor['created_at'] = donor['created_at'].isoformat()
+        invalidate_tables('donor')
+        _index_donor(donor)
         
         return jsonify({
             'message': 'Donor registered successfully',
@@ -132,6 +288,21 @@ def create_donor():
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+@donors_bp.route('/bulk', methods=['POST'])
+def bulk_create_donors():
+    """Register many donors from a JSON array or CSV upload"""
+    try:
+        with get_db_cursor() as cursor:
+            report = DONOR_INTAKE.load(cursor, request_rows(request),
+                                       atomic=request.args.get('atomic') == '1')
+        if report['inserted']:
+            invalidate_tables('donor')
+            on_commit(donor_suggest_index.invalidate)
+        
+        return jsonify(report), bulk_status(report)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
 @donors_bp.route('/<int:donor_id>', methods=['PUT'])
 def update_donor(donor_id):
     """Update an existing donor"""
@@ -179,21 +350,13 @@ def update_donor(donor_id):
     
     try:
         execute_query(query, params, fetch=False)
+        invalidate_tables('donor')
         
         donor = fetch_one(
             "SELECT * FROM donor WHERE donor_id = %s", 
             (donor_id,)
         )
-        
-        if donor.get('date_of_birth'):
-            donor['date_of_birth'] = donor['date_of_birth'].isoformat()
-        if donor.get('last_donation_date'):
-            donor['last_donation_date'] = donor['last_donation_date'].isoformat()
-        if donor.get('created_at'):
-            donor['created_at'] = donor['created_at'].isoformat()
-        if donor.get('updated_at'):
-            donor['updated_at'] = donor['updated_at'].isoformat()
-        donor['blood_type'] = str(donor['blood_type'])
+        _index_donor(donor)
         
         return jsonify({
             'message': 'Donor updated successfully',
@@ -214,6 +377,8 @@ def delete_donor(donor_id):
     
     try:
         execute_query(query, (donor_id,), fetch=False)
+        invalidate_tables('donor', 'blood_donation', 'blood_inventory')
+        on_commit(lambda: donor_suggest_index.remove(donor_id))
         return jsonify({'message': 'Donor deleted successfully'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 400
@@ -234,12 +399,6 @@ def get_donor_history(donor_id):
     try:
         donations = fetch_all(query, (donor_id,))
         
-        for donation in donations:
-            if donation.get('donation_date'):
-                donation['donation_date'] = donation['donation_date'].isoformat()
-            if donation.get('created_at'):
-                donation['created_at'] = donation['created_at'].isoformat()
-        
         return jsonify(donations), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
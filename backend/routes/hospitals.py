@@ -1,9 +1,13 @@
 from flask import Blueprint, request, jsonify
-from db_utils import fetch_all, fetch_one, execute_query, insert_and_return_id
+from db_utils import fetch_all, fetch_one, execute_query, insert_and_return_id, stream_json_array
+from cache import invalidate_tables
+from pagination import KeysetPage, PaginationError, with_next_cursor
+from watermarks import conditional_get
 
 hospitals_bp = Blueprint('hospitals', __name__)
 
 @hospitals_bp.route('', methods=['GET'])
+@conditional_get(tables=('hospital',))
 def get_hospitals():
     """Get all hospitals"""
     city = request.args.get('city')
@@ -33,17 +37,12 @@ def get_hospitals():
     try:
         hospitals = fetch_all(query, tuple(params) if params else None)
         
-        for hospital in hospitals:
-            if hospital.get('created_at'):
-                hospital['created_at'] = hospital['created_at'].isoformat()
-            if hospital.get('updated_at'):
-                hospital['updated_at'] = hospital['updated_at'].isoformat()
-        
         return jsonify(hospitals), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @hospitals_bp.route('/<int:hospital_id>', methods=['GET'])
+@conditional_get(tables=('hospital',))
 def get_hospital(hospital_id):
     """Get a specific hospital by ID"""
     query = """
@@ -61,11 +60,6 @@ def get_hospital(hospital_id):
         if not hospital:
             return jsonify({'error': 'Hospital not found'}), 404
         
-        if hospital.get('created_at'):
-            hospital['created_at'] = hospital['created_at'].isoformat()
-        if hospital.get('updated_at'):
-            hospital['updated_at'] = hospital['updated_at'].isoformat()
-        
         return jsonify(hospital), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -109,9 +103,7 @@ def create_hospital():
     
     try:
         hospital = insert_and_return_id(query, params)
-        
-        if hospital.get('created_at'):
-            hospital['created_at'] = hospital['created_at'].isoformat()
+        invalidate_tables('hospital')
         
         return jsonify({
             'message': 'Hospital registered successfully',
@@ -169,17 +161,13 @@ def update_hospital(hospital_id):
     
     try:
         execute_query(query, params, fetch=False)
+        invalidate_tables('hospital')
         
         hospital = fetch_one(
             "SELECT * FROM hospital WHERE hospital_id = %s",
             (hospital_id,)
         )
         
-        if hospital.get('created_at'):
-            hospital['created_at'] = hospital['created_at'].isoformat()
-        if hospital.get('updated_at'):
-            hospital['updated_at'] = hospital['updated_at'].isoformat()
-        
         return jsonify({
             'message': 'Hospital updated successfully',
             'hospital': hospital
@@ -187,37 +175,44 @@ def update_hospital(hospital_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+HOSPITAL_REQUEST_COLUMNS = {
+    'request_id': 'request_id', 'blood_type': 'blood_type::text',
+    'units_requested': 'units_requested', 'units_fulfilled': 'units_fulfilled',
+    'urgency_level': 'urgency_level::text', 'patient_name': 'patient_name',
+    'patient_age': 'patient_age', 'patient_gender': 'patient_gender',
+    'diagnosis_reason': 'diagnosis_reason', 'required_by_date': 'required_by_date',
+    'request_date': 'request_date', 'request_status': 'request_status::text',
+    'doctor_name': 'doctor_name', 'doctor_contact_number': 'doctor_contact_number',
+    'approved_by': 'approved_by', 'approved_date': 'approved_date',
+    'fulfilled_date': 'fulfilled_date', 'rejection_reason': 'rejection_reason',
+    'notes': 'notes', 'created_at': 'created_at'
+}
+
+HOSPITAL_REQUEST_ORDER = [('request_date', 'request_date'), ('request_id', 'request_id')]
+
 @hospitals_bp.route('/<int:hospital_id>/requests', methods=['GET'])
 def get_hospital_requests(hospital_id):
     """Get all requests from a specific hospital"""
-    query = """
-        SELECT 
-            request_id, blood_type::text, units_requested, units_fulfilled,
-            urgency_level::text, patient_name, patient_age, patient_gender,
-            diagnosis_reason, required_by_date, request_date,
-            request_status::text, doctor_name, doctor_contact_number,
-            approved_by, approved_date, fulfilled_date, rejection_reason,
-            notes, created_at
+    try:
+        page = KeysetPage(request.args, HOSPITAL_REQUEST_COLUMNS, HOSPITAL_REQUEST_ORDER)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    cursor_filter, cursor_params = page.where()
+    query = f"""
+        SELECT {page.select_list()}
         FROM recipient_request
-        WHERE hospital_id = %s
-        ORDER BY request_date DESC
+        WHERE hospital_id = %s{cursor_filter}
+        {page.order_limit()}
     """
+    params = (hospital_id, *cursor_params)
     
     try:
-        requests_data = fetch_all(query, (hospital_id,))
+        if page.streaming:
+            return stream_json_array(query, params)
         
-        for req in requests_data:
-            if req.get('required_by_date'):
-                req['required_by_date'] = req['required_by_date'].isoformat()
-            if req.get('request_date'):
-                req['request_date'] = req['request_date'].isoformat()
-            if req.get('approved_date'):
-                req['approved_date'] = req['approved_date'].isoformat()
-            if req.get('fulfilled_date'):
-                req['fulfilled_date'] = req['fulfilled_date'].isoformat()
-            if req.get('created_at'):
-                req['created_at'] = req['created_at'].isoformat()
+        requests_data, next_cursor = page.finish(fetch_all(query, params))
         
-        return jsonify(requests_data), 200
+        return with_next_cursor(jsonify(requests_data), next_cursor), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
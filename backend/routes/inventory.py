@@ -1,20 +1,67 @@
 from flask import Blueprint, request, jsonify
-from db_utils import fetch_all, fetch_one, execute_query, insert_and_return_id
+from db_utils import (fetch_all, fetch_one, execute_query, insert_and_return_id, stream_json_array,
+                      get_db_cursor)
+from cache import cached_aggregate, invalidate_tables
+from bulk_intake import (BLOOD_TYPES, BulkField, BulkIntake, bulk_status, choice, integer,
+                         iso_date, request_rows, text)
+from pagination import KeysetPage, PaginationError, with_next_cursor
+from watermarks import conditional_get
 
 inventory_bp = Blueprint('inventory', __name__)
 
+INVENTORY_LIST_COLUMNS = {
+    'bag_id': 'bag_id', 'bag_number': 'bag_number', 'donation_id': 'donation_id',
+    'donor_id': 'donor_id', 'blood_type': 'blood_type::text',
+    'collection_date': 'collection_date', 'expiry_date': 'expiry_date',
+    'volume_ml': 'volume_ml', 'component_type': 'component_type',
+    'storage_location': 'storage_location', 'testing_status': 'testing_status::text',
+    'status': 'status::text', 'assigned_to_request': 'assigned_to_request',
+    'quality_check_date': 'quality_check_date', 'notes': 'notes',
+    'created_at': 'created_at', 'updated_at': 'updated_at'
+}
+
+INVENTORY_LIST_ORDER = [('expiry_date', 'expiry_date'), ('bag_id', 'bag_id')]
+
+INVENTORY_INTAKE = BulkIntake('blood_inventory', [
+    BulkField('bagNumber', 'bag_number', text(50), required=True),
+    BulkField('donationId', 'donation_id', integer(minimum=1)),
+    BulkField('donorId', 'donor_id', integer(minimum=1)),
+    BulkField('bloodType', 'blood_type', choice(*BLOOD_TYPES), required=True),
+    BulkField('collectionDate', 'collection_date', iso_date, required=True),
+    BulkField('expiryDate', 'expiry_date', iso_date, required=True),
+    BulkField('volumeMl', 'volume_ml', integer(minimum=1, maximum=10000), required=True),
+    BulkField('componentType', 'component_type', text(50), default='Whole Blood'),
+    BulkField('storageLocation', 'storage_location', text(100)),
+    BulkField('testingStatus', 'testing_status', choice('pending', 'passed', 'failed'),
+              default='pending'),
+    BulkField('status', 'status', choice('available', 'reserved', 'assigned', 'expired', 'used'),
+              default='available'),
+    BulkField('notes', 'notes', text(10000)),
+], unique=('bag_number',), checks=[
+    ('bagNumber: already exists',
+     "EXISTS (SELECT 1 FROM blood_inventory b WHERE b.bag_number = s.bag_number)"),
+    ('donationId: donation does not exist',
+     "s.donation_id IS NOT NULL AND NOT EXISTS "
+     "(SELECT 1 FROM blood_donation bd WHERE bd.donation_id = s.donation_id)"),
+    ('donorId: donor does not exist',
+     "s.donor_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM donor d WHERE d.donor_id = s.donor_id)"),
+])
+
 @inventory_bp.route('', methods=['GET'])
+@conditional_get(tables=('blood_inventory',))
 def get_inventory():
     """Get blood inventory with filters"""
     blood_type = request.args.get('blood_type')
     status = request.args.get('status')
     
-    query = """
-        SELECT bag_id, bag_number, donation_id, donor_id,
-               blood_type::text, collection_date, expiry_date, volume_ml,
-               component_type, storage_location, testing_status::text,
-               status::text, assigned_to_request, quality_check_date,
-               notes, created_at, updated_at
+    try:
+        page = KeysetPage(request.args, INVENTORY_LIST_COLUMNS, INVENTORY_LIST_ORDER,
+                          descending=False)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    query = f"""
+        SELECT {page.select_list()}
         FROM blood_inventory
         WHERE 1=1
     """
@@ -28,27 +75,23 @@ def get_inventory():
         query += " AND status = %s::inventory_status_t"
         params.append(status)
     
-    query += " ORDER BY expiry_date"
+    cursor_filter, cursor_params = page.where()
+    query += cursor_filter + page.order_limit()
+    params.extend(cursor_params)
     
     try:
-        inventory = fetch_all(query, tuple(params) if params else None)
-        for item in inventory:
-            if item.get('collection_date'):
-                item['collection_date'] = item['collection_date'].isoformat()
-            if item.get('expiry_date'):
-                item['expiry_date'] = item['expiry_date'].isoformat()
-            if item.get('quality_check_date'):
-                item['quality_check_date'] = item['quality_check_date'].isoformat()
-            if item.get('created_at'):
-                item['created_at'] = item['created_at'].isoformat()
-            if item.get('updated_at'):
-                item['updated_at'] = item['updated_at'].isoformat()
+        if page.streaming:
+            return stream_json_array(query, tuple(params) if params else None)
         
-        return jsonify(inventory), 200
+        inventory, next_cursor = page.finish(fetch_all(query, tuple(params) if params else None))
+        
+        return with_next_cursor(jsonify(inventory), next_cursor), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @inventory_bp.route('/stats', methods=['GET'])
+@conditional_get(tables=('blood_inventory',))
+@cached_aggregate(tables=('blood_inventory',))
 def get_inventory_stats():
     """Get inventory statistics by blood type"""
     query = """
@@ -71,6 +114,7 @@ def get_inventory_stats():
         return jsonify({'error': str(e)}), 500
 
 @inventory_bp.route('/expiring', methods=['GET'])
+@conditional_get(tables=('blood_inventory',))
 def get_expiring():
     """Get inventory expiring soon"""
     days = request.args.get('days', 7, type=int)
@@ -87,9 +131,6 @@ def get_expiring():
     
     try:
         items = fetch_all(query, (days,))
-        for item in items:
-            if item.get('expiry_date'):
-                item['expiry_date'] = item['expiry_date'].isoformat()
         
         return jsonify(items), 200
     except Exception as e:
@@ -131,18 +172,26 @@ def add_inventory():
     
     try:
         item = insert_and_return_id(query, params)
-        if item.get('collection_date'):
-            item['collection_date'] = item['collection_date'].isoformat()
-        if item.get('expiry_date'):
-            item['expiry_date'] = item['expiry_date'].isoformat()
-        item['blood_type'] = str(item['blood_type'])
-        item['status'] = str(item['status'])
-        item['testing_status'] = str(item['testing_status'])
+        invalidate_tables('blood_inventory')
         
         return jsonify({'message': 'Inventory added successfully', 'inventory': item}), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+@inventory_bp.route('/bulk', methods=['POST'])
+def bulk_add_inventory():
+    """Add many bags from a JSON array or CSV upload"""
+    try:
+        with get_db_cursor() as cursor:
+            report = INVENTORY_INTAKE.load(cursor, request_rows(request),
+                                           atomic=request.args.get('atomic') == '1')
+        if report['inserted']:
+            invalidate_tables('blood_inventory')
+        
+        return jsonify(report), bulk_status(report)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
 @inventory_bp.route('/<int:bag_id>', methods=['PUT'])
 def update_inventory(bag_id):
     """Update inventory item"""
@@ -169,16 +218,9 @@ def update_inventory(bag_id):
     
     try:
         execute_query(query, params, fetch=False)
+        invalidate_tables('blood_inventory')
         item = fetch_one("SELECT * FROM blood_inventory WHERE bag_id = %s", (bag_id,))
         
-        if item.get('collection_date'):
-            item['collection_date'] = item['collection_date'].isoformat()
-        if item.get('expiry_date'):
-            item['expiry_date'] = item['expiry_date'].isoformat()
-        item['blood_type'] = str(item['blood_type'])
-        item['status'] = str(item['status'])
-        item['testing_status'] = str(item['testing_status'])
-        
         return jsonify({'message': 'Inventory updated successfully', 'inventory': item}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 400
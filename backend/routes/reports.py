@@ -1,318 +1,709 @@
-from flask import Blueprint, jsonify, request
-from db_utils import fetch_all, fetch_one
-from datetime import datetime, timedelta
+from flask import Blueprint, Response, jsonify, request, url_for
+from werkzeug.datastructures import ImmutableMultiDict
+from db_utils import fetch_all, fetch_one, read_only_transaction, stream_rows, worker_session
+from cache import cached_aggregate, cached_view_data
+from report_jobs import ReportQueueFull, report_jobs
+from forecast import METHODS, SOURCES, build_forecast
+from json_provider import dumps as json_dumps
+from datetime import date, datetime, timedelta
+from functools import partial
+import csv
+import io
+import os
+import time
+import zlib
 
 reports_bp = Blueprint('reports', __name__)
 
-@reports_bp.route('/stats', methods=['GET'])
-def get_report_stats():
-    """Get overall statistics for reports"""
+class ReportError(ValueError):
+    """Raised by a report function for invalid arguments"""
+
+# Each report is a function of its query args (a MultiDict) returning the
+# report data; the GET views, /batch and report jobs all call these.
+
+def report_stats(args):
+    """Overall statistics for reports"""
+    days = args.get('days', 30, type=int)
     
-    try:
-        days = request.args.get('days', 30, type=int)
-        
-        total_donations = fetch_one(f"""
-            SELECT COUNT(*) as count 
-            FROM blood_donation
-            WHERE donation_date >= CURRENT_DATE - INTERVAL '{days} days'
-        """)['count']
-        
-        total_requests = fetch_one(f"""
-            SELECT COUNT(*) as count 
-            FROM recipient_request
-            WHERE request_date >= CURRENT_DATE - INTERVAL '{days} days'
-        """)['count']
-        
-        active_donors = fetch_one("SELECT COUNT(*) as count FROM donor")['count']
-        
-        hospitals_served = fetch_one("SELECT COUNT(*) as count FROM hospital")['count']
+    total_donations = fetch_one(f"""
+        SELECT COUNT(*) as count 
+        FROM blood_donation
+        WHERE donation_date >= CURRENT_DATE - INTERVAL '{days} days'
+    """)['count']
+    
+    total_requests = fetch_one(f"""
+        SELECT COUNT(*) as count 
+        FROM recipient_request
+        WHERE request_date >= CURRENT_DATE - INTERVAL '{days} days'
+    """)['count']
+    
+    active_donors = fetch_one("SELECT COUNT(*) as count FROM donor")['count']
+    
+    hospitals_served = fetch_one("SELECT COUNT(*) as count FROM hospital")['count']
+    
+    return {
+        'total_donations': total_donations,
+        'total_requests': total_requests,
+        'active_donors': active_donors,
+        'hospitals_served': hospitals_served,
+        'period_days': days
+    }
+
+def report_blood_usage(args):
+    """Monthly blood usage data for the last 6 months"""
+    months = args.get('months', 6, type=int)
+    
+    return fetch_all(f"""
+        SELECT 
+            TO_CHAR(day, 'Mon') as month,
+            EXTRACT(YEAR FROM day) as year,
+            SUM(requests)::bigint as usage
+        FROM request_daily
+        WHERE day >= (CURRENT_DATE - INTERVAL '{months} months')::date
+            AND request_status = 'approved'
+        GROUP BY TO_CHAR(day, 'Mon'), 
+                 DATE_TRUNC('month', day),
+                 EXTRACT(YEAR FROM day)
+        ORDER BY DATE_TRUNC('month', day)
+    """)
+
+BLOOD_TYPE_COLORS = {
+    'A+': '#ef4444', 'A-': '#f97316', 
+    'B+': '#f59e0b', 'B-': '#eab308',
+    'O+': '#84cc16', 'O-': '#22c55e', 
+    'AB+': '#10b981', 'AB-': '#14b8a6'
+}
+
+def report_blood_type_distribution(args):
+    """Distribution of donations by blood type"""
+    days = args.get('days', 180, type=int)  # Last 6 months by default
+    
+    distribution = fetch_all(f"""
+        SELECT 
+            blood_type::text as name,
+            SUM(donations)::bigint as value
+        FROM donation_daily
+        WHERE day >= (CURRENT_DATE - INTERVAL '{days} days')::date
+        GROUP BY blood_type
+        ORDER BY blood_type
+    """)
+    
+    for item in distribution:
+        item['color'] = BLOOD_TYPE_COLORS.get(item['name'], '#gray')
+    
+    return distribution
+
+def report_hospital_requests(args):
+    """Request summary by hospital"""
+    days = args.get('days', 180, type=int)
+    limit = args.get('limit', 10, type=int)
+    
+    return fetch_all(f"""
+        SELECT 
+            h.name as hospital,
+            rd.requests,
+            h.hospital_id
+        FROM (
+            SELECT hospital_id, SUM(requests)::bigint as requests
+            FROM request_hospital_daily
+            WHERE day >= (CURRENT_DATE - INTERVAL '{days} days')::date
+            GROUP BY hospital_id
+        ) rd
+        JOIN hospital h ON h.hospital_id = rd.hospital_id
+        ORDER BY rd.requests DESC, h.hospital_id
+        LIMIT {limit}
+    """)
+
+def report_donation_trends(args):
+    """Donation trends over time"""
+    months = args.get('months', 6, type=int)
+    
+    return fetch_all(f"""
+        SELECT 
+            TO_CHAR(day, 'Mon') as month,
+            blood_type::text,
+            SUM(donations)::bigint as donations
+        FROM donation_daily
+        WHERE day >= (CURRENT_DATE - INTERVAL '{months} months')::date
+        GROUP BY TO_CHAR(day, 'Mon'), 
+                 DATE_TRUNC('month', day),
+                 blood_type
+        ORDER BY DATE_TRUNC('month', day), blood_type
+    """)
+
+def report_inventory_snapshot(args):
+    """Current inventory snapshot by blood type"""
+    return fetch_all("""
+        SELECT 
+            blood_type::text,
+            COUNT(*) FILTER (WHERE status = 'available') as available,
+            COUNT(*) FILTER (WHERE status = 'reserved') as reserved,
+            COUNT(*) FILTER (WHERE status = 'expired') as expired,
+            COUNT(*) FILTER (WHERE status = 'assigned') as assigned
+        FROM blood_inventory
+        GROUP BY blood_type
+        ORDER BY blood_type
+    """)
+
+# (summary key, table, date column, extra condition) for the monthly summary;
+# each count is one half-open range scan grouped by month.
+MONTHLY_SUMMARY_COUNTS = (
+    ('donations', 'blood_donation', 'donation_date', ''),
+    ('requests', 'recipient_request', 'request_date', ''),
+    ('new_donors', 'donor', 'created_at', ''),
+    ('expired_units', 'blood_inventory', 'expiry_date', "AND status = 'expired'"),
+)
+
+MAX_SUMMARY_MONTHS = 120
+# The query's exclusive upper bound is the first of the following month,
+# which for December 9999 would be past the last date Python can represent.
+MAX_SUMMARY_YEAR = 9998
+
+def _add_months(first_of_month, months):
+    index = first_of_month.year * 12 + first_of_month.month - 1 + months
+    return first_of_month.replace(year=index // 12, month=index % 12 + 1)
+
+def _monthly_summaries(first_month, months):
+    """Summaries for months consecutive months starting at first_month"""
+    end = _add_months(first_month, months)
+    summaries = {}
+    for i in range(months):
+        start = _add_months(first_month, i)
+        summaries[start] = {'year': start.year, 'month': start.month}
+        summaries[start].update((key, 0) for key, _, _, _ in MONTHLY_SUMMARY_COUNTS)
+    
+    for key, table, column, condition in MONTHLY_SUMMARY_COUNTS:
+        counts = fetch_all(f"""
+            SELECT DATE_TRUNC('month', {column})::date as month, COUNT(*) as count
+            FROM {table}
+            WHERE {column} >= %s AND {column} < %s {condition}
+            GROUP BY 1
+        """, (first_month, end))
+        for row in counts:
+            summaries[row['month']][key] = row['count']
+    
+    return list(summaries.values())
+
+def report_monthly_summary(args):
+    """
+    Comprehensive monthly summary
+    
+    Args: year and month (default: the current month), or from/to (inclusive
+    YYYY-MM bounds) for a list with one summary per month.
+    """
+    date_from = args.get('from')
+    date_to = args.get('to')
+    if date_from or date_to:
+        if not (date_from and date_to):
+            raise ReportError('Both from and to are required')
+        try:
+            first = datetime.strptime(date_from, '%Y-%m').date()
+            last = datetime.strptime(date_to, '%Y-%m').date()
+        except ValueError:
+            raise ReportError('Months must be in YYYY-MM format')
+        if last.year > MAX_SUMMARY_YEAR:
+            raise ReportError(f'to must not be after {MAX_SUMMARY_YEAR}-12')
+        months = (last.year - first.year) * 12 + last.month - first.month + 1
+        if not 1 <= months <= MAX_SUMMARY_MONTHS:
+            raise ReportError(f'from must not be after to, and at most '
+                              f'{MAX_SUMMARY_MONTHS} months apart')
         
-        return jsonify({
-            'total_donations': total_donations,
-            'total_requests': total_requests,
-            'active_donors': active_donors,
-            'hospitals_served': hospitals_served,
-            'period_days': days
-        }), 200
+        return {
+            'from': date_from,
+            'to': date_to,
+            'months': _monthly_summaries(first, months)
+        }
+    
+    year = args.get('year', datetime.now().year, type=int)
+    month = args.get('month', datetime.now().month, type=int)
+    if not (1 <= year <= MAX_SUMMARY_YEAR and 1 <= month <= 12):
+        raise ReportError('Invalid year or month')
+    
+    return _monthly_summaries(date(year, month, 1), 1)[0]
+
+def report_donor_demographics(args):
+    """Donor demographics by blood type"""
+    return fetch_all("""
+        SELECT 
+            blood_type::text,
+            COUNT(*) as donor_count,
+            COUNT(CASE WHEN gender = 'male' THEN 1 END) as male_count,
+            COUNT(CASE WHEN gender = 'female' THEN 1 END) as female_count,
+            COUNT(CASE WHEN gender = 'other' THEN 1 END) as other_count
+        FROM donor
+        GROUP BY blood_type
+        ORDER BY blood_type
+    """)
+
+def report_request_status_summary(args):
+    """Summary of requests by status"""
+    days = args.get('days', 30, type=int)
+    
+    return fetch_all(f"""
+        SELECT 
+            request_status::text as status,
+            SUM(requests)::bigint as count,
+            SUM(units_requested)::bigint as total_units
+        FROM request_daily
+        WHERE day >= (CURRENT_DATE - INTERVAL '{days} days')::date
+        GROUP BY request_status
+        ORDER BY request_status
+    """)
+
+def report_forecast(args):
+    """Daily demand and days of supply per blood type, flagging shortages"""
+    method = args.get('method', 'ewma')
+    source = args.get('source', 'requests')
+    alpha = args.get('alpha', 0.3, type=float)
+    window = args.get('window', 28, type=int)
+    history = args.get('history', 180, type=int)
+    horizon = args.get('horizon', 14, type=int)
+    min_days = args.get('min_days', 7, type=float)
+    
+    if method not in METHODS:
+        raise ReportError(f'method must be one of {", ".join(METHODS)}')
+    if source not in SOURCES:
+        raise ReportError(f'source must be one of {", ".join(SOURCES)}')
+    if not 0 < alpha <= 1:
+        raise ReportError('alpha must be in (0, 1]')
+    if not 7 <= history <= 3650:
+        raise ReportError('history must be 7 to 3650 days')
+    if not 1 <= window <= history:
+        raise ReportError('window must be 1 to history days')
+    if not 1 <= horizon <= 365:
+        raise ReportError('horizon must be 1 to 365 days')
+    
+    return build_forecast(method=method, alpha=alpha, window=window, history=history,
+                          horizon=horizon, min_days=min_days, source=source)
+
+def _report_response(report):
+    """Run report on the request's query args and answer with its data"""
+    try:
+        return jsonify(report(request.args)), 200
+    except ReportError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@reports_bp.route('/stats', methods=['GET'])
+@cached_aggregate(tables=('blood_donation', 'recipient_request', 'donor', 'hospital'))
+@read_only_transaction
+def get_report_stats():
+    """Get overall statistics for reports"""
+    return _report_response(report_stats)
+
 @reports_bp.route('/blood-usage', methods=['GET'])
+@cached_aggregate(tables=('recipient_request',))
 def get_blood_usage():
     """Get monthly blood usage data for the last 6 months"""
-    
-    try:
-        months = request.args.get('months', 6, type=int)
-        
-        monthly_usage = fetch_all(f"""
-            SELECT 
-                TO_CHAR(request_date, 'Mon') as month,
-                EXTRACT(YEAR FROM request_date) as year,
-                COUNT(*) as usage
-            FROM recipient_request
-            WHERE request_date >= CURRENT_DATE - INTERVAL '{months} months'
-                AND request_status = 'approved'
-            GROUP BY TO_CHAR(request_date, 'Mon'), 
-                     DATE_TRUNC('month', request_date),
-                     EXTRACT(YEAR FROM request_date)
-            ORDER BY DATE_TRUNC('month', request_date)
-        """)
-        
-        return jsonify(monthly_usage), 200
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    return _report_response(report_blood_usage)
 
 @reports_bp.route('/blood-type-distribution', methods=['GET'])
+@cached_aggregate(tables=('blood_donation',))
 def get_blood_type_distribution():
     """Get distribution of donations by blood type"""
-    
-    try:
-        days = request.args.get('days', 180, type=int)  # Last 6 months by default
-        
-        distribution = fetch_all(f"""
-            SELECT 
-                blood_type::text as name,
-                COUNT(*) as value
-            FROM blood_donation
-            WHERE donation_date >= CURRENT_DATE - INTERVAL '{days} days'
-            GROUP BY blood_type
-            ORDER BY blood_type
-        """)
-        
-        colors = {
-            'A+': '#ef4444', 'A-': '#f97316', 
-            'B+': '#f59e0b', 'B-': '#eab308',
-            'O+': '#84cc16', 'O-': '#22c55e', 
-            'AB+': '#10b981', 'AB-': '#14b8a6'
-        }
-        
-        for item in distribution:
-            item['color'] = colors.get(item['name'], '#gray')
-        
-        return jsonify(distribution), 200
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    return _report_response(report_blood_type_distribution)
 
 @reports_bp.route('/hospital-requests', methods=['GET'])
+@cached_aggregate(tables=('hospital', 'recipient_request'))
 def get_hospital_requests():
     """Get request summary by hospital"""
-    
-    try:
-        days = request.args.get('days', 180, type=int)
-        limit = request.args.get('limit', 10, type=int)
-        
-        hospital_data = fetch_all(f"""
-            SELECT 
-                h.name as hospital,
-                COUNT(rr.request_id) as requests,
-                h.hospital_id
-            FROM hospital h
-            LEFT JOIN recipient_request rr ON h.hospital_id = rr.hospital_id
-                AND rr.request_date >= CURRENT_DATE - INTERVAL '{days} days'
-            GROUP BY h.hospital_id, h.name
-            HAVING COUNT(rr.request_id) > 0
-            ORDER BY COUNT(rr.request_id) DESC
-            LIMIT {limit}
-        """)
-        
-        return jsonify(hospital_data), 200
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    return _report_response(report_hospital_requests)
 
 @reports_bp.route('/donation-trends', methods=['GET'])
+@cached_aggregate(tables=('blood_donation',))
 def get_donation_trends():
     """Get donation trends over time"""
-    
-    try:
-        months = request.args.get('months', 6, type=int)
-        
-        trends = fetch_all(f"""
-            SELECT 
-                TO_CHAR(donation_date, 'Mon') as month,
-                blood_type::text,
-                COUNT(*) as donations
-            FROM blood_donation
-            WHERE donation_date >= CURRENT_DATE - INTERVAL '{months} months'
-            GROUP BY TO_CHAR(donation_date, 'Mon'), 
-                     DATE_TRUNC('month', donation_date),
-                     blood_type
-            ORDER BY DATE_TRUNC('month', donation_date), blood_type
-        """)
-        
-        return jsonify(trends), 200
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    return _report_response(report_donation_trends)
 
 @reports_bp.route('/inventory-snapshot', methods=['GET'])
+@cached_aggregate(tables=('blood_inventory',))
 def get_inventory_snapshot():
     """Get current inventory snapshot by blood type"""
-    
-    try:
-        snapshot = fetch_all("""
-            SELECT 
-                blood_type::text,
-                COUNT(*) FILTER (WHERE status = 'available') as available,
-                COUNT(*) FILTER (WHERE status = 'reserved') as reserved,
-                COUNT(*) FILTER (WHERE status = 'expired') as expired,
-                COUNT(*) FILTER (WHERE status = 'assigned') as assigned
-            FROM blood_inventory
-            GROUP BY blood_type
-            ORDER BY blood_type
-        """)
-        
-        return jsonify(snapshot), 200
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    return _report_response(report_inventory_snapshot)
 
 @reports_bp.route('/monthly-summary', methods=['GET'])
+@cached_aggregate(tables=('blood_donation', 'recipient_request', 'donor', 'blood_inventory'))
+@read_only_transaction
 def get_monthly_summary():
-    """Get comprehensive monthly summary"""
+    """
+    Get comprehensive monthly summary
     
-    try:
-        year = request.args.get('year', datetime.now().year, type=int)
-        month = request.args.get('month', datetime.now().month, type=int)
-        
-        donations = fetch_one(f"""
-            SELECT COUNT(*) as count
-            FROM blood_donation
-            WHERE EXTRACT(YEAR FROM donation_date) = {year}
-                AND EXTRACT(MONTH FROM donation_date) = {month}
-        """)['count']
-        
-        requests = fetch_one(f"""
-            SELECT COUNT(*) as count
-            FROM recipient_request
-            WHERE EXTRACT(YEAR FROM request_date) = {year}
-                AND EXTRACT(MONTH FROM request_date) = {month}
-        """)['count']
-        
-        new_donors = fetch_one(f"""
-            SELECT COUNT(*) as count
-            FROM donor
-            WHERE EXTRACT(YEAR FROM created_at) = {year}
-                AND EXTRACT(MONTH FROM created_at) = {month}
-        """)['count']
-        
-        expired = fetch_one(f"""
-            SELECT COUNT(*) as count
-            FROM blood_inventory
-            WHERE EXTRACT(YEAR FROM expiry_date) = {year}
-                AND EXTRACT(MONTH FROM expiry_date) = {month}
-                AND status = 'expired'
-        """)['count']
-        
-        return jsonify({
-            'year': year,
-            'month': month,
-            'donations': donations,
-            'requests': requests,
-            'new_donors': new_donors,
-            'expired_units': expired
-        }), 200
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    Query args: year and month (default: the current month), or from/to
+    (inclusive YYYY-MM bounds) for a list with one summary per month.
+    """
+    return _report_response(report_monthly_summary)
 
 @reports_bp.route('/donor-demographics', methods=['GET'])
+@cached_aggregate(tables=('donor',))
 def get_donor_demographics():
     """Get donor demographics by blood type"""
-    
-    try:
-        demographics = fetch_all("""
-            SELECT 
-                blood_type::text,
-                COUNT(*) as donor_count,
-                COUNT(CASE WHEN gender = 'male' THEN 1 END) as male_count,
-                COUNT(CASE WHEN gender = 'female' THEN 1 END) as female_count,
-                COUNT(CASE WHEN gender = 'other' THEN 1 END) as other_count
-            FROM donor
-            GROUP BY blood_type
-            ORDER BY blood_type
-        """)
-        
-        return jsonify(demographics), 200
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    return _report_response(report_donor_demographics)
 
 @reports_bp.route('/request-status-summary', methods=['GET'])
+@cached_aggregate(tables=('recipient_request',))
 def get_request_status_summary():
     """Get summary of requests by status"""
+    return _report_response(report_request_status_summary)
+
+@reports_bp.route('/forecast', methods=['GET'])
+@cached_aggregate(tables=('recipient_request', 'blood_inventory', 'transaction_log'))
+@read_only_transaction
+def get_forecast():
+    """Forecast daily demand and days of supply per blood type, flagging shortages"""
+    return _report_response(report_forecast)
+
+# Reports that can be requested through /batch, by name:
+# (GET endpoint whose cache entries it shares, report function).
+BATCH_REPORTS = {
+    'stats': ('reports.get_report_stats', report_stats),
+    'blood-usage': ('reports.get_blood_usage', report_blood_usage),
+    'blood-type-distribution': ('reports.get_blood_type_distribution',
+                                report_blood_type_distribution),
+    'hospital-requests': ('reports.get_hospital_requests', report_hospital_requests),
+    'donation-trends': ('reports.get_donation_trends', report_donation_trends),
+    'inventory-snapshot': ('reports.get_inventory_snapshot', report_inventory_snapshot),
+    'monthly-summary': ('reports.get_monthly_summary', report_monthly_summary),
+    'donor-demographics': ('reports.get_donor_demographics', report_donor_demographics),
+    'request-status-summary': ('reports.get_request_status_summary',
+                               report_request_status_summary),
+    'forecast': ('reports.get_forecast', report_forecast),
+}
+
+MAX_BATCH_REPORTS = 20
+
+def _report_entry(entry, reports):
+    """(name, params, key) of one requested report; raises ValueError when invalid"""
+    if isinstance(entry, str):
+        entry = {'name': entry}
+    if not isinstance(entry, dict):
+        raise ValueError('Each report must be a name or an object')
+    name = entry.get('name')
+    params = entry.get('params') or {}
+    key = entry.get('key', name)
+    if name not in reports:
+        raise ValueError(f'Unknown report: {name}')
+    if not isinstance(params, dict) or not all(
+        isinstance(v, (str, int, float)) and not isinstance(v, bool) for v in params.values()
+    ):
+        raise ValueError(f'params of {key} must map names to strings or numbers')
+    return name, params, key
+
+def _report_args(params):
+    """Report params as the query args their GET endpoint would receive"""
+    return ImmutableMultiDict({k: str(v) for k, v in params.items()})
+
+@reports_bp.route('/batch', methods=['POST'])
+@read_only_transaction
+def get_report_batch():
+    """
+    Run several reports in one call
     
+    Body: {"reports": [{"name": "blood-usage", "params": {"months": 6}}, "stats", ...]}.
+    The reports run one after another in this request's read-only transaction,
+    so they all see the same snapshot and hold one pooled connection between
+    them, and share cache entries with their GET endpoints. Each is returned
+    under its name, or under "key" when given, with its status and elapsed
+    milliseconds.
+    """
+    data = request.get_json(silent=True) or {}
+    entries = data.get('reports')
+    if not isinstance(entries, list) or not 0 < len(entries) <= MAX_BATCH_REPORTS:
+        return jsonify({'error': f'reports must be a list of 1 to {MAX_BATCH_REPORTS} reports'}), 400
+    
+    jobs = {}
+    for entry in entries:
+        try:
+            name, params, key = _report_entry(entry, BATCH_REPORTS)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if key in jobs:
+            return jsonify({'error': f'Duplicate report key: {key}'}), 400
+        jobs[key] = (name, _report_args(params))
+    
+    started = time.perf_counter()
+    reports = {}
+    for key, (name, args) in jobs.items():
+        endpoint, report = BATCH_REPORTS[name]
+        report_started = time.perf_counter()
+        try:
+            status, body = 200, cached_view_data(endpoint, args, partial(report, args))
+        except ReportError as e:
+            status, body = 400, {'error': str(e)}
+        except Exception as e:
+            status, body = 500, {'error': str(e)}
+        reports[key] = {
+            'status': status,
+            'elapsed_ms': round((time.perf_counter() - report_started) * 1000, 3),
+            'data': body
+        }
+    
+    return jsonify({
+        'reports': reports,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 3)
+    }), 200
+
+# Reports that can run as background jobs: every batch report plus exports.
+JOB_REPORTS = dict({name: endpoint for name, (endpoint, _) in BATCH_REPORTS.items()},
+                   export='reports.export_csv')
+
+def _job_status(job):
+    job = dict(job)
+    job['status_url'] = url_for('reports.get_report_job', job_id=job['job_id'])
+    if job['status'] == 'done':
+        job['result_url'] = url_for('reports.get_report_job_result', job_id=job['job_id'])
+    return job
+
+@reports_bp.route('/jobs', methods=['POST'])
+def submit_report_job():
+    """
+    Run a report in the background
+    
+    Body: {"name": "export", "params": {"type": "requests", "format": "csv"}}
+    (any batch report name, or "export" with the export/csv arguments).
+    Returns 202 with the job id; an identical job that is still queued or
+    running is returned instead of starting another.
+    """
     try:
-        days = request.args.get('days', 30, type=int)
-        
-        status_summary = fetch_all(f"""
-            SELECT 
-                request_status::text as status,
-                COUNT(*) as count,
-                SUM(units_requested) as total_units
-            FROM recipient_request
-            WHERE request_date >= CURRENT_DATE - INTERVAL '{days} days'
-            GROUP BY request_status
-            ORDER BY request_status
-        """)
+        name, params, _ = _report_entry(request.get_json(silent=True) or {}, JOB_REPORTS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        job_id, deduplicated = report_jobs.submit(name, url_for(JOB_REPORTS[name]), params)
+    except ReportQueueFull as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    status_url = url_for('reports.get_report_job', job_id=job_id)
+    response = jsonify({
+        'job_id': job_id,
+        'deduplicated': deduplicated,
+        'status_url': status_url
+    })
+    response.headers['Location'] = status_url
+    return response, 202
+
+@reports_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_report_job(job_id):
+    """Get a report job's status and progress (bytes produced so far)"""
+    try:
+        job = report_jobs.status(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found or expired'}), 404
         
-        return jsonify(status_summary), 200
+        return jsonify(_job_status(job)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@reports_bp.route('/jobs/<job_id>/result', methods=['GET'])
+def get_report_job_result(job_id):
+    """Download a finished job's result; 409 while it is queued, running or failed"""
+    try:
+        found = report_jobs.result(job_id)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    if found is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    
+    status, error, result, mimetype, filename = found
+    if status != 'done':
+        return jsonify({'error': error or f'Job is {status}', 'status': status}), 409
+    
+    response = Response(result, mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+EXPORT_QUERIES = {
+    'donations': ("""
+        SELECT 
+            bd.donation_id,
+            d.first_name || ' ' || d.last_name as donor_name,
+            bd.blood_type::text,
+            bd.donation_date,
+            bd.volume_ml,
+            bd.donation_status::text
+        FROM blood_donation bd
+        JOIN donor d ON bd.donor_id = d.donor_id
+        WHERE 1=1 {filters}
+        ORDER BY bd.donation_date DESC
+    """, 'bd.donation_date'),
+    'requests': ("""
+        SELECT 
+            rr.request_id,
+            h.name as hospital_name,
+            rr.blood_type::text,
+            rr.request_date,
+            rr.units_requested,
+            rr.units_fulfilled,
+            rr.request_status::text,
+            rr.urgency_level::text
+        FROM recipient_request rr
+        JOIN hospital h ON rr.hospital_id = h.hospital_id
+        WHERE 1=1 {filters}
+        ORDER BY rr.request_date DESC
+    """, 'rr.request_date'),
+    'inventory': ("""
+        SELECT 
+            bag_id,
+            bag_number,
+            blood_type::text,
+            collection_date,
+            expiry_date,
+            volume_ml,
+            component_type,
+            status::text,
+            storage_location
+        FROM blood_inventory
+        WHERE 1=1 {filters}
+        ORDER BY collection_date DESC
+    """, 'collection_date'),
+}
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+}
+
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '2000'))
+
+def _export_value(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+def _export_chunks(rows, export_format):
+    """Encode a RowStream batch by batch; only one batch is held at a time"""
+    columns = rows.columns
+    first = True
+    
+    if export_format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+    elif export_format == 'json':
+        yield '['
+    
+    for batch in rows.batches():
+        if export_format == 'csv':
+            writer.writerows([[_export_value(v) for v in row] for row in batch])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        else:
+            if export_format == 'ndjson':
+                yield ''.join(json_dumps(dict(zip(columns, row))) + '\n' for row in batch)
+            else:
+                chunk = json_dumps([dict(zip(columns, row)) for row in batch])[1:-1]
+                yield chunk if first else ',' + chunk
+        first = False
+    
+    if export_format == 'csv' and buffer.tell():
+        yield buffer.getvalue()
+    elif export_format == 'json':
+        yield ']'
+
+def _gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def _export_query(args):
+    """(query, params, format, filename) of an export; raises ReportError for bad args"""
+    report_type = args.get('type', 'donations')
+    export_format = args.get('format', 'csv')
+    
+    if report_type not in EXPORT_QUERIES:
+        raise ReportError('Invalid report type')
+    if export_format not in EXPORT_FORMATS:
+        raise ReportError('Invalid export format')
+    
+    query, date_column = EXPORT_QUERIES[report_type]
+    filters = ''
+    params = []
+    try:
+        date_from = args.get('from')
+        date_to = args.get('to')
+        if date_from:
+            filters += f" AND {date_column} >= %s"
+            params.append(datetime.strptime(date_from, '%Y-%m-%d').date())
+        if date_to:
+            filters += f" AND {date_column} < %s"
+            params.append(datetime.strptime(date_to, '%Y-%m-%d').date() + timedelta(days=1))
+    except ValueError:
+        raise ReportError('Dates must be in YYYY-MM-DD format')
+    except OverflowError:
+        # The exclusive bound after 9999-12-31 is not a representable date.
+        raise ReportError(f'to must be before {date.max.isoformat()}')
+    
+    filename = f'{report_type}_report_{datetime.now().date().isoformat()}.{export_format}'
+    return query.format(filters=filters), tuple(params), export_format, filename
+
+def _export_gzip(args):
+    return args.get('gzip') in ('1', 'true')
 
 @reports_bp.route('/export/csv', methods=['GET'])
 def export_csv():
-    """Export report data as CSV"""
+    """
+    Stream report data as CSV (default), NDJSON or a JSON array
     
+    Query args: type (donations|requests|inventory), format (csv|ndjson|json),
+    from/to (inclusive YYYY-MM-DD bounds on the report's date column) and
+    gzip=1 to compress the stream on the fly.
+    """
     try:
-        report_type = request.args.get('type', 'donations')
-        
-        if report_type == 'donations':
-            data = fetch_all("""
-                SELECT 
-                    bd.donation_id,
-                    d.first_name || ' ' || d.last_name as donor_name,
-                    bd.blood_type::text,
-                    bd.donation_date,
-                    bd.volume_ml,
-                    bd.donation_status::text
-                FROM blood_donation bd
-                JOIN donor d ON bd.donor_id = d.donor_id
-                ORDER BY bd.donation_date DESC
-            """)
-        elif report_type == 'requests':
-            data = fetch_all("""
-                SELECT 
-                    rr.request_id,
-                    h.name as hospital_name,
-                    rr.blood_type::text,
-                    rr.request_date,
-                    rr.units_requested,
-                    rr.units_fulfilled,
-                    rr.request_status::text,
-                    rr.urgency_level::text
-                FROM recipient_request rr
-                JOIN hospital h ON rr.hospital_id = h.hospital_id
-                ORDER BY rr.request_date DESC
-            """)
-        elif report_type == 'inventory':
-            data = fetch_all("""
-                SELECT 
-                    bag_id,
-                    bag_number,
-                    blood_type::text,
-                    collection_date,
-                    expiry_date,
-                    volume_ml,
-                    component_type,
-                    status::text,
-                    storage_location
-                FROM blood_inventory
-                ORDER BY collection_date DESC
-            """)
-        else:
-            return jsonify({'error': 'Invalid report type'}), 400
-        
-        for row in data:
-            for key, value in row.items():
-                if hasattr(value, 'isoformat'):
-                    row[key] = value.isoformat()
-        
-        return jsonify(data), 200
+        query, params, export_format, filename = _export_query(request.args)
+    except ReportError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        rows = stream_rows(query, params, itersize=EXPORT_BATCH_SIZE, as_dict=False)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    
+    compress = _export_gzip(request.args)
+    chunks = _export_chunks(rows, export_format)
+    body = _gzip_chunks(chunks) if compress else chunks
+    
+    response = Response(body, mimetype=EXPORT_FORMATS[export_format])
+    response.call_on_close(rows.close)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+# Report jobs call the report functions directly, outside any request: a
+# report runs in a read-only session of its own, an export streams from its
+# RowStream's connection alone.
+
+def _report_job(name, report, params):
+    args = _report_args(params)
+    with worker_session(read_only=True):
+        data = report(args)
+    return [json_dumps(data).encode('utf-8')], 'application/json', f'{name}.json'
+
+def _export_job(params):
+    args = _report_args(params)
+    query, params, export_format, filename = _export_query(args)
+    compress = _export_gzip(args)
+    
+    def chunks():
+        rows = stream_rows(query, params, itersize=EXPORT_BATCH_SIZE, as_dict=False)
+        try:
+            text = _export_chunks(rows, export_format)
+            yield from _gzip_chunks(text) if compress else (c.encode('utf-8') for c in text)
+        finally:
+            rows.close()
+    
+    if compress:
+        return chunks(), 'application/gzip', filename + '.gz'
+    return chunks(), EXPORT_FORMATS[export_format], filename
+
+report_jobs.register('export', _export_job)
+for job_name, (_, job_report) in BATCH_REPORTS.items():
+    report_jobs.register(job_name, partial(_report_job, job_name, job_report))
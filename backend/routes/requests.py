@@ -1,23 +1,43 @@
 from flask import Blueprint, request, jsonify
-from db_utils import fetch_all, fetch_one, execute_query, insert_and_return_id
+from db_utils import (fetch_all, fetch_one, execute_query, insert_and_return_id, stream_json_array,
+                      get_db_cursor)
+from cache import invalidate_tables
+from allocation import AllocationError, RequestNotFound, allocate_request, pending_request_ids
+from pagination import KeysetPage, PaginationError, with_next_cursor
 
 requests_bp = Blueprint('requests', __name__)
 
+REQUEST_LIST_COLUMNS = {
+    'request_id': 'rr.request_id', 'hospital_id': 'rr.hospital_id',
+    'hospital_name': 'h.name as hospital_name', 'blood_type': 'rr.blood_type::text',
+    'units_requested': 'rr.units_requested', 'units_fulfilled': 'rr.units_fulfilled',
+    'urgency_level': 'rr.urgency_level::text', 'patient_name': 'rr.patient_name',
+    'patient_age': 'rr.patient_age', 'patient_gender': 'rr.patient_gender',
+    'diagnosis_reason': 'rr.diagnosis_reason', 'doctor_name': 'rr.doctor_name',
+    'doctor_contact_number': 'rr.doctor_contact_number',
+    'required_by_date': 'rr.required_by_date', 'request_date': 'rr.request_date',
+    'request_status': 'rr.request_status::text', 'approved_by': 'rr.approved_by',
+    'rejection_reason': 'rr.rejection_reason', 'notes': 'rr.notes',
+    'created_at': 'rr.created_at', 'updated_at': 'rr.updated_at'
+}
+
+REQUEST_LIST_ORDER = [('rr.request_date', 'request_date'), ('rr.request_id', 'request_id')]
+
+MAX_ALLOCATION_BATCH = 500
+
 @requests_bp.route('', methods=['GET'])
 def get_requests():
     """Get all blood requests"""
     status = request.args.get('status')
     hospital_id = request.args.get('hospital_id')
     
-    query = """
-        SELECT 
-            rr.request_id, rr.hospital_id, h.name as hospital_name,
-            rr.blood_type::text, rr.units_requested, rr.units_fulfilled,
-            rr.urgency_level::text, rr.patient_name, rr.patient_age,
-            rr.patient_gender, rr.diagnosis_reason, rr.doctor_name,
-            rr.doctor_contact_number, rr.required_by_date, rr.request_date,
-            rr.request_status::text, rr.approved_by, rr.rejection_reason,
-            rr.notes, rr.created_at, rr.updated_at
+    try:
+        page = KeysetPage(request.args, REQUEST_LIST_COLUMNS, REQUEST_LIST_ORDER)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    query = f"""
+        SELECT {page.select_list()}
         FROM recipient_request rr
         JOIN hospital h ON rr.hospital_id = h.hospital_id
         WHERE 1=1
@@ -32,21 +52,17 @@ def get_requests():
         query += " AND rr.hospital_id = %s"
         params.append(hospital_id)
     
-    query += " ORDER BY rr.request_date DESC"
+    cursor_filter, cursor_params = page.where()
+    query += cursor_filter + page.order_limit()
+    params.extend(cursor_params)
     
     try:
-        requests = fetch_all(query, tuple(params) if params else None)
-        for req in requests:
-            if req.get('required_by_date'):
-                req['required_by_date'] = req['required_by_date'].isoformat()
-            if req.get('request_date'):
-                req['request_date'] = req['request_date'].isoformat()
-            if req.get('created_at'):
-                req['created_at'] = req['created_at'].isoformat()
-            if req.get('updated_at'):
-                req['updated_at'] = req['updated_at'].isoformat()
+        if page.streaming:
+            return stream_json_array(query, tuple(params) if params else None)
+        
+        requests, next_cursor = page.finish(fetch_all(query, tuple(params) if params else None))
         
-        return jsonify(requests), 200
+        return with_next_cursor(jsonify(requests), next_cursor), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -66,14 +82,6 @@ def get_request(request_id):
         if not req:
             return jsonify({'error': 'Request not found'}), 404
         
-        req['blood_type'] = str(req['blood_type'])
-        req['urgency_level'] = str(req['urgency_level'])
-        req['request_status'] = str(req['request_status'])
-        if req.get('required_by_date'):
-            req['required_by_date'] = req['required_by_date'].isoformat()
-        if req.get('request_date'):
-            req['request_date'] = req['request_date'].isoformat()
-        
         return jsonify(req), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -116,11 +124,7 @@ def create_request():
     
     try:
         req = insert_and_return_id(query, params)
-        req['blood_type'] = str(req['blood_type'])
-        req['urgency_level'] = str(req['urgency_level'])
-        req['request_status'] = str(req['request_status'])
-        if req.get('required_by_date'):
-            req['required_by_date'] = req['required_by_date'].isoformat()
+        invalidate_tables('recipient_request')
         
         return jsonify({'message': 'Request created successfully', 'request': req}), 201
     except Exception as e:
@@ -152,12 +156,71 @@ def update_request(request_id):
     
     try:
         execute_query(query, params, fetch=False)
+        invalidate_tables('recipient_request')
         req = fetch_one("SELECT * FROM recipient_request WHERE request_id = %s", (request_id,))
         
-        req['blood_type'] = str(req['blood_type'])
-        req['urgency_level'] = str(req['urgency_level'])
-        req['request_status'] = str(req['request_status'])
-        
         return jsonify({'message': 'Request updated successfully', 'request': req}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 400
+
+@requests_bp.route('/<int:request_id>/allocate', methods=['POST'])
+def allocate(request_id):
+    """Assign compatible bags to a request, first expiry first out"""
+    data = request.get_json(silent=True) or {}
+    
+    try:
+        with get_db_cursor() as cursor:
+            result = allocate_request(cursor, request_id, data.get('componentType'), data.get('issuedBy'))
+        invalidate_tables('blood_inventory', 'recipient_request', 'transaction_log')
+        
+        return jsonify({'message': 'Request allocated', 'allocation': result}), 200
+    except RequestNotFound as e:
+        return jsonify({'error': str(e)}), 404
+    except AllocationError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@requests_bp.route('/allocate', methods=['POST'])
+def allocate_batch():
+    """Allocate a list of requests, or the most urgent open requests, in one transaction"""
+    data = request.get_json(silent=True) or {}
+    request_ids = data.get('requestIds')
+    
+    try:
+        limit = min(int(data.get('limit', 50)), MAX_ALLOCATION_BATCH)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'limit must be an integer'}), 400
+    if request_ids is not None and (
+        not isinstance(request_ids, list)
+        or len(request_ids) > MAX_ALLOCATION_BATCH
+        or not all(isinstance(i, int) for i in request_ids)
+    ):
+        return jsonify({'error': f'requestIds must be a list of at most {MAX_ALLOCATION_BATCH} ids'}), 400
+    
+    allocations = []
+    skipped = []
+    try:
+        with get_db_cursor() as cursor:
+            if request_ids is None:
+                request_ids = pending_request_ids(cursor, limit)
+            for request_id in request_ids:
+                try:
+                    result = allocate_request(cursor, request_id, data.get('componentType'),
+                                              data.get('issuedBy'), lock_wait=False)
+                except AllocationError as e:
+                    skipped.append({'request_id': request_id, 'reason': str(e)})
+                    continue
+                if result is None:
+                    skipped.append({'request_id': request_id, 'reason': 'Locked by another allocator'})
+                else:
+                    allocations.append(result)
+        invalidate_tables('blood_inventory', 'recipient_request', 'transaction_log')
+        
+        return jsonify({
+            'allocations': allocations,
+            'skipped': skipped,
+            'units_allocated': sum(len(a['bags']) for a in allocations),
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
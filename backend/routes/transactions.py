@@ -1,19 +1,33 @@
 from flask import Blueprint, request, jsonify
-from db_utils import fetch_all, insert_and_return_id
+from db_utils import fetch_all, insert_and_return_id, stream_json_array
+from cache import invalidate_tables
+from pagination import KeysetPage, PaginationError, with_next_cursor
 
 transactions_bp = Blueprint('transactions', __name__)
 
+TRANSACTION_LIST_COLUMNS = {
+    'transaction_id': 'tl.transaction_id', 'request_id': 'tl.request_id',
+    'bag_id': 'tl.bag_id', 'units_ml': 'tl.units_ml',
+    'transaction_type': 'tl.transaction_type::text', 'issued_by': 'tl.issued_by',
+    'issue_date': 'tl.issue_date', 'remarks': 'tl.remarks',
+    'bag_number': 'bi.bag_number', 'blood_type': 'bi.blood_type::text',
+    'patient_name': 'rr.patient_name', 'hospital_name': 'h.name as hospital_name'
+}
+
+TRANSACTION_LIST_ORDER = [('tl.issue_date', 'issue_date'), ('tl.transaction_id', 'transaction_id')]
+
 @transactions_bp.route('', methods=['GET'])
 def get_transactions():
     """Get all transactions"""
     request_id = request.args.get('request_id')
     
-    query = """
-        SELECT 
-            tl.transaction_id, tl.request_id, tl.bag_id, tl.units_ml,
-            tl.transaction_type::text, tl.issued_by, tl.issue_date, tl.remarks,
-            bi.bag_number, bi.blood_type::text,
-            rr.patient_name, h.name as hospital_name
+    try:
+        page = KeysetPage(request.args, TRANSACTION_LIST_COLUMNS, TRANSACTION_LIST_ORDER)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    query = f"""
+        SELECT {page.select_list()}
         FROM transaction_log tl
         LEFT JOIN blood_inventory bi ON tl.bag_id = bi.bag_id
         LEFT JOIN recipient_request rr ON tl.request_id = rr.request_id
@@ -26,15 +40,17 @@ def get_transactions():
         query += " AND tl.request_id = %s"
         params.append(request_id)
     
-    query += " ORDER BY tl.issue_date DESC"
+    cursor_filter, cursor_params = page.where()
+    query += cursor_filter + page.order_limit()
+    params.extend(cursor_params)
     
     try:
-        transactions = fetch_all(query, tuple(params) if params else None)
-        for trans in transactions:
-            if trans.get('issue_date'):
-                trans['issue_date'] = trans['issue_date'].isoformat()
+        if page.streaming:
+            return stream_json_array(query, tuple(params) if params else None)
+        
+        transactions, next_cursor = page.finish(fetch_all(query, tuple(params) if params else None))
         
-        return jsonify(transactions), 200
+        return with_next_cursor(jsonify(transactions), next_cursor), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -67,9 +83,7 @@ def create_transaction():
     
     try:
         transaction = insert_and_return_id(query, params)
-        transaction['transaction_type'] = str(transaction['transaction_type'])
-        if transaction.get('issue_date'):
-            transaction['issue_date'] = transaction['issue_date'].isoformat()
+        invalidate_tables('transaction_log')
         
         return jsonify({'message': 'Transaction recorded successfully', 'transaction': transaction}), 201
     except Exception as e:
@@ -1,5 +1,5 @@
 from flask import Blueprint, request, jsonify
-from db_utils import fetch_all
+from db_utils import fetch_all, stream_json_array
 
 users_bp = Blueprint('users', __name__)
 
@@ -15,12 +15,10 @@ def get_users():
     """
     
     try:
+        if request.args.get('stream') == '1':
+            return stream_json_array(query)
+        
         users = fetch_all(query)
-        for user in users:
-            if user.get('last_login'):
-                user['last_login'] = user['last_login'].isoformat()
-            if user.get('created_at'):
-                user['created_at'] = user['created_at'].isoformat()
         
         return jsonify(users), 200
     except Exception as e:
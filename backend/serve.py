@@ -0,0 +1,127 @@
+"""
+Production entry point: the API on a pre-forking gunicorn server
+
+    python serve.py --workers 4 --threads 8
+
+Each worker is a separate process with its own threads, connection pool,
+aggregate cache and background workers (expiry sweeper, rollup refresher,
+report jobs, change feed listener), all created after the fork. Workers are
+recycled after about --max-requests requests, and the server reloads
+gracefully on SIGHUP: new workers (with fresh application code) start
+before the old ones finish their requests and exit. SIGTERM shuts down gracefully, SIGINT/SIGQUIT at once.
+
+Options default to WEB_* environment variables. Keep DB_POOL_MAX at least
+--threads, or requests wait for a connection.
+
+`python app.py` is still the single-process development server.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+
+from gunicorn.app.base import BaseApplication
+
+import db_utils
+from change_feed import change_feed
+from expiry_sweeper import expiry_sweeper
+from report_jobs import report_jobs
+from rollups import rollup_refresher
+
+logger = logging.getLogger('blood_bank.serve')
+
+
+def post_fork(server, worker):
+    # With --preload the master may have used the pool; its connections
+    # belong to the master.
+    db_utils.reset_pool_after_fork()
+
+
+def post_worker_init(worker):
+    # Open the pool's minimum connections before the first request.
+    db_utils.get_pool()
+
+
+def worker_exit(server, worker):
+    expiry_sweeper.stop()
+    rollup_refresher.stop()
+    report_jobs.stop()
+    change_feed.stop()
+    db_utils.close_pool()
+
+
+class APIServer(BaseApplication):
+    """gunicorn application serving create_app(config)"""
+
+    def __init__(self, options, config=None):
+        self.options = options
+        self.config_overrides = config
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+        self.cfg.set('post_fork', post_fork)
+        self.cfg.set('post_worker_init', post_worker_init)
+        self.cfg.set('worker_exit', worker_exit)
+
+    def load(self):
+        from app import create_app
+        return create_app(self.config_overrides)
+
+
+def parse_args(argv=None):
+    env = os.getenv
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--bind', default=env('WEB_BIND', '0.0.0.0:5000'))
+    parser.add_argument('--workers', type=int,
+                        default=int(env('WEB_WORKERS', str(multiprocessing.cpu_count() * 2 + 1))))
+    parser.add_argument('--threads', type=int, default=int(env('WEB_THREADS', '4')),
+                        help='request threads per worker')
+    parser.add_argument('--max-requests', type=int, default=int(env('WEB_MAX_REQUESTS', '10000')),
+                        help='recycle a worker after this many requests (0 = never)')
+    parser.add_argument('--max-requests-jitter', type=int,
+                        default=int(env('WEB_MAX_REQUESTS_JITTER', '1000')),
+                        help='random extra requests, so workers do not all restart at once')
+    parser.add_argument('--timeout', type=int, default=int(env('WEB_TIMEOUT', '120')),
+                        help='seconds a silent worker is given before it is killed')
+    parser.add_argument('--graceful-timeout', type=int, default=int(env('WEB_GRACEFUL_TIMEOUT', '30')),
+                        help='seconds workers get to finish requests on reload or shutdown')
+    parser.add_argument('--preload', action='store_true', default=env('WEB_PRELOAD', '0') == '1',
+                        help='build the app once in the master (faster forks; SIGHUP then '
+                             'does not reload code)')
+    parser.add_argument('--pidfile', default=env('WEB_PIDFILE'))
+    parser.add_argument('--access-log', default=env('WEB_ACCESS_LOG'),
+                        help="access log file, '-' for stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    # Fail fast on a bad configuration; the master keeps no connection.
+    success, message = db_utils.test_connection()
+    db_utils.close_pool()
+    if not success:
+        raise SystemExit(f'✗ {message}')
+    logger.info('%s; starting %d workers x %d threads on %s',
+                message, args.workers, args.threads, args.bind)
+
+    APIServer({
+        'bind': args.bind,
+        'workers': args.workers,
+        'worker_class': 'gthread',
+        'threads': args.threads,
+        'max_requests': args.max_requests,
+        'max_requests_jitter': args.max_requests_jitter,
+        'timeout': args.timeout,
+        'graceful_timeout': args.graceful_timeout,
+        'preload_app': args.preload,
+        'pidfile': args.pidfile,
+        'accesslog': args.access_log,
+    }).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""
+Table change watermarks and conditional GETs
+
+Every write path already names the tables it changed through
+cache.invalidate_tables(); that also bumps their row in table_watermark as
+the last statement of the request's transaction, so a watermark moves
+exactly when the data does, whichever worker process wrote it.
+
+conditional_get(tables) gives a GET view a weak ETag built from the versions
+of the tables it reads (plus the query string and today's date, for views
+that depend on CURRENT_DATE). A request whose If-None-Match still matches
+gets 304 before the view runs any of its queries or serializes anything.
+
+Watermarks are read with one primary-key lookup, or not at all while the
+change feed is connected: each worker then keeps the watermarks it has
+read and drops a table's as soon as the feed reports a write to it (its own
+writes drop it at commit). A write in another worker can therefore be
+missed for at most the feed's delivery lag.
+"""
+import hashlib
+import logging
+import threading
+from datetime import date
+from functools import wraps
+
+import psycopg2
+from flask import current_app, g, has_request_context, make_response, request
+
+from change_feed import FEED_TABLES, change_feed
+from db_utils import before_commit, get_separate_cursor, on_commit
+
+logger = logging.getLogger('blood_bank.watermarks')
+
+# One statement for all tables, in name order, so concurrent writers lock
+# the watermark rows in the same order.
+BUMP_QUERY = """
+    INSERT INTO table_watermark (table_name, version, changed_at)
+    SELECT t, 1, CURRENT_TIMESTAMP FROM unnest(%s::varchar[]) t
+    ON CONFLICT (table_name) DO UPDATE
+    SET version = table_watermark.version + 1, changed_at = EXCLUDED.changed_at
+"""
+
+WATERMARK_QUERY = """
+    SELECT table_name, version, changed_at
+    FROM table_watermark
+    WHERE table_name = ANY(%s)
+"""
+
+
+class TableWatermarks:
+    """
+    Reads and bumps table_watermark and counts conditional GET outcomes
+
+    Args:
+        feed: ChangeFeed whose notifications keep the local copy of the
+            watermarks current; without one every lookup reads the table
+    """
+
+    def __init__(self, feed=None):
+        self.feed = feed
+        self._lock = threading.Lock()
+        self._cached = {}        # table -> (version, changed_at), while the feed is up
+        self._generation = 0     # bumped whenever cached watermarks are dropped
+        self.bumps = 0
+        self.lookups = 0
+        self.cached_lookups = 0
+        self.not_modified = 0
+        self.errors = 0
+
+    def touch(self, *tables):
+        """
+        Bump the watermarks of tables when the current request commits, or at
+        once without a request session (callers there have already committed)
+        """
+        pending = g.get('_touched_tables') if has_request_context() else None
+        if pending is not None:
+            pending.update(tables)
+            return
+        pending = set(tables)
+        if before_commit(lambda cursor: self._bump(cursor, pending)):
+            # Later touches in this request join the same statement.
+            g._touched_tables = pending
+        on_commit(lambda: self._forget(pending))
+
+    def _bump(self, cursor, tables):
+        cursor.execute(BUMP_QUERY, (sorted(tables),))
+        with self._lock:
+            self.bumps += 1
+
+    def _forget(self, tables=None):
+        with self._lock:
+            self._generation += 1
+            if tables is None:
+                self._cached.clear()
+            else:
+                for table in tables:
+                    self._cached.pop(table, None)
+
+    def forget(self, change):
+        """Change feed callback: drop the watermark of a changed table, or all on resync"""
+        if change.op == 'rollup':
+            return      # the rollups behind the table's reports moved, not the table
+        self._forget(None if change.table is None else (change.table,))
+
+    def current(self, tables):
+        """{table: (version, changed_at)} for tables that have a watermark, None on errors"""
+        trusted = self.feed is not None and self.feed.connected
+        if trusted:
+            with self._lock:
+                if all(table in self._cached for table in tables):
+                    self.cached_lookups += 1
+                    return {table: self._cached[table] for table in tables}
+                generation = self._generation
+        try:
+            with get_separate_cursor() as cursor:
+                cursor.execute(WATERMARK_QUERY, (list(tables),))
+                rows = cursor.fetchall()
+        except psycopg2.Error:
+            with self._lock:
+                self.errors += 1
+            logger.exception('Could not read table watermarks for %s', ', '.join(tables))
+            return None
+        marks = {row['table_name']: (row['version'], row['changed_at']) for row in rows}
+        with self._lock:
+            self.lookups += 1
+            # Only if no change arrived while we were reading.
+            if trusted and self._generation == generation and self.feed.connected:
+                self._cached.update((t, mark) for t, mark in marks.items() if t in FEED_TABLES)
+        return marks
+
+    def matched(self, etag):
+        """Whether the request's If-None-Match covers etag (counted as a 304)"""
+        if not request.if_none_match.contains_weak(etag):
+            return False
+        with self._lock:
+            self.not_modified += 1
+        return True
+
+    def etag(self, tables, marks):
+        """Weak ETag value for the current request given the tables' watermarks"""
+        parts = [request.endpoint or '', request.query_string.decode('latin-1'),
+                 date.today().isoformat()]
+        for table in tables:
+            version, changed_at = marks.get(table, (0, None))
+            parts.append(f'{table}:{version}:{changed_at.timestamp() if changed_at else 0}')
+        return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()[:20]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'bumps': self.bumps,
+                'lookups': self.lookups,
+                'cached_lookups': self.cached_lookups,
+                'not_modified': self.not_modified,
+                'errors': self.errors,
+            }
+
+
+table_watermarks = TableWatermarks(change_feed)
+change_feed.subscribe(FEED_TABLES, table_watermarks.forget)
+
+
+def conditional_get(tables):
+    """
+    Answer If-None-Match with 304 while none of tables has been written, and
+    tag successful responses with ETag and Last-Modified otherwise.
+    """
+    tables = tuple(sorted(tables))
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            marks = table_watermarks.current(tables)
+            if marks is None:
+                return view(*args, **kwargs)
+
+            etag = table_watermarks.etag(tables, marks)
+            last_modified = max((changed_at for _, changed_at in marks.values()), default=None)
+            if table_watermarks.matched(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            # Revalidate every time rather than trusting heuristic freshness.
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
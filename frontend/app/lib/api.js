@@ -241,7 +241,30 @@ export const reportsAPI = {
   
   getRequestStatusSummary: (days = 30) => apiRequest(`/reports/request-status-summary?days=${days}`),
   
-  exportCSV: (type = 'donations') => apiRequest(`/reports/export/csv?type=${type}`),
+  // reports: [{ name, params, key }] or report names; resolves to { key: data }
+  getBatch: async (reports) => {
+    const result = await apiRequest('/reports/batch', {
+      method: 'POST',
+      body: JSON.stringify({ reports }),
+    });
+    const data = {};
+    for (const [key, report] of Object.entries(result.reports)) {
+      if (report.status >= 400) {
+        throw new Error(report.data?.error || `${key}: HTTP ${report.status}`);
+      }
+      data[key] = report.data;
+    }
+    return data;
+  },
+  
+  exportCSV: async (type = 'donations') => {
+    const response = await fetch(`${API_BASE_URL}/reports/export/csv?type=${type}&format=csv`);
+    if (!response.ok) {
+      const data = await response.json().catch(() => ({}));
+      throw new Error(data.error || `HTTP ${response.status}`);
+    }
+    return response.blob();
+  },
 };
 
 export { API_BASE_URL };
@@ -22,18 +22,18 @@ export default function Reports() {
       setLoading(true);
       setError('');
 
-      // Fetch all report data in parallel
-      const [statsData, usageData, distributionData, hospitalsData] = await Promise.all([
-        reportsAPI.getStats(30),
-        reportsAPI.getBloodUsage(6),
-        reportsAPI.getBloodTypeDistribution(180),
-        reportsAPI.getHospitalRequests(180, 5)
+      // Fetch all report data in one round trip; the server runs them in parallel
+      const data = await reportsAPI.getBatch([
+        { name: 'stats', params: { days: 30 } },
+        { name: 'blood-usage', params: { months: 6 } },
+        { name: 'blood-type-distribution', params: { days: 180 } },
+        { name: 'hospital-requests', params: { days: 180, limit: 5 } }
       ]);
 
-      setStats(statsData);
-      setBloodUsageData(usageData || []);
-      setBloodTypeDistribution(distributionData || []);
-      setHospitalRequests(hospitalsData || []);
+      setStats(data['stats']);
+      setBloodUsageData(data['blood-usage'] || []);
+      setBloodTypeDistribution(data['blood-type-distribution'] || []);
+      setHospitalRequests(data['hospital-requests'] || []);
     } catch (err) {
       console.error('Failed to fetch report data:', err);
       setError(err.message || 'Failed to load report data');
@@ -49,18 +49,10 @@ export default function Reports() {
 
   const handleDownloadCSV = async (type = 'donations') => {
     try {
-      const data = await reportsAPI.exportCSV(type);
+      const blob = await reportsAPI.exportCSV(type);
       
-      // Convert JSON to CSV
-      if (data && data.length > 0) {
-        const headers = Object.keys(data[0]);
-        const csv = [
-          headers.join(','),
-          ...data.map(row => headers.map(h => JSON.stringify(row[h] || '')).join(','))
-        ].join('\n');
-        
-        // Download CSV file
-        const blob = new Blob([csv], { type: 'text/csv' });
+      // The server streams a ready-made CSV file (header row + data rows)
+      if (blob && blob.size > 0) {
         const url = window.URL.createObjectURL(blob);
         const a = document.createElement('a');
         a.href = url;